@@ -47,10 +47,10 @@ class YoloVOCDataset(nh.data.voc.VOCDataset):
     """
 
     def __init__(self, devkit_dpath=None, split='train', years=[2007, 2012],
-                 base_wh=[416, 416], scales=[-3, 6], factor=32):
+                 base_wh=[416, 416], scales=[-3, 6], factor=32, workdir=None):
 
         super(YoloVOCDataset, self).__init__(devkit_dpath, split=split,
-                                             years=years)
+                                             years=years, workdir=workdir)
 
         self.split = split
 
@@ -168,9 +168,18 @@ class YoloVOCDataset(nh.data.voc.VOCDataset):
             inp_size = self.base_wh
         inp_size = np.array(inp_size)
 
-        image, tlbr, gt_classes, gt_weights = self._load_item(index)
-        orig_size = np.array(image.shape[0:2][::-1])
-        bbs = util.Boxes(tlbr, 'tlbr').to_imgaug(shape=image.shape)
+        letterboxed = None
+        if self.augmenter is None:
+            # The image cache may already hold the letterboxed image
+            letterboxed = self._load_cached_resize(index, inp_size)
+        if letterboxed is None:
+            image, tlbr, gt_classes, gt_weights = self._load_item(index)
+            orig_shape = image.shape
+        else:
+            tlbr, gt_classes, gt_weights = self._load_labels(index)
+            orig_shape = tuple(self._get_image_cache()['shapes'][index])
+        orig_size = np.array(orig_shape[0:2][::-1])
+        bbs = util.Boxes(tlbr, 'tlbr').to_imgaug(shape=orig_shape)
 
         if self.augmenter:
             # Ensure the same augmentor is used for bboxes and iamges
@@ -199,7 +208,10 @@ class YoloVOCDataset(nh.data.voc.VOCDataset):
 
         # Apply letterbox resize transform to train and test
         self.letterbox.target_size = inp_size
-        image = self.letterbox.augment_image(image)
+        if letterboxed is None:
+            image = self.letterbox.augment_image(image)
+        else:
+            image = letterboxed
         bbs = self.letterbox.augment_bounding_boxes([bbs])[0]
         tlbr_inp = util.Boxes.from_imgaug(bbs)
 
@@ -238,13 +250,23 @@ class YoloVOCDataset(nh.data.voc.VOCDataset):
     def _load_item(self, index):
         # load the raw data from VOC
         image = self._load_image(index)
+        tlbr, gt_classes, gt_weights = self._load_labels(index)
+        return image, tlbr, gt_classes, gt_weights
+
+    def _load_labels(self, index):
         annot = self._load_annotation(index)
         # VOC loads annotations in tlbr
         tlbr = annot['boxes'].astype(np.float)
         gt_classes = annot['gt_classes']
         # Weight samples so we dont care about difficult cases
         gt_weights = 1.0 - annot['gt_ishard'].astype(np.float)
-        return image, tlbr, gt_classes, gt_weights
+        return tlbr, gt_classes, gt_weights
+
+    def _resize_image(self, image, inp_size):
+        # The image cache stores letterboxed images. Use a new transform so
+        # the cache can be built by multiple threads.
+        letterbox = nh.data.transforms.Resize(inp_size, mode='letterbox')
+        return letterbox.augment_image(image)
 
     # @ub.memoize_method  # remove this if RAM is a problem
     def _load_image(self, index):
@@ -796,11 +818,13 @@ def setup_yolo_harness(bsize=16, workers=0):
     lr = float(ub.argval('--lr', default=0.001))
     ovthresh = 0.5
     simulated_bsize = bstep * batch_size
+    workdir = ub.truepath('~/work/voc_yolo2')
 
     # We will divide the learning rate by the simulated batch size
     datasets = {
-        'train': YoloVOCDataset(years=[2007, 2012], split='trainval'),
-        'test': YoloVOCDataset(years=[2007], split='test'),
+        'train': YoloVOCDataset(years=[2007, 2012], split='trainval',
+                                workdir=workdir),
+        'test': YoloVOCDataset(years=[2007], split='test', workdir=workdir),
     }
     loaders = {
         key: dset.make_loader(batch_size=batch_size, num_workers=workers,
@@ -809,6 +833,13 @@ def setup_yolo_harness(bsize=16, workers=0):
         for key, dset in datasets.items()
     }
 
+    if ub.argflag('--cache_images'):
+        # Decode the images once. The test images are not augmented, so they
+        # can also be stored letterboxed.
+        datasets['train'].ensure_image_cache(workers=workers)
+        datasets['test'].ensure_image_cache(
+            sizes=[datasets['test'].base_wh], workers=workers)
+
     if workers > 0:
         import cv2
         cv2.setNumThreads(0)
@@ -904,7 +935,7 @@ def setup_yolo_harness(bsize=16, workers=0):
 
     hyper = nh.HyperParams(**{
         'nice': nice,
-        'workdir': ub.truepath('~/work/voc_yolo2'),
+        'workdir': workdir,
         'datasets': datasets,
 
         # 'xpu': 'distributed(todo: fancy network stuff)',
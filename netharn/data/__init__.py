@@ -11,6 +11,7 @@ else:
     # <AUTOGEN_INIT>
     from netharn.data import base
     from netharn.data import coco_api
+    from netharn.data import coco_binary
     from netharn.data import collate
     from netharn.data import toydata
     from netharn.data import transforms
@@ -18,12 +19,17 @@ else:
 
     from netharn.data.base import (DataMixin,)
     from netharn.data.coco_api import (CocoDataset,)
+    from netharn.data.coco_binary import (LazyRecordIndex, LazyRecordList,
+                                          RecordTable, dump_coco_binary,
+                                          is_coco_binary, load_coco_binary,)
     from netharn.data.collate import (CollateException, default_collate,
                                       list_collate, padded_collate,)
     from netharn.data.toydata import (ToyData1d, ToyData2d,)
     from netharn.data.voc import (VOCDataset,)
 
-    __all__ = ['CocoDataset', 'CollateException', 'DataMixin', 'ToyData1d',
-               'ToyData2d', 'VOCDataset', 'base', 'coco_api', 'collate',
-               'default_collate', 'list_collate', 'padded_collate', 'toydata',
-               'transforms', 'voc']
+    __all__ = ['CocoDataset', 'CollateException', 'DataMixin',
+               'LazyRecordIndex', 'LazyRecordList', 'RecordTable', 'ToyData1d',
+               'ToyData2d', 'VOCDataset', 'base', 'coco_api', 'coco_binary',
+               'collate', 'default_collate', 'dump_coco_binary',
+               'is_coco_binary', 'list_collate', 'load_coco_binary',
+               'padded_collate', 'toydata', 'transforms', 'voc']
@@ -45,7 +45,14 @@ import numpy as np
 import ubelt as ub
 import six
 import itertools as it
+from collections import OrderedDict
 from netharn import util
+from netharn.data import coco_binary
+
+try:
+    from collections.abc import Mapping, MutableSet, Set
+except ImportError:  # nocover
+    from collections import Mapping, MutableSet, Set
 
 __all__ = [
     'CocoDataset',
@@ -62,6 +69,521 @@ def annot_type(ann):
     return tuple(sorted(set(ann) & {'bbox', 'line', 'keypoints'}))
 
 
+def _json_default(obj):
+    # Lazily loaded tables (see coco_binary) are written as regular lists
+    if isinstance(obj, coco_binary.LazyRecordList):
+        return obj.tolist()
+    raise TypeError('{!r} is not JSON serializable'.format(obj))
+
+
+def _is_lazy(records):
+    return isinstance(records, coco_binary.LazyRecordList) and records.is_lazy
+
+
+class _OrderedIdSet(MutableSet):
+    """
+    Insertion ordered set used for the one-to-many lookup indexes (e.g.
+    `gid_to_aids`). Unlike `ub.oset`, which is list-backed and reindexes on
+    every removal, adding or removing an item is O(1).
+
+    Example:
+        >>> aids = _OrderedIdSet([3, 1, 2])
+        >>> aids.discard(1)
+        >>> aids.update([5, 3])
+        >>> aids.difference_update([2, 7])
+        >>> aids.append(4)
+        >>> print(aids)
+        _OrderedIdSet([3, 5, 4])
+        >>> assert aids == _OrderedIdSet([3, 5, 4])
+        >>> assert aids != _OrderedIdSet([5, 3, 4])
+        >>> assert aids == {3, 4, 5}
+    """
+    __slots__ = ('_map',)
+
+    def __init__(self, items=()):
+        self._map = OrderedDict.fromkeys(items)
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def __iter__(self):
+        return iter(self._map)
+
+    def __len__(self):
+        return len(self._map)
+
+    def __eq__(self, other):
+        if isinstance(other, _OrderedIdSet):
+            # Like ub.oset, equality with another ordered set respects order
+            return self._map == other._map
+        return Set.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, list(self._map))
+
+    def add(self, key):
+        self._map[key] = None
+
+    append = add
+
+    def discard(self, key):
+        self._map.pop(key, None)
+
+    def update(self, keys):
+        for key in keys:
+            self._map[key] = None
+
+    def difference_update(self, keys):
+        for key in keys:
+            self._map.pop(key, None)
+
+    def clear(self):
+        self._map.clear()
+
+
+_NAN_BOX = [np.nan, np.nan, np.nan, np.nan]
+
+
+class _AnnotColumns(object):
+    """
+    Columnar (array-backed) storage of the core annotation attributes.
+
+    Each attribute is a contiguous array with one row per annotation (in the
+    order of ``dataset['annotations']``). The image and category groupings
+    are stored CSR-style, i.e. the rows belonging to the i-th group are
+    ``sortx[offsets[i]:offsets[i + 1]]``.
+
+    Missing bboxes, scores, and weights are stored as nan.
+
+    The columns are maintained incrementally: added annotations are kept in
+    an append buffer and removed annotations are marked with tombstones.
+    Both are merged into the arrays (see `_flush`) when a bulk accessor
+    needs them or when they grow past a fraction of the arrays. Single group
+    lookups (`group_aids`, `has_group`) do not merge, so interleaving
+    additions and lookups does not rebuild the index.
+
+    Args:
+        anns (List[Dict]): the annotation dictionaries
+        gids (Iterable[int]): image ids to include as (possibly empty) groups
+        cids (Iterable[int]): category ids to include as (possibly empty)
+            groups
+
+    Example:
+        >>> anns = [
+        >>>     {'id': 3, 'image_id': 1, 'category_id': 2, 'bbox': [0, 0, 2, 2]},
+        >>>     {'id': 1, 'image_id': 2, 'category_id': 1, 'score': .5},
+        >>>     {'id': 2, 'image_id': 1, 'category_id': 1, 'bbox': [1, 1, 3, 3]},
+        >>> ]
+        >>> cols = _AnnotColumns(anns, gids=[1, 2, 3], cids=[1, 2])
+        >>> cols.group_aids('image_id', 1).tolist()
+        [3, 2]
+        >>> cols.group_aids('image_id', 3).tolist()
+        []
+        >>> cols.group_aid_lists('image_id', [2, 1, 3])
+        [[1], [3, 2], []]
+        >>> cols.take('category_id', [2, 3]).tolist()
+        [1, 2]
+        >>> cols.take('bbox', [1, 2]).tolist()
+        [[nan, nan, nan, nan], [1.0, 1.0, 3.0, 3.0]]
+
+    Example:
+        >>> # Changes are buffered until a bulk accessor needs them
+        >>> anns = [{'id': i, 'image_id': i % 2, 'category_id': 1}
+        >>>         for i in range(6)]
+        >>> cols = _AnnotColumns(anns, gids=[0, 1], cids=[1])
+        >>> cols.add([{'id': 9, 'image_id': 0, 'category_id': 1}])
+        >>> cols.remove([2, 5])
+        >>> cols.add_groups('image_id', [7])
+        >>> cols.remove_groups('image_id', [1])
+        >>> cols.group_aids('image_id', 0).tolist()
+        [0, 4, 9]
+        >>> cols.group_aids('image_id', 1).tolist()
+        [1, 3]
+        >>> cols.group_aids('image_id', 7).tolist()
+        []
+        >>> assert len(cols._pending) == 1 and cols._n_dead == 2
+        >>> # The image still has annotations, so it is still a group
+        >>> cols.remove([1, 3])
+        >>> assert not cols.has_group('image_id', 1)
+        >>> cols.group_aid_lists('image_id', [0, 7])
+        [[0, 4, 9], []]
+        >>> assert len(cols._pending) == 0 and cols._n_dead == 0
+        >>> cols.group_keys('image_id').tolist()
+        [0, 7]
+    """
+    id_keys = ('id', 'image_id', 'category_id')
+    group_names = ('image_id', 'category_id')
+
+    def __init__(self, anns, gids=(), cids=()):
+        n = len(anns)
+        self.columns = {}
+        for key in self.id_keys:
+            try:
+                column = np.array([ann[key] for ann in anns])
+            except KeyError:
+                raise KeyError('An annotation does not have a {}'.format(key))
+            if n == 0:
+                column = column.astype(np.int64)
+            if column.dtype.kind not in 'iu':
+                raise TypeError('bad {} type={}'.format(key, column.dtype))
+            self.columns[key] = column.astype(np.int64)
+
+        self.columns['bbox'] = np.array(
+            [ann.get('bbox', None) or _NAN_BOX for ann in anns],
+            dtype=np.float64).reshape(n, 4)
+        self.columns['score'] = np.array(
+            [ann.get('score', None) for ann in anns], dtype=np.float64)
+        self.columns['weight'] = np.array(
+            [ann.get('weight', None) for ann in anns], dtype=np.float64)
+
+        self._build(gids, cids)
+
+    @classmethod
+    def _from_table(cls, table, gids=(), cids=()):
+        """
+        Builds the columns directly from the memory-mapped arrays of a
+        `coco_binary.RecordTable` without decoding any annotations. Returns
+        None if the stored field types do not allow this.
+        """
+        n = len(table)
+        columns = {}
+        for key in cls.id_keys:
+            column = table.numeric(key)
+            if column is None or table.fields[key] != 'int':
+                return None
+            values, present = column
+            if not np.all(present):
+                return None
+            columns[key] = values
+        if 'bbox' in table.fields:
+            columns['bbox'] = table.vectors('bbox', 4)
+            if columns['bbox'] is None:
+                return None
+        else:
+            columns['bbox'] = np.full((n, 4), fill_value=np.nan)
+        for key in ['score', 'weight']:
+            columns[key] = np.full(n, fill_value=np.nan)
+            if key in table.fields:
+                column = table.numeric(key)
+                if column is None:
+                    return None
+                values, present = column
+                columns[key][present] = values[present]
+        self = cls.__new__(cls)
+        self.columns = columns
+        self._build(gids, cids)
+        return self
+
+    def _build(self, gids, cids):
+        gids = self._as_ids(gids)
+        cids = self._as_ids(cids)
+        # Lookup from annotation id to row via a binary search
+        aid = self.columns['id']
+        self._aid_sortx = np.argsort(aid, kind='mergesort')
+        self._sorted_aids = aid[self._aid_sortx]
+
+        self._groups = {
+            'image_id': self._build_group(self.columns['image_id'], gids),
+            'category_id': self._build_group(self.columns['category_id'], cids),
+        }
+        # Groups that exist even if they are empty (images and categories)
+        self._group_registered = {
+            'image_id': np.isin(self._groups['image_id'][0], gids),
+            'category_id': np.isin(self._groups['category_id'][0], cids),
+        }
+        self._group_lists = {}
+
+        # Changes that are not merged into the arrays yet
+        self._dead = np.zeros(len(aid), dtype=bool)
+        self._n_dead = 0
+        self._pending = OrderedDict()
+        self._pending_groups = {key: {} for key in self.group_names}
+        self._registered = {key: {} for key in self.group_names}
+
+    def __len__(self):
+        return len(self.columns['id']) - self._n_dead + len(self._pending)
+
+    def _is_dirty(self):
+        return bool(self._n_dead or self._pending or
+                    any(self._registered.values()))
+
+    @staticmethod
+    def _row(ann):
+        try:
+            ids = [ann[key] for key in _AnnotColumns.id_keys]
+        except KeyError:
+            raise KeyError('An annotation does not have ids {}'.format(ann))
+        for key, value in zip(_AnnotColumns.id_keys, ids):
+            if not isinstance(value, INT_TYPES):
+                raise TypeError('bad {} type={}'.format(key, type(value)))
+        ids = [int(v) for v in ids]
+        return tuple(ids) + (ann.get('bbox', None) or _NAN_BOX,
+                             ann.get('score', None), ann.get('weight', None))
+
+    def add(self, anns):
+        """
+        Appends annotations (to the buffer)
+        """
+        for ann in anns:
+            row = self._row(ann)
+            aid = row[0]
+            self._pending[aid] = row
+            for key, xid in zip(self.group_names, row[1:3]):
+                groups = self._pending_groups[key]
+                if xid not in groups:
+                    groups[xid] = _OrderedIdSet()
+                groups[xid].add(aid)
+        self._maybe_flush()
+
+    def remove(self, aids):
+        """
+        Removes annotations (buffered ones are dropped, the others are marked
+        with a tombstone)
+        """
+        base_aids = []
+        for aid in aids:
+            row = self._pending.pop(aid, None)
+            if row is None:
+                base_aids.append(aid)
+            else:
+                for key, xid in zip(self.group_names, row[1:3]):
+                    group = self._pending_groups[key][xid]
+                    group.discard(aid)
+                    if not group:
+                        del self._pending_groups[key][xid]
+        if base_aids:
+            rows = self._base_rows(base_aids)
+            rows = rows[~self._dead[rows]]
+            self._dead[rows] = True
+            self._n_dead += len(rows)
+        self._maybe_flush()
+
+    def add_groups(self, key, xids):
+        """
+        Registers images or categories, which are groups even if empty
+        """
+        self._registered[key].update((xid, True) for xid in xids)
+
+    def remove_groups(self, key, xids):
+        """
+        Unregisters images or categories
+        """
+        self._registered[key].update((xid, False) for xid in xids)
+
+    def _maybe_flush(self):
+        n_changes = len(self._pending) + self._n_dead
+        if n_changes > max(1024, len(self.columns['id']) // 8):
+            self._flush()
+
+    def _flush(self):
+        """
+        Merges the buffered changes into the arrays and rebuilds the sorted
+        lookups (only using array operations).
+        """
+        if not self._is_dirty():
+            return
+        columns = self.columns
+        if self._n_dead:
+            live = ~self._dead
+            columns = {k: v[live] for k, v in columns.items()}
+        if self._pending:
+            ids, gids, cids, bboxes, scores, weights = zip(
+                *self._pending.values())
+            n = len(ids)
+            new = {
+                'id': np.array(ids, dtype=np.int64),
+                'image_id': np.array(gids, dtype=np.int64),
+                'category_id': np.array(cids, dtype=np.int64),
+                'bbox': np.array(bboxes, dtype=np.float64).reshape(n, 4),
+                'score': np.array(scores, dtype=np.float64),
+                'weight': np.array(weights, dtype=np.float64),
+            }
+            columns = {k: np.concatenate([v, new[k]], axis=0)
+                       for k, v in columns.items()}
+
+        registered = {}
+        for key in self.group_names:
+            keys = self._groups[key][0]
+            flags = self._group_registered[key].copy()
+            changes = self._registered[key]
+            extra = []
+            for xid, flag in changes.items():
+                idx = np.searchsorted(keys, xid)
+                if idx < len(keys) and keys[idx] == xid:
+                    flags[idx] = flag
+                elif flag:
+                    extra.append(xid)
+            registered[key] = np.union1d(keys[flags],
+                                         np.array(extra, dtype=np.int64))
+
+        self.columns = columns
+        self._build(registered['image_id'], registered['category_id'])
+
+    @staticmethod
+    def _as_ids(ids):
+        if not isinstance(ids, np.ndarray):
+            ids = np.array(list(ids), dtype=np.int64)
+        return ids
+
+    @staticmethod
+    def _build_group(column, extra_keys):
+        # a stable sort preserves dataset order within each group
+        sortx = np.argsort(column, kind='mergesort')
+        sorted_col = column[sortx]
+        keys = np.union1d(extra_keys, sorted_col)
+        offsets = np.empty(len(keys) + 1, dtype=np.int64)
+        offsets[:-1] = np.searchsorted(sorted_col, keys, 'left')
+        offsets[-1] = len(sorted_col)
+        return keys, offsets, sortx
+
+    def rows(self, aids):
+        """
+        Returns the row indices of the annotation ids (vectorized)
+        """
+        self._flush()
+        return self._base_rows(aids)
+
+    def _base_rows(self, aids):
+        aids = np.asarray(aids, dtype=np.int64)
+        pos = np.searchsorted(self._sorted_aids, aids)
+        valid = pos < len(self._sorted_aids)
+        valid[valid] = self._sorted_aids[pos[valid]] == aids[valid]
+        if not np.all(valid):
+            raise KeyError('Unknown annotation ids: {}'.format(
+                aids[~valid].tolist()))
+        return self._aid_sortx[pos]
+
+    def take(self, key, aids):
+        """
+        Returns the values of column `key` for the annotation ids (vectorized)
+        """
+        rows = self.rows(aids)
+        return self.columns[key][rows]
+
+    def raw_positions(self, aids):
+        """
+        Returns the positions of the annotations in the list the columns were
+        built from (the live rows followed by the buffered annotations), or
+        None if an annotation is not in the columns.
+        """
+        aids = list(aids)
+        base_aids = [aid for aid in aids if aid not in self._pending]
+        positions = []
+        if base_aids:
+            try:
+                rows = self._base_rows(base_aids)
+            except KeyError:
+                return None
+            if np.any(self._dead[rows]):
+                return None
+            if self._n_dead:
+                rows = rows - np.cumsum(self._dead)[rows]
+            positions.extend(rows.tolist())
+        if len(base_aids) < len(aids):
+            n_live = len(self.columns['id']) - self._n_dead
+            order = {aid: idx for idx, aid in enumerate(self._pending)}
+            positions.extend(n_live + order[aid] for aid in aids
+                             if aid in self._pending)
+        return positions
+
+    def group_keys(self, key):
+        self._flush()
+        return self._groups[key][0]
+
+    def _base_group(self, key, xid):
+        """
+        Returns the live rows of the group in the arrays and if the group is
+        registered (both ignore the buffered changes)
+        """
+        keys, offsets, sortx = self._groups[key]
+        idx = np.searchsorted(keys, xid)
+        if idx >= len(keys) or keys[idx] != xid:
+            return sortx[0:0], False
+        rows = sortx[offsets[idx]:offsets[idx + 1]]
+        if self._n_dead:
+            rows = rows[~self._dead[rows]]
+        return rows, self._group_registered[key][idx]
+
+    def _group_parts(self, key, xid):
+        rows, registered = self._base_group(key, xid)
+        registered = self._registered[key].get(xid, registered)
+        pending = self._pending_groups[key].get(xid, ())
+        exists = registered or len(rows) > 0 or len(pending) > 0
+        return rows, pending, exists
+
+    def has_group(self, key, xid):
+        return self._group_parts(key, xid)[2]
+
+    def group_aids(self, key, xid):
+        """
+        Returns the annotation ids in the group (a slice of the CSR index,
+        followed by any buffered annotations)
+        """
+        rows, pending, exists = self._group_parts(key, xid)
+        if not exists:
+            raise KeyError(xid)
+        aids = self.columns['id'][rows]
+        if pending:
+            aids = np.concatenate([aids, np.array(list(pending),
+                                                  dtype=np.int64)])
+        return aids
+
+    def group_aid_lists(self, key, xids):
+        """
+        Returns the annotation ids of multiple groups as python lists
+        (vectorized lookup of the group offsets).
+        """
+        self._flush()
+        keys, offsets, sortx = self._groups[key]
+        xids = np.asarray(xids, dtype=np.int64)
+        idx = np.searchsorted(keys, xids)
+        valid = idx < len(keys)
+        valid[valid] = keys[idx[valid]] == xids[valid]
+        if not np.all(valid):
+            raise KeyError('Unknown ids: {}'.format(xids[~valid].tolist()))
+        if key not in self._group_lists:
+            self._group_lists[key] = self.columns['id'][sortx].tolist()
+        flat = self._group_lists[key]
+        starts = offsets[idx].tolist()
+        stops = offsets[idx + 1].tolist()
+        return [flat[a:b] for a, b in zip(starts, stops)]
+
+    def group_sizes(self, key):
+        self._flush()
+        return np.diff(self._groups[key][1])
+
+
+class _GroupIndex(Mapping):
+    """
+    Read-only mapping from an image or category id to annotation ids that is
+    backed by the CSR groups of a columnar CocoDataset. This is used in place
+    of the dictionary of ordered sets when ``dset.columnar`` is True.
+    """
+    def __init__(self, dset, key):
+        self._dset = dset
+        self._key = key
+
+    def __getitem__(self, xid):
+        cols = self._dset._annot_columns()
+        return cols.group_aids(self._key, xid).tolist()
+
+    def __iter__(self):
+        cols = self._dset._annot_columns()
+        return iter(cols.group_keys(self._key).tolist())
+
+    def __len__(self):
+        cols = self._dset._annot_columns()
+        return len(cols.group_keys(self._key))
+
+    def __contains__(self, xid):
+        return self._dset._annot_columns().has_group(self._key, xid)
+
+
 class ObjectList1D(ub.NiceRepr):
     """
     Lightweight reference to a set of annotations that allows for convenient
@@ -145,6 +667,10 @@ class Images(ObjectList1D):
             >>> print(ub.repr2(list(map(list, self.aids)), nl=0))
             [[1, 2, 3, 4, 5, 6, 7, 8, 9], [10, 11], []]
         """
+        cols = self._dset._annot_columns()
+        if cols is not None:
+            # Each group is a slice of the columnar CSR index
+            return cols.group_aid_lists('image_id', self._ids)
         return list(ub.take(self._dset.gid_to_aids, self._ids))
 
     @property
@@ -182,6 +708,9 @@ class Annots(ObjectList1D):
         return self._lookup('category_id')
 
     def _lookup(self, key):
+        cols = self._dset._annot_columns()
+        if cols is not None and key in cols.id_keys:
+            return cols.take(key, self._ids).tolist()
         return [ann[key] for ann in ub.take(self._dset.anns, self._ids)]
 
     @property
@@ -196,7 +725,12 @@ class Annots(ObjectList1D):
                        [124,  96,  45,  18]]))>
         """
         import netharn as nh
-        xywh = self._lookup('bbox')
+        cols = self._dset._annot_columns()
+        if cols is not None:
+            # Note: missing boxes are nan in the columnar backend
+            xywh = cols.take('bbox', self._ids)
+        else:
+            xywh = self._lookup('bbox')
         boxes = nh.util.Boxes(xywh, 'xywh')
         return boxes
 
@@ -304,7 +838,7 @@ class MixinCocoDepricate(object):
                     to_remove.append(ann)
         return to_remove
 
-    def _remove_keypoint_annotations(self, rebuild=True):
+    def _remove_keypoint_annotations(self, rebuild=False):
         """
         Remove annotations with keypoints only
 
@@ -325,7 +859,7 @@ class MixinCocoDepricate(object):
         if rebuild:
             self._build_index()
 
-    def _remove_bad_annotations(self, rebuild=True):
+    def _remove_bad_annotations(self, rebuild=False):
         # DEPRICATE
         to_remove = []
         for ann in self.dataset['annotations']:
@@ -354,9 +888,7 @@ class MixinCocoDepricate(object):
             if not aids:
                 to_remove.append(self.imgs[gid])
         print('Removing {} empty images'.format(len(to_remove)))
-        for img in to_remove:
-            self.dataset['images'].remove(img)
-        self._build_index()
+        self.remove_images(to_remove)
 
 
 class MixinCocoExtras(object):
@@ -766,6 +1298,14 @@ class _NextId(object):
         self.unused[key] += 1
         return new_id
 
+    def reserve(self, key, ids):
+        """
+        Ensures ids given to new items do not collide with externally
+        specified ids (e.g. items added in bulk).
+        """
+        if self.unused[key] is not None and len(ids):
+            self.unused[key] = max(self.unused[key], max(ids) + 1)
+
 
 class MixinCocoDraw(object):
     """
@@ -896,6 +1436,8 @@ class MixinCocoAddRemove(object):
             gid = self._next_ids.get('gid')
         elif self.imgs and gid in self.imgs:
             raise IndexError('Image id={} already exists'.format(gid))
+        else:
+            self._next_ids.reserve('gid', [gid])
 
         img = ub.odict()
         img['id'] = int(gid)
@@ -905,7 +1447,11 @@ class MixinCocoAddRemove(object):
         if self.imgs is not None:
             # self._clear_index()
             self.imgs[gid] = img
-            self.gid_to_aids[gid] = []
+            if self.columnar:
+                if self._columns is not None:
+                    self._columns.add_groups('image_id', [gid])
+            else:
+                self.gid_to_aids[gid] = _OrderedIdSet()
         return gid
 
     @util.profile
@@ -931,6 +1477,8 @@ class MixinCocoAddRemove(object):
             aid = self._next_ids.get('aid')
         elif self.anns and aid in self.anns:
             raise IndexError('Annot id={} already exists'.format(aid))
+        else:
+            self._next_ids.reserve('aid', [aid])
 
         ann = ub.odict()
         ann['id'] = int(aid)
@@ -947,34 +1495,76 @@ class MixinCocoAddRemove(object):
         if self.anns is not None:
             # self._clear_index()
             self.anns[aid] = ann
-            self.gid_to_aids[gid].append(aid)
-            self.cid_to_aids[cid].append(aid)
+            if self.columnar:
+                if self._columns is not None:
+                    self._columns.add([ann])
+            else:
+                self.gid_to_aids[gid].append(aid)
+                self.cid_to_aids[cid].append(aid)
         return aid
 
     @util.profile
     def add_annotations(self, anns):
-        """ Faster less-safe multi-item alternative """
+        """
+        Faster less-safe multi-item alternative to `add_annotation`.
+
+        The annotations must already have unique ids. The lookup indexes are
+        updated with one bulk operation per affected image and category.
+
+        Args:
+            anns (List[Dict]): annotation dictionaries
+
+        Example:
+            >>> self = CocoDataset.demo()
+            >>> anns = [{'id': 100 + i, 'image_id': 3, 'category_id': 1,
+            >>>          'bbox': [i, i, 5, 5]} for i in range(3)]
+            >>> self.add_annotations(anns)
+            >>> assert list(self.gid_to_aids[3]) == [100, 101, 102]
+            >>> self._check_index()
+            >>> assert self.add_annotation(3, 1) == 103
+        """
         self.dataset['annotations'].extend(anns)
+        aids = [ann['id'] for ann in anns]
+        self._next_ids.reserve('aid', aids)
         if self.anns is not None:
-            aids = [ann['id'] for ann in anns]
-            gids = [ann['image_id'] for ann in anns]
-            cids = [ann['category_id'] for ann in anns]
-            new_anns = dict(zip(aids, anns))
-            self.anns.update(new_anns)
-            for gid, cid, aid in zip(gids, cids, aids):
-                self.gid_to_aids[gid].append(aid)
-                self.cid_to_aids[cid].append(aid)
+            self.anns.update(zip(aids, anns))
+            if self.columnar:
+                if self._columns is not None:
+                    self._columns.add(anns)
+            else:
+                gids = [ann['image_id'] for ann in anns]
+                cids = [ann['category_id'] for ann in anns]
+                for gid, group in ub.group_items(aids, gids).items():
+                    self.gid_to_aids[gid].update(group)
+                for cid, group in ub.group_items(aids, cids).items():
+                    self.cid_to_aids[cid].update(group)
 
     @util.profile
     def add_images(self, imgs):
-        """ Faster less-safe multi-item alternative """
+        """
+        Faster less-safe multi-item alternative to `add_image`.
+
+        Args:
+            imgs (List[Dict]): image dictionaries with unique ids
+
+        Example:
+            >>> self = CocoDataset.demo()
+            >>> self.add_images([{'id': 10, 'file_name': 'a.png'},
+            >>>                  {'id': 11, 'file_name': 'b.png'}])
+            >>> assert list(self.gid_to_aids[11]) == []
+            >>> self._check_index()
+        """
         self.dataset['images'].extend(imgs)
+        gids = [img['id'] for img in imgs]
+        self._next_ids.reserve('gid', gids)
         if self.imgs is not None:
-            gids = [img['id'] for img in imgs]
-            new_imgs = dict(zip(gids, imgs))
-            self.imgs.update(new_imgs)
-            for gid in gids:
-                self.gid_to_aids[gid] = []
+            self.imgs.update(zip(gids, imgs))
+            if self.columnar:
+                if self._columns is not None:
+                    self._columns.add_groups('image_id', gids)
+            else:
+                for gid in gids:
+                    self.gid_to_aids[gid] = _OrderedIdSet()
 
     def add_category(self, name, supercategory=None, cid=None):
         """
@@ -993,6 +1583,8 @@ class MixinCocoAddRemove(object):
             cid = self._next_ids.get('cid')
         elif self.cats and cid in self.cats:
             raise IndexError('Category id={} already exists'.format(cid))
+        else:
+            self._next_ids.reserve('cid', [cid])
 
         cat = ub.odict()
         cat['id'] = int(cid)
@@ -1006,7 +1598,11 @@ class MixinCocoAddRemove(object):
         # And add to the indexes
         if self.cats is not None:
             self.cats[cid] = cat
-            self.cid_to_aids[cid] = []
+            if self.columnar:
+                if self._columns is not None:
+                    self._columns.add_groups('category_id', [cid])
+            else:
+                self.cid_to_aids[cid] = _OrderedIdSet()
             self.name_to_cat[name] = cat
         return cid
 
@@ -1020,9 +1616,12 @@ class MixinCocoAddRemove(object):
             # Keep the category indexes alive
             self.imgs.clear()
             self.anns.clear()
-            self.gid_to_aids.clear()
-            for _ in self.cid_to_aids.values():
-                _.clear()
+            if self.columnar:
+                self._columns = None
+            else:
+                self.gid_to_aids.clear()
+                for _ in self.cid_to_aids.values():
+                    _.clear()
 
     def remove_all_annotations(self):
         """
@@ -1032,34 +1631,43 @@ class MixinCocoAddRemove(object):
         if self.anns is not None:
             # Keep the category and image indexes alive
             self.anns.clear()
-            for _ in self.gid_to_aids.values():
-                _.clear()
-            for _ in self.cid_to_aids.values():
-                _.clear()
+            if self.columnar:
+                self._columns = None
+            else:
+                for _ in self.gid_to_aids.values():
+                    _.clear()
+                for _ in self.cid_to_aids.values():
+                    _.clear()
 
     def remove_annotation(self, aid_or_ann):
         """
         Remove a single annotation from the dataset
 
         If you have multiple annotations to remove its more efficient to remove
-        them in batch with `self.remove_annotations`
+        them in batch with `self.remove_annotations`. Unless the dataset is
+        columnar (where the position of the annotation is known), each call
+        scans the whole raw annotation list, so removing annotations one at a
+        time is quadratic.
 
         Example:
             >>> self = CocoDataset.demo()
-            >>> aids_or_anns = [self.anns[2], 3, 4, self.anns[1]]
-            >>> self.remove_annotations(aids_or_anns)
-            >>> assert len(self.dataset['annotations']) == 7
+            >>> self.remove_annotation(self.anns[2])
+            >>> self.remove_annotation(3)
+            >>> assert len(self.dataset['annotations']) == 9
             >>> self._check_index()
         """
-        # Do the simple thing, its O(n) anyway,
-        remove_ann = self._resolve_to_ann(aid_or_ann)
-        self.dataset['annotations'].remove(remove_ann)
-        self._clear_index()
+        self.remove_annotations([aid_or_ann])
 
     def remove_annotations(self, aids_or_anns):
         """
         Remove multiple annotations from the dataset.
 
+        The raw annotation list is compacted in a single pass and the lookup
+        indexes are updated in place (each affected image and category group
+        is only touched once). In columnar datasets a few annotations are
+        deleted from the raw list by their position instead, and they are
+        marked with a tombstone in the columns.
+
         Args:
             anns_or_aids (List): list of annotation dicts or ids
 
@@ -1072,27 +1680,61 @@ class MixinCocoAddRemove(object):
         """
         # Do nothing if given no input
         if aids_or_anns:
-            # build mapping from aid to index O(n)
-            # TODO: it would be nice if this mapping was as part of the index.
-            aid_to_index = {
-                ann['id']: index
-                for index, ann in enumerate(self.dataset['annotations'])
-            }
-            remove_aids = list(map(self._resolve_to_id, aids_or_anns))
-            # Lookup the indices to remove, sort in descending order
-            toremove = sorted(ub.take(aid_to_index, remove_aids))[::-1]
-            for idx in toremove:
-                del self.dataset['annotations'][idx]
+            remove_aids = set(map(self._resolve_to_id, aids_or_anns))
+            cols = self._columns if self.anns is not None else None
+            positions = None
+            if cols is not None and len(remove_aids) <= 64:
+                # Deleting by position avoids a pass over all annotations
+                positions = cols.raw_positions(remove_aids)
+            self._remove_dataset_items('annotations', remove_aids,
+                                       positions=positions)
 
-            if self.anns:
+            if self.anns is not None:
                 # dynamically update the annotation index
-                for aid in remove_aids:
-                    ann = self.anns.pop(aid)
-                    gid = ann['image_id']
-                    cid = ann['category_id']
-                    self.cid_to_aids[cid].remove(aid)
-                    self.gid_to_aids[gid].remove(aid)
-            # self._clear_index()
+                removed = [self.anns.pop(aid) for aid in remove_aids]
+                if self.columnar:
+                    if cols is not None:
+                        cols.remove(remove_aids)
+                else:
+                    self._discard_grouped(self.gid_to_aids, removed,
+                                          'image_id')
+                    self._discard_grouped(self.cid_to_aids, removed,
+                                          'category_id')
+
+    def remove_images(self, gids_or_imgs):
+        """
+        Remove multiple images and all annotations in those images.
+
+        Args:
+            gids_or_imgs (List): list of image dicts or ids
+
+        Example:
+            >>> self = CocoDataset.demo()
+            >>> self.remove_images([1, self.imgs[3]])
+            >>> assert len(self.dataset['images']) == 1
+            >>> assert len(self.dataset['annotations']) == 2
+            >>> self._check_index()
+        """
+        if gids_or_imgs:
+            remove_gids = set(map(self._resolve_to_id, gids_or_imgs))
+            # First remove any annotation that belongs to those images
+            if self.gid_to_aids is not None:
+                remove_aids = list(it.chain(*[
+                    self.gid_to_aids.get(gid, []) for gid in remove_gids]))
+            else:
+                remove_aids = [ann['id'] for ann in self.dataset['annotations']
+                               if ann['image_id'] in remove_gids]
+            self.remove_annotations(remove_aids)
+            self._remove_dataset_items('images', remove_gids)
+
+            if self.imgs is not None:
+                # dynamically update the image index
+                for gid in remove_gids:
+                    del self.imgs[gid]
+                    if not self.columnar:
+                        del self.gid_to_aids[gid]
+                if self._columns is not None:
+                    self._columns.remove_groups('image_id', remove_gids)
 
     def remove_categories(self, cids_or_cats):
         """
@@ -1110,26 +1752,63 @@ class MixinCocoAddRemove(object):
             >>> self._check_index()
         """
         if cids_or_cats:
-            remove_cids = list(map(self._resolve_to_id, cids_or_cats))
+            remove_cids = set(map(self._resolve_to_id, cids_or_cats))
             # First remove any annotation that belongs to those categories
-            remove_aids = list(it.chain(*[self.cid_to_aids[cid] for cid in remove_cids]))
+            if self.cid_to_aids is not None:
+                remove_aids = list(it.chain(*[
+                    self.cid_to_aids.get(cid, []) for cid in remove_cids]))
+            else:
+                remove_aids = [ann['id'] for ann in self.dataset['annotations']
+                               if ann['category_id'] in remove_cids]
             self.remove_annotations(remove_aids)
+            self._remove_dataset_items('categories', remove_cids)
 
-            cid_to_index = {
-                cat['id']: index
-                for index, cat in enumerate(self.dataset['categories'])
-            }
-            # Lookup the indices to remove, sort in descending order
-            toremove = sorted(ub.take(cid_to_index, remove_cids))[::-1]
-            for idx in toremove:
-                del self.dataset['categories'][idx]
-
-            if self.cats:
+            if self.cats is not None:
                 # dynamically update the category index
                 for cid in remove_cids:
                     cat = self.cats.pop(cid)
-                    del self.cid_to_aids[cid]
+                    if not self.columnar:
+                        del self.cid_to_aids[cid]
                     del self.name_to_cat[cat['name']]
+                if self._columns is not None:
+                    self._columns.remove_groups('category_id', remove_cids)
+
+    def _remove_dataset_items(self, key, remove_ids, positions=None):
+        """
+        Removes the items with the given ids from ``self.dataset[key]`` in a
+        single pass, preserving the order of the remaining items.
+
+        If the `positions` of the items are given (and correct) they are
+        deleted directly instead.
+        """
+        items = self.dataset[key]
+        if positions is not None and len(positions) == len(remove_ids):
+            positions = sorted(positions, reverse=True)
+            n = len(items)
+            if all(pos < n and items[pos]['id'] in remove_ids
+                   for pos in positions):
+                for pos in positions:
+                    del items[pos]
+                return
+        keep = [item for item in items if item['id'] not in remove_ids]
+        if len(items) - len(keep) < len(remove_ids):
+            found = {item['id'] for item in items} & set(remove_ids)
+            missing = sorted(set(remove_ids) - found)
+            if missing:
+                raise KeyError('{} ids not in dataset: {}'.format(key, missing))
+        items[:] = keep
+
+    @staticmethod
+    def _discard_grouped(groups, anns, key):
+        """
+        Removes annotations from a one-to-many index (e.g. gid_to_aids) in
+        O(k) for k annotations.
+        """
+        aids = [ann['id'] for ann in anns]
+        xids = [ann[key] for ann in anns]
+        for xid, group in ub.group_items(aids, xids).items():
+            if xid in groups:
+                groups[xid].difference_update(group)
 
 
 class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
@@ -1185,8 +1864,26 @@ class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
         >>> self.show_image(gid=2)
         >>> from matplotlib import pyplot as plt
         >>> plt.show()
+
+    Example:
+        >>> # The columnar backend stores annotation attributes in arrays
+        >>> dataset = demo_coco_data()
+        >>> self = CocoDataset(dataset, tag='demo', columnar=True)
+        >>> print(ub.repr2(list(map(list, self.images().aids)), nl=0))
+        [[1, 2, 3, 4, 5, 6, 7, 8, 9], [10, 11], []]
+        >>> cols = self._annot_columns()
+        >>> self.add_annotation(gid=3, cid=1, bbox=[0, 0, 1, 1])
+        12
+        >>> assert list(self.gid_to_aids[3]) == [12]
+        >>> self.remove_annotation(1)
+        >>> assert list(self.gid_to_aids[1]) == [2, 3, 4, 5, 6, 7, 8, 9]
+        >>> # The columns are updated in place instead of being rebuilt
+        >>> assert self._annot_columns() is cols
+        >>> assert len(cols._pending) == 1 and cols._n_dead == 1
+        >>> self._check_index()
     """
-    def __init__(self, data=None, tag=None, img_root=None, autobuild=True):
+    def __init__(self, data=None, tag=None, img_root=None, autobuild=True,
+                 columnar=False):
         if data is None:
             data = {
                 'categories': [],
@@ -1198,7 +1895,10 @@ class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
         if isinstance(data, six.string_types):
             fpath = data
             key = basename(fpath).split('.')[0]
-            data = json.load(open(fpath, 'r'))
+            if coco_binary.is_coco_binary(fpath):
+                data = coco_binary.load_coco_binary(fpath)
+            else:
+                data = json.load(open(fpath, 'r'))
             if tag is None:
                 tag = key
             if img_root is None:
@@ -1213,6 +1913,7 @@ class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
         self.tag = tag
         self.dataset = data
         self.img_root = img_root
+        self.columnar = columnar
 
         self.anns = None
         self.imgs = None
@@ -1220,6 +1921,7 @@ class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
         self.gid_to_aids = None
         self.cid_to_aids = None
         self.name_to_cat = None
+        self._columns = None
 
         # Keep track of an unused id we may use
         self._next_ids = _NextId(self)
@@ -1282,7 +1984,35 @@ class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
             with open(file, 'w') as fp:
                 self.dump(fp, indent=indent)
         else:
-            json.dump(self.dataset, file, indent=indent)
+            json.dump(self.dataset, file, indent=indent,
+                      default=_json_default)
+
+    def dump_binary(self, fpath):
+        """
+        Writes the dataset out to the columnar binary format (see
+        :mod:`netharn.data.coco_binary`). Passing `fpath` to the `CocoDataset`
+        constructor opens it lazily.
+
+        Args:
+            fpath (str): path of the output directory
+
+        Example:
+            >>> from netharn.data.coco_api import *
+            >>> self = CocoDataset.demo()
+            >>> dpath = ub.ensure_app_cache_dir('netharn/tests/coco_binary')
+            >>> fpath = join(dpath, 'demo.cocobin')
+            >>> self.dump_binary(fpath)
+            >>> self2 = CocoDataset(fpath, columnar=True)
+            >>> assert self2.dumps() == self.dumps()
+            >>> assert self2.dataset['annotations'].is_lazy
+            >>> assert np.all(self2.annots([1, 2]).boxes.data ==
+            >>>               self.annots([1, 2]).boxes.data)
+            >>> assert self2.images().aids == list(map(list, self.images().aids))
+            >>> assert self2.dataset['annotations'].is_lazy
+            >>> self2.remove_annotations([1, 2])
+            >>> self2._check_index()
+        """
+        coco_binary.dump_coco_binary(self.dataset, fpath)
 
     def _check_index(self):
         # We can verify our index invariants by copying the raw dataset and
@@ -1307,8 +2037,11 @@ class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
             gid - imaGe ID
             cid - Category ID
         """
+        if self.columnar and self._build_lazy_index():
+            return
+
         # create index
-        _set = ub.oset
+        _set = _OrderedIdSet
         anns, cats, imgs = {}, {}, {}
         gid_to_aids = ub.ddict(_set)
         cid_to_aids = ub.ddict(_set)
@@ -1338,6 +2071,19 @@ class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
                                   self, anns[aid], ann))
             anns[aid] = ann
 
+        if self.columnar:
+            # The one-to-many maps are views into the annotation columns
+            self._columns = _AnnotColumns(
+                self.dataset.get('annotations', []), gids=imgs.keys(),
+                cids=cats.keys())
+            self.anns = anns
+            self.imgs = imgs
+            self.cats = cats
+            self.gid_to_aids = _GroupIndex(self, 'image_id')
+            self.cid_to_aids = _GroupIndex(self, 'category_id')
+            self.name_to_cat = {cat['name']: cat for cat in self.cats.values()}
+            return
+
         # Build one-to-many lookup maps
         for ann in anns.values():
             try:
@@ -1380,7 +2126,36 @@ class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
         self.cid_to_aids = cid_to_aids
         self.name_to_cat = {cat['name']: cat for cat in self.cats.values()}
 
+    def _build_lazy_index(self):
+        """
+        Builds the columnar index directly on top of a lazily loaded binary
+        dataset (see `coco_binary`) without decoding any annotations or
+        images. Returns False if the dataset is not lazily loaded.
+        """
+        annots = self.dataset.get('annotations', None)
+        images = self.dataset.get('images', None)
+        if not (_is_lazy(annots) and _is_lazy(images)):
+            return False
+        if not (annots.table.has_id_index and images.table.has_id_index):
+            return False
+        cats = {}
+        for cat in self.dataset.get('categories', []):
+            cats[cat['id']] = cat
+        gids = np.asarray(images.table.ids())
+        self._columns = _AnnotColumns._from_table(annots.table, gids=gids,
+                                                  cids=cats.keys())
+        if self._columns is None:
+            self._columns = _AnnotColumns(annots, gids=gids, cids=cats.keys())
+        self.anns = coco_binary.LazyRecordIndex(annots)
+        self.imgs = coco_binary.LazyRecordIndex(images)
+        self.cats = cats
+        self.gid_to_aids = _GroupIndex(self, 'image_id')
+        self.cid_to_aids = _GroupIndex(self, 'category_id')
+        self.name_to_cat = {cat['name']: cat for cat in self.cats.values()}
+        return True
+
     def _clear_index(self):
+        self._columns = None
         self.anns = None
         self.imgs = None
         self.cats = None
@@ -1388,6 +2163,26 @@ class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
         self.cid_to_aids = None
         self.name_to_cat = None
 
+    def _annot_columns(self):
+        """
+        Returns the columnar annotation index if this dataset uses the
+        columnar backend (otherwise None). Modifications are applied to the
+        columns incrementally (see `_AnnotColumns`); the columns are only
+        rebuilt from the raw data after the whole dataset is cleared.
+        """
+        if not self.columnar:
+            return None
+        if self._columns is None:
+            gids = [img['id'] for img in self.dataset.get('images', [])]
+            cids = [cat['id'] for cat in self.dataset.get('categories', [])]
+            anns = self.dataset.get('annotations', [])
+            if _is_lazy(anns):
+                self._columns = _AnnotColumns._from_table(
+                    anns.table, gids=gids, cids=cids)
+            if self._columns is None:
+                self._columns = _AnnotColumns(anns, gids=gids, cids=cids)
+        return self._columns
+
     @classmethod
     def union(CocoDataset, *others, **kw):
         """
@@ -1522,7 +2317,8 @@ class CocoDataset(ub.NiceRepr, MixinCocoAddRemove, MixinCocoStats,
         new_dataset['annotations'] = list(ub.take(self.anns, sub_aids))
         new_dataset['images'] = list(ub.take(self.imgs, gids))
 
-        sub_dset = CocoDataset(new_dataset, img_root=self.img_root)
+        sub_dset = CocoDataset(new_dataset, img_root=self.img_root,
+                               columnar=self.columnar)
         return sub_dset
 
 
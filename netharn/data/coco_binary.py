@@ -0,0 +1,740 @@
+# -*- coding: utf-8 -*-
+"""
+A compact columnar binary format for MS-COCO style datasets.
+
+A dataset is written to a directory that contains a small json header and
+one ``.npy`` file per column. Each top-level list of dictionaries (e.g.
+images, annotations, and categories) is stored as a table where:
+
+    * integer and float fields are stored in int64 / float64 arrays,
+
+    * lists of numbers (e.g. bbox, keypoints) are stored CSR-style as a flat
+      array of values and an array of offsets,
+
+    * string fields are indices into a per-table string table (one utf8 blob
+      and an array of offsets),
+
+    * any other value (e.g. nested dictionaries, None, booleans, or fields
+      with mixed types) is stored as json text in the string table,
+
+    * the key order of each record is an index into a short list of schemas.
+
+This makes the round trip exact: dumping a loaded dataset to json gives the
+same text as dumping the original dataset.
+
+Loading memory-maps the columns and only decodes a record when it is
+accessed, so opening even a very large dataset is nearly instant. When
+`CocoDataset` is constructed with ``columnar=True`` its index is built
+directly from the memory-mapped columns without decoding any records.
+
+Example:
+    >>> from netharn.data.coco_binary import *
+    >>> import json
+    >>> dataset = {
+    >>>     'info': {'description': 'demo'},
+    >>>     'categories': [{'id': 1, 'name': 'cat'}],
+    >>>     'images': [{'id': 1, 'file_name': 'a.png'}],
+    >>>     'annotations': [
+    >>>         {'id': 1, 'image_id': 1, 'category_id': 1,
+    >>>          'bbox': [0, 1.5, 2, 3]},
+    >>>         {'image_id': 1, 'id': 2, 'category_id': 1, 'score': 0.5,
+    >>>          'extra': {'flags': [None, True]}},
+    >>>     ],
+    >>> }
+    >>> dpath = ub.ensure_app_cache_dir('netharn/tests/coco_binary')
+    >>> fpath = join(dpath, 'demo.cocobin')
+    >>> dump_coco_binary(dataset, fpath)
+    >>> loaded = load_coco_binary(fpath)
+    >>> assert loaded['annotations'][1]['extra'] == {'flags': [None, True]}
+    >>> assert list(loaded['annotations'][1].keys())[0] == 'image_id'
+    >>> text1 = json.dumps(dataset)
+    >>> text2 = json.dumps(loaded, default=list)
+    >>> assert text1 == text2
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import copy
+import json
+import os
+import itertools as it
+from os.path import exists
+from os.path import isdir
+from os.path import join
+import numpy as np
+import ubelt as ub
+import six
+
+try:
+    from collections.abc import MutableMapping, MutableSequence, Sequence
+except ImportError:  # nocover
+    from collections import MutableMapping, MutableSequence, Sequence
+
+__all__ = [
+    'dump_coco_binary', 'load_coco_binary', 'is_coco_binary',
+    'RecordTable', 'LazyRecordList', 'LazyRecordIndex',
+]
+
+
+_FORMAT = 'netharn.coco_binary'
+_VERSION = 1
+_HEADER = 'header.json'
+
+# integers outside of this range cannot be stored in a float64 without loss
+_EXACT_INT = 2 ** 53
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+_VECTOR_KINDS = {'intvec': np.int64, 'floatvec': np.float64,
+                 'numvec': np.float64}
+
+
+def _classify(value):
+    """
+    Returns a short code for the storage class of a single json value.
+
+    Example:
+        >>> [_classify(v) for v in [1, 2 ** 60, 1.0, 'a', [1, 2], [1., 2],
+        >>>                         [], True, None, {}, [[1]]]]
+        ['i', 'I', 'f', 's', 'vi', 'vn', 'v0', 'j', 'j', 'j', 'j']
+    """
+    vtype = type(value)
+    if vtype in six.integer_types:
+        if -_EXACT_INT <= value <= _EXACT_INT:
+            return 'i'
+        elif _INT64_MIN <= value <= _INT64_MAX:
+            return 'I'
+    elif vtype is float:
+        return 'f'
+    elif vtype is six.text_type:
+        return 's'
+    elif vtype is list or vtype is tuple:
+        if not value:
+            return 'v0'
+        classes = set(map(_classify, value))
+        if classes == {'i'}:
+            return 'vi'
+        elif classes == {'f'}:
+            return 'vf'
+        elif classes == {'i', 'f'}:
+            return 'vn'
+    return 'j'
+
+
+def _field_kind(classes):
+    """
+    Returns the column kind that can exactly store values of all classes
+    """
+    if classes <= {'i', 'I'}:
+        return 'int'
+    elif classes == {'f'}:
+        return 'float'
+    elif classes <= {'i', 'f'}:
+        return 'num'
+    elif classes == {'s'}:
+        return 'str'
+    elif classes <= {'vi', 'v0'}:
+        return 'intvec'
+    elif classes <= {'vf', 'v0'}:
+        return 'floatvec'
+    elif classes <= {'vi', 'vf', 'vn', 'v0'}:
+        return 'numvec'
+    else:
+        return 'json'
+
+
+class _StringTableBuilder(object):
+    """
+    Deduplicated list of strings that is stored as a single utf8 blob
+    """
+    def __init__(self):
+        self.lut = {}
+        self.texts = []
+
+    def add(self, text):
+        index = self.lut.get(text, None)
+        if index is None:
+            index = self.lut[text] = len(self.texts)
+            self.texts.append(text)
+        return index
+
+    def arrays(self):
+        encoded = [text.encode('utf8') for text in self.texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return {'strings': blob, 'string_offsets': offsets}
+
+
+def _mixed_numbers(values, isint):
+    """
+    Converts float64 values to python numbers, where flagged values become
+    ints.
+
+    Example:
+        >>> _mixed_numbers(np.array([1., 2.5, -3.]), np.array([1, 0, 1]))
+        [1, 2.5, -3]
+    """
+    numbers = np.asarray(values).astype(object)
+    isint = np.asarray(isint).astype(bool)
+    if np.any(isint):
+        numbers[isint] = np.asarray(values)[isint].astype(np.int64).tolist()
+    return numbers.tolist()
+
+
+def _is_table(value):
+    if isinstance(value, LazyRecordList):
+        return True
+    return (isinstance(value, list) and len(value) > 0 and
+            all(isinstance(item, dict) for item in value))
+
+
+def _encode_column(kind, values, present, strings):
+    """
+    Encodes the values of one field as a dictionary of numpy arrays. Rows
+    where the field is not present are filled with a placeholder.
+    """
+    if kind == 'int':
+        return {'values': np.array([v if p else 0 for v, p in
+                                    zip(values, present)], dtype=np.int64)}
+    elif kind in {'float', 'num'}:
+        arrays = {'values': np.array([v if p else 0 for v, p in
+                                      zip(values, present)],
+                                     dtype=np.float64)}
+        if kind == 'num':
+            arrays['isint'] = np.array([
+                p and type(v) in six.integer_types
+                for v, p in zip(values, present)], dtype=np.uint8)
+        return arrays
+    elif kind in {'str', 'json'}:
+        if kind == 'json':
+            encode = json.dumps
+        else:
+            encode = ub.identity
+        return {'values': np.array([
+            strings.add(encode(v)) if p else -1
+            for v, p in zip(values, present)], dtype=np.int64)}
+    elif kind in _VECTOR_KINDS:
+        lengths = [len(v) if p else 0 for v, p in zip(values, present)]
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        flat = list(it.chain.from_iterable(
+            v for v, p in zip(values, present) if p))
+        arrays = {
+            'offsets': offsets,
+            'values': np.array(flat, dtype=_VECTOR_KINDS[kind]).ravel(),
+        }
+        if kind == 'numvec':
+            arrays['isint'] = np.array([type(v) in six.integer_types
+                                        for v in flat], dtype=np.uint8)
+        return arrays
+    else:
+        raise KeyError(kind)
+
+
+def _write_table(dpath, prefix, records):
+    """
+    Writes a list of dictionaries as a set of columns and returns its
+    metadata (which is stored in the header).
+    """
+    n = len(records)
+    schema_lut = {}
+    schema_ids = np.empty(n, dtype=np.int32)
+    field_classes = ub.odict()
+    for row, record in enumerate(records):
+        keys = tuple(record.keys())
+        schema_ids[row] = schema_lut.setdefault(keys, len(schema_lut))
+        for key, value in record.items():
+            field_classes.setdefault(key, set()).add(_classify(value))
+
+    def _save(name, arr):
+        np.save(join(dpath, '{}.{}.npy'.format(prefix, name)), arr)
+
+    strings = _StringTableBuilder()
+    fields = []
+    for fx, (key, classes) in enumerate(field_classes.items()):
+        kind = _field_kind(classes)
+        present = [key in record for record in records]
+        values = [record.get(key, None) for record in records]
+        arrays = _encode_column(kind, values, present, strings)
+        for suffix, arr in arrays.items():
+            _save('f{}.{}'.format(fx, suffix), arr)
+        fields.append([key, kind])
+
+    has_id_index = (field_classes.get('id', None) is not None and
+                    _field_kind(field_classes['id']) == 'int' and
+                    all(('id' in keys) for keys in schema_lut.keys()))
+    if has_id_index:
+        # Store the sorted order of the ids for lookups without decoding
+        ids = np.array([record['id'] for record in records], dtype=np.int64)
+        sortx = np.argsort(ids, kind='mergesort')
+        _save('id_sortx', sortx)
+        _save('id_sorted', ids[sortx])
+
+    _save('schema_ids', schema_ids)
+    for name, arr in strings.arrays().items():
+        _save(name, arr)
+
+    schemas = sorted(schema_lut.items(), key=lambda t: t[1])
+    meta = {
+        'prefix': prefix,
+        'length': n,
+        'schemas': [list(keys) for keys, _ in schemas],
+        'fields': fields,
+        'has_id_index': has_id_index,
+    }
+    return meta
+
+
+def dump_coco_binary(dataset, fpath):
+    """
+    Writes a coco dataset dictionary to the columnar binary format.
+
+    Args:
+        dataset (Dict): the coco dataset (e.g. `CocoDataset.dataset`)
+        fpath (str): path of the output directory. An existing dataset at
+            this path is replaced.
+    """
+    tmp_dpath = ub.ensuredir(fpath + '.tmp')
+    header = {
+        'format': _FORMAT,
+        'version': _VERSION,
+        'keys': list(dataset.keys()),
+        'tables': {},
+        'extra': {},
+    }
+    for tx, (key, value) in enumerate(dataset.items()):
+        if _is_table(value):
+            prefix = 't{}'.format(tx)
+            header['tables'][key] = _write_table(tmp_dpath, prefix, value)
+        else:
+            header['extra'][key] = value
+    with open(join(tmp_dpath, _HEADER), 'w') as file:
+        json.dump(header, file)
+
+    # Swap in the new directory as the last step
+    if exists(fpath):
+        old_dpath = fpath + '.old'
+        os.rename(fpath, old_dpath)
+        os.rename(tmp_dpath, fpath)
+        ub.delete(old_dpath)
+    else:
+        os.rename(tmp_dpath, fpath)
+
+
+def is_coco_binary(fpath):
+    """
+    Returns True if `fpath` is a dataset written by `dump_coco_binary`
+    """
+    return isdir(fpath) and exists(join(fpath, _HEADER))
+
+
+def load_coco_binary(fpath, mmap_mode='r'):
+    """
+    Opens a dataset written by `dump_coco_binary`.
+
+    Tables are returned as `LazyRecordList` objects that decode records on
+    demand. Everything else in the dataset is loaded immediately.
+
+    Args:
+        fpath (str): path to the dataset directory
+        mmap_mode (str): passed to `np.load`. Use None to read the columns
+            into memory.
+
+    Returns:
+        Dict: the coco dataset
+    """
+    with open(join(fpath, _HEADER), 'r') as file:
+        header = json.load(file)
+    if header.get('format', None) != _FORMAT:
+        raise ValueError('{} is not a coco binary dataset'.format(fpath))
+    if header['version'] > _VERSION:
+        raise ValueError('Unsupported coco binary version={}'.format(
+            header['version']))
+    dataset = {}
+    for key in header['keys']:
+        if key in header['tables']:
+            table = RecordTable(fpath, header['tables'][key],
+                                mmap_mode=mmap_mode)
+            dataset[key] = LazyRecordList(table)
+        else:
+            dataset[key] = header['extra'][key]
+    return dataset
+
+
+class RecordTable(object):
+    """
+    Read-only access to the columns of one table in a coco binary dataset.
+
+    Args:
+        dpath (str): the dataset directory
+        meta (Dict): the table metadata stored in the header
+        mmap_mode (str): passed to `np.load`
+    """
+    def __init__(self, dpath, meta, mmap_mode='r'):
+        self.dpath = dpath
+        self.meta = meta
+        self.mmap_mode = mmap_mode
+        self.schemas = [tuple(keys) for keys in meta['schemas']]
+        self.fields = ub.odict((key, kind) for key, kind in meta['fields'])
+        self._field_index = {key: fx for fx, (key, _) in
+                             enumerate(meta['fields'])}
+        self._arrays = {}
+
+    def __len__(self):
+        return self.meta['length']
+
+    @property
+    def has_id_index(self):
+        return self.meta['has_id_index']
+
+    def _array(self, name):
+        arr = self._arrays.get(name, None)
+        if arr is None:
+            fpath = join(self.dpath, '{}.{}.npy'.format(self.meta['prefix'],
+                                                       name))
+            arr = self._arrays[name] = np.load(fpath,
+                                               mmap_mode=self.mmap_mode)
+        return arr
+
+    def _field_array(self, key, suffix):
+        return self._array('f{}.{}'.format(self._field_index[key], suffix))
+
+    def _texts(self, indices):
+        indices = np.asarray(indices)
+        valid = indices >= 0
+        if not np.any(valid):
+            return [None] * len(indices)
+        offsets = self._array('string_offsets')
+        starts = np.where(valid, offsets[np.maximum(indices, 0)], 0)
+        stops = np.where(valid, offsets[np.maximum(indices, 0) + 1], 0)
+        blob = self._array('strings')
+        base, top = int(starts[valid].min()), int(stops.max())
+        if top - base > 4 * int((stops - starts).sum()) + 2 ** 20:
+            # The strings are scattered, read them one at a time
+            return [blob[a:b].tobytes().decode('utf8') if flag else None
+                    for a, b, flag in zip(starts.tolist(), stops.tolist(),
+                                          valid.tolist())]
+        # Read the smallest window of the blob that contains every string
+        window = blob[base:top].tobytes()
+        return [window[a - base:b - base].decode('utf8') if flag else None
+                for a, b, flag in zip(starts.tolist(), stops.tolist(),
+                                      valid.tolist())]
+
+    def _decode_column(self, key, kind, start, stop):
+        values = self._field_array(key, 'values')
+        if kind in {'int', 'float'}:
+            return values[start:stop].tolist()
+        elif kind == 'num':
+            isint = self._field_array(key, 'isint')[start:stop]
+            return _mixed_numbers(values[start:stop], isint)
+        elif kind == 'str':
+            return self._texts(values[start:stop].tolist())
+        elif kind == 'json':
+            return [None if text is None else json.loads(text)
+                    for text in self._texts(values[start:stop].tolist())]
+        elif kind in _VECTOR_KINDS:
+            offsets = self._field_array(key, 'offsets')[start:stop + 1]
+            offsets = offsets.tolist()
+            flat = values[offsets[0]:offsets[-1]]
+            if kind == 'numvec':
+                isint = self._field_array(key, 'isint')
+                flat = _mixed_numbers(flat, isint[offsets[0]:offsets[-1]])
+            else:
+                flat = flat.tolist()
+            base = offsets[0]
+            return [flat[a - base:b - base]
+                    for a, b in zip(offsets[:-1], offsets[1:])]
+        else:
+            raise KeyError(kind)
+
+    def decode(self, start, stop):
+        """
+        Decodes a contiguous range of records into dictionaries
+
+        Args:
+            start (int): first row
+            stop (int): one past the last row
+
+        Returns:
+            List[Dict]
+        """
+        schema_ids = self._array('schema_ids')[start:stop].tolist()
+        used = set(it.chain.from_iterable(
+            self.schemas[sx] for sx in set(schema_ids)))
+        columns = {
+            key: self._decode_column(key, kind, start, stop)
+            for key, kind in self.fields.items() if key in used
+        }
+        records = []
+        for offset, sx in enumerate(schema_ids):
+            records.append({key: columns[key][offset]
+                            for key in self.schemas[sx]})
+        return records
+
+    def present(self, key):
+        """
+        Returns a boolean mask indicating which records contain `key`
+        """
+        in_schema = np.array([key in keys for keys in self.schemas],
+                             dtype=bool)
+        return in_schema[self._array('schema_ids')]
+
+    def numeric(self, key):
+        """
+        Returns the values of a numeric field without decoding any records.
+
+        Returns:
+            Tuple[ndarray, ndarray] | None: the values (which are meaningless
+                where the key is not present) and the presence mask, or None
+                if the field is not stored as a number.
+        """
+        if self.fields.get(key, None) not in {'int', 'float', 'num'}:
+            return None
+        return self._field_array(key, 'values'), self.present(key)
+
+    def vectors(self, key, dim):
+        """
+        Returns a field of fixed length numeric vectors (e.g. bboxes) as a
+        (N, dim) float array, where missing or empty vectors are nan.
+
+        Returns:
+            ndarray | None: None if the field is not stored as vectors of
+                length `dim`.
+        """
+        if self.fields.get(key, None) not in _VECTOR_KINDS:
+            return None
+        offsets = np.asarray(self._field_array(key, 'offsets'))
+        lengths = np.diff(offsets)
+        has_vec = lengths == dim
+        if not np.all(has_vec | (lengths == 0)):
+            return None
+        flat = np.asarray(self._field_array(key, 'values'))
+        vectors = np.full((len(self), dim), fill_value=np.nan)
+        vectors[has_vec] = flat.reshape(-1, dim)
+        return vectors
+
+    def row_of(self, record_id):
+        """
+        Returns the row of the record with the given id (or None)
+        """
+        sorted_ids = self._array('id_sorted')
+        pos = np.searchsorted(sorted_ids, record_id)
+        if pos < len(sorted_ids) and sorted_ids[pos] == record_id:
+            return int(self._array('id_sortx')[pos])
+        return None
+
+    def ids(self):
+        """
+        Returns the ids of all records in the order they are stored
+        """
+        return self._field_array('id', 'values')
+
+
+class LazyRecordList(MutableSequence):
+    """
+    A list of dictionaries backed by a `RecordTable` that only decodes a
+    record when it is accessed. Decoded records are cached, so accessing
+    the same row twice returns the same dictionary.
+
+    Any modification (or iterating over the entire list) first converts it
+    into a regular list of dictionaries.
+
+    Example:
+        >>> from netharn.data.coco_binary import *
+        >>> dataset = {'images': [{'id': i, 'file_name': str(i)}
+        >>>                       for i in range(10)]}
+        >>> dpath = ub.ensure_app_cache_dir('netharn/tests/coco_binary')
+        >>> fpath = join(dpath, 'lazy.cocobin')
+        >>> dump_coco_binary(dataset, fpath)
+        >>> images = load_coco_binary(fpath)['images']
+        >>> assert images[3] is images[3] and images.is_lazy
+        >>> assert images[-1]['file_name'] == '9'
+        >>> img = images[2]
+        >>> del images[0]
+        >>> assert not images.is_lazy
+        >>> assert images[1] is img and len(images) == 9
+    """
+    _chunksize = 4096
+
+    def __init__(self, table):
+        self.table = table
+        self._cache = {}
+        self._items = None
+        self._row_items = None
+
+    @property
+    def is_lazy(self):
+        """ True if the records are still backed by the table """
+        return self._items is None
+
+    def _iter_rows(self):
+        # Yields every record (preferring cached ones) without caching
+        n = len(self.table)
+        for start in range(0, n, self._chunksize):
+            stop = min(start + self._chunksize, n)
+            decoded = self.table.decode(start, stop)
+            for row, record in enumerate(decoded, start=start):
+                yield self._cache.get(row, record)
+
+    def _materialize(self):
+        if self._items is None:
+            self._items = list(self._iter_rows())
+            # Remember the original rows for LazyRecordIndex
+            self._row_items = list(self._items)
+            self._cache = None
+        return self._items
+
+    def tolist(self):
+        """
+        Returns the records as a regular list (without converting this
+        object, e.g. when writing the dataset to json)
+        """
+        if self._items is None:
+            return list(self._iter_rows())
+        return list(self._items)
+
+    def _record_at_row(self, row):
+        """
+        Returns the record stored at `row` of the table (this does not change
+        if the list is modified)
+        """
+        if self._row_items is not None:
+            return self._row_items[row]
+        record = self._cache.get(row, None)
+        if record is None:
+            record = self._cache[row] = self.table.decode(row, row + 1)[0]
+        return record
+
+    def __len__(self):
+        if self._items is None:
+            return len(self.table)
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if self._items is not None:
+            return self._items[index]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        n = len(self.table)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError('list index out of range')
+        return self._record_at_row(index)
+
+    def __iter__(self):
+        return iter(self._materialize())
+
+    def __setitem__(self, index, value):
+        self._materialize()[index] = value
+
+    def __delitem__(self, index):
+        del self._materialize()[index]
+
+    def insert(self, index, value):
+        self._materialize().insert(index, value)
+
+    def append(self, value):
+        self._materialize().append(value)
+
+    def extend(self, values):
+        self._materialize().extend(values)
+
+    def clear(self):
+        self._materialize()
+        self._items = []
+
+    def __eq__(self, other):
+        if isinstance(other, (list, Sequence)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<{}(n={}, lazy={})>'.format(self.__class__.__name__,
+                                            len(self), self.is_lazy)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self._materialize(), memo)
+
+    def __reduce__(self):
+        return (list, (self._materialize(),))
+
+
+class LazyRecordIndex(MutableMapping):
+    """
+    Maps the id of each record in a `LazyRecordList` to the record (e.g.
+    `CocoDataset.anns`) using the id order stored in the table, so building
+    it does not decode any records.
+
+    Any modification converts it into a regular dictionary.
+
+    Args:
+        records (LazyRecordList): records that are still lazy and have an
+            id index (i.e. ``records.table.has_id_index``).
+    """
+    def __init__(self, records):
+        self.records = records
+        self._dict = None
+
+    def _materialize(self):
+        if self._dict is None:
+            ids = self.records.table.ids().tolist()
+            self._dict = {
+                rid: self.records._record_at_row(row)
+                for row, rid in enumerate(ids)
+            }
+        return self._dict
+
+    def __getitem__(self, key):
+        if self._dict is not None:
+            return self._dict[key]
+        row = None
+        if isinstance(key, six.integer_types + (np.integer,)):
+            row = self.records.table.row_of(key)
+        if row is None:
+            raise KeyError(key)
+        return self.records._record_at_row(row)
+
+    def __contains__(self, key):
+        if self._dict is not None:
+            return key in self._dict
+        if isinstance(key, six.integer_types + (np.integer,)):
+            return self.records.table.row_of(key) is not None
+        return False
+
+    def __iter__(self):
+        if self._dict is not None:
+            return iter(self._dict)
+        return iter(self.records.table.ids().tolist())
+
+    def __len__(self):
+        if self._dict is not None:
+            return len(self._dict)
+        return len(self.records.table)
+
+    def __setitem__(self, key, value):
+        self._materialize()[key] = value
+
+    def __delitem__(self, key):
+        del self._materialize()[key]
+
+    def clear(self):
+        self._dict = {}
+
+    def __repr__(self):
+        return '<{}(n={}, lazy={})>'.format(self.__class__.__name__,
+                                            len(self), self._dict is None)
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python -m netharn.data.coco_binary all
+    """
+    import xdoctest
+    xdoctest.doctest_module(__file__)
@@ -55,6 +55,11 @@ class HSVShift(augmenter_base.ParamatarizedAugmenter):
             dSaturation
         value (Number): Random number between 1,value is used to shift the
             value; 50% chance to get 1/dValue in stead of dValue
+        impl (str): either 'lut' or 'float'. The 'lut' implementation
+            converts to 8-bit HSV (with the hue in 0-255) and shifts all
+            three channels with a single lookup table, so the result is
+            quantized to 256 hues. The 'float' implementation converts the
+            image to float32 HSV.
 
     CommandLine:
         python -m netharn.data.transforms.augmenters HSVShift --show
@@ -65,6 +70,15 @@ class HSVShift(augmenter_base.ParamatarizedAugmenter):
         >>> aug = self.augment_image(img)
         >>> det = self.to_deterministic()
         >>> assert np.all(det.augment_image(img) == det.augment_image(img))
+        >>> # The lookup table is close to the float implementation
+        >>> params = (0.1, 1.2, 0.8)
+        >>> aug1 = self.forward(img, params=params)
+        >>> aug2 = HSVShift(0.1, 1.5, 1.5, impl='float').forward(img, params=params)
+        >>> assert np.abs(aug1.astype(int) - aug2).mean() < 2
+        >>> # batches of images can be augmented in place
+        >>> imgs = np.stack([img] * 4)
+        >>> out = self.forward_batch(imgs, inplace=True)
+        >>> assert out is imgs
         >>> # xdoc: +REQUIRES(--show)
         >>> from netharn.util import mplutil
         >>> import ubelt as ub
@@ -107,9 +121,12 @@ class HSVShift(augmenter_base.ParamatarizedAugmenter):
         >>>     mplutil.imshow(from_(aug), colorspace='rgb', pnum=pnums[i], title=title)
         >>> mplutil.show_if_requested()
     """
-    def __init__(self, hue, sat, val, input_colorspace='rgb'):
+    def __init__(self, hue, sat, val, input_colorspace='rgb', impl='lut'):
         super(HSVShift, self).__init__()
+        if impl not in {'lut', 'float'}:
+            raise KeyError(impl)
         self.input_colorspace = input_colorspace
+        self.impl = impl
         self.hue = Uniform(-hue, hue)
         self.sat = Uniform(1, sat)
         self.val = Uniform(1, val)
@@ -123,17 +140,14 @@ class HSVShift(augmenter_base.ParamatarizedAugmenter):
         pass
 
     def _augment_images(self, images, random_state, parents, hooks):
-        return [self.forward(img, random_state) for img in images]
+        # imgaug gives us copies of the images, so we can modify them
+        return self.forward_batch(images, random_state, inplace=True)
 
     def _augment_keypoints(self, keypoints_on_images, random_state, parents,
                            hooks):
         return keypoints_on_images
 
-    @profiler.profile
-    def forward(self, img, random_state=None):
-        assert self.input_colorspace == 'rgb'
-        assert img.dtype.kind == 'u' and img.dtype.itemsize == 1
-
+    def _draw_params(self, random_state=None):
         dh = self.hue.draw_sample(random_state)
         ds = self.sat.draw_sample(random_state)
         dv = self.val.draw_sample(random_state)
@@ -142,8 +156,56 @@ class HSVShift(augmenter_base.ParamatarizedAugmenter):
             ds = 1.0 / ds
         if self.flip_val.draw_sample(random_state):
             dv = 1.0 / dv
+        return dh, ds, dv
+
+    @staticmethod
+    def _lookup_table(dh, ds, dv):
+        """
+        Table that maps 8-bit HSV (hue in 0-255) to the shifted HSV. The
+        channels are the last axis, so `cv2.LUT` shifts all of them at once.
+
+        Example:
+            >>> lut = HSVShift._lookup_table(0.5, 2.0, 0.5)
+            >>> lut[[0, 100, 200], 0]
+            array([[128,   0,   0],
+                   [228, 200,  50],
+                   [ 72, 255, 100]], dtype=uint8)
+        """
+        idxs = np.arange(256, dtype=np.float32)
+        lut = np.empty((256, 1, 3), dtype=np.uint8)
+        lut[:, 0, 0] = (np.arange(256) + int(round(256 * dh))) % 256
+        lut[:, 0, 1] = np.clip(np.round(ds * idxs), 0, 255)
+        lut[:, 0, 2] = np.clip(np.round(dv * idxs), 0, 255)
+        return lut
+
+    @profiler.profile
+    def forward(self, img, random_state=None, params=None, inplace=False):
+        """
+        Args:
+            img (ndarray): uint8 RGB image
+            random_state (RandomState): used to draw the shift
+            params (Tuple[float, float, float]): the hue, sat, and val shift
+                to use instead of drawing one
+            inplace (bool): if True, `img` is modified and returned
+        """
+        assert self.input_colorspace == 'rgb'
+        assert img.dtype.kind == 'u' and img.dtype.itemsize == 1
 
-        self._prev_params = (dh, ds, dv)
+        if params is None:
+            params = self._draw_params(random_state)
+        dh, ds, dv = params
+        self._prev_params = params
+
+        if self.impl == 'lut':
+            hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV_FULL)
+            cv2.LUT(hsv, self._lookup_table(dh, ds, dv), dst=hsv)
+            if not inplace:
+                return cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB_FULL)
+            if img.flags['C_CONTIGUOUS']:
+                cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB_FULL, dst=img)
+            else:
+                img[...] = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB_FULL)
+            return img
 
         # Note the cv2 conversion to HSV does not go into the 0-1 range,
         # instead it goes into (0-360, 0-1, 0-1) for hue, sat, and val.
@@ -169,8 +231,71 @@ class HSVShift(augmenter_base.ParamatarizedAugmenter):
 
         img01 = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
         img255 = (img01 * 255).astype(np.uint8)
+        if inplace:
+            img[...] = img255
+            return img
         return img255
 
+    def forward_batch(self, imgs, random_state=None, inplace=False):
+        """
+        Shifts each image in a batch by its own random amount.
+
+        If `imgs` is an NxHxWx3 array and the 'lut' implementation is used,
+        the color conversions are done once for the whole batch (the images
+        are stacked vertically) and only the lookup tables are applied per
+        image. A non-contiguous array is shifted in a contiguous copy, which
+        is then written back when `inplace` is True.
+
+        Args:
+            imgs (List[ndarray] | ndarray): uint8 RGB images
+            random_state (RandomState): used to draw the shifts
+            inplace (bool): if True, the images are modified in place
+
+        Returns:
+            List[ndarray] | ndarray: the shifted images, in the same type of
+                container as `imgs`
+
+        Example:
+            >>> img = demodata_hsv_image()
+            >>> imgs = np.stack([img] * 3)[:, ::2, ::2]
+            >>> assert not imgs.flags['C_CONTIGUOUS']
+            >>> orig = imgs.copy()
+            >>> for impl in ['lut', 'float']:
+            >>>     self = HSVShift(0.1, 1.5, 1.5, impl=impl)
+            >>>     out = self.forward_batch(imgs)
+            >>>     assert isinstance(out, np.ndarray) and out.shape == imgs.shape
+            >>>     assert np.all(imgs == orig)
+            >>>     out = self.forward_batch(imgs, inplace=True)
+            >>>     assert out is imgs and np.any(imgs != orig)
+            >>>     imgs[...] = orig
+        """
+        if isinstance(imgs, list):
+            return [self.forward(img, random_state, inplace=inplace)
+                    for img in imgs]
+        if self.impl != 'lut':
+            out = imgs if inplace else np.empty_like(imgs)
+            for img, dst in zip(imgs, out):
+                dst[...] = self.forward(img, random_state)
+            return out
+        assert self.input_colorspace == 'rgb'
+        assert imgs.dtype.kind == 'u' and imgs.dtype.itemsize == 1
+        n, h, w = imgs.shape[0:3]
+        if n == 0:
+            return imgs if inplace else imgs.copy()
+        data = np.ascontiguousarray(imgs)
+        hsv = cv2.cvtColor(data.reshape(n * h, w, 3), cv2.COLOR_RGB2HSV_FULL)
+        for i in range(n):
+            params = self._draw_params(random_state)
+            self._prev_params = params
+            part = hsv[i * h:(i + 1) * h]
+            cv2.LUT(part, self._lookup_table(*params), dst=part)
+        if inplace:
+            cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB_FULL, dst=data.reshape(n * h, w, 3))
+            if data is not imgs:
+                imgs[...] = data
+            return imgs
+        return cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB_FULL).reshape(n, h, w, 3)
+
 
 class Resize(augmenter_base.ParamatarizedAugmenter):
     """
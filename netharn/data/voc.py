@@ -6,8 +6,6 @@ resizes images to a standard size.
 from os.path import exists
 from os.path import join
 import re
-import scipy
-import scipy.sparse
 import cv2
 import torch
 import glob
@@ -53,14 +51,28 @@ class VOCDataset(torch_data.Dataset, ub.NiceRepr):
         util.qtensure()
         self1.show_image(198)
         self2.show_image(300)
+
+    Args:
+        devkit_dpath (str): path to VOCdevkit (downloaded if not given)
+        split (str): train, val, trainval, or test
+        years (List[int]): which VOC challenges to use
+        workdir (str): the parsed annotations (and the decoded images, see
+            `ensure_image_cache`) are cached in `_cache` in this directory.
+            Defaults to the netharn application cache.
     """
-    def __init__(self, devkit_dpath=None, split='train', years=[2007, 2012]):
+    def __init__(self, devkit_dpath=None, split='train', years=[2007, 2012],
+                 workdir=None):
         if devkit_dpath is None:
             # ub.truepath('~/data/VOC/VOCdevkit')
             devkit_dpath = self.ensure_voc_data(years=years)
 
         self.devkit_dpath = devkit_dpath
         self.years = years
+        self.workdir = workdir
+        self._annot_cache = None
+        self._image_cache = None
+        # The pre-resized sizes in the image cache (None if it is not used)
+        self.image_cache_sizes = None
 
         # determine train / test splits
         self.gpaths = []
@@ -212,7 +224,6 @@ class VOCDataset(torch_data.Dataset, ub.NiceRepr):
 
     def _load_item(self, index, inp_size=None):
         # from netharn.models.yolo2.utils.yolo import _offset_boxes
-        image = self._load_image(index)
         annot = self._load_annotation(index)
 
         boxes = annot['boxes'].astype(np.float32)
@@ -220,39 +231,207 @@ class VOCDataset(torch_data.Dataset, ub.NiceRepr):
 
         # squish the bounding box and image into a standard size
         if inp_size is None:
+            image = self._load_image(index)
             return image, boxes, gt_classes
         else:
             w, h = inp_size
-            sx = float(w) / image.shape[1]
-            sy = float(h) / image.shape[0]
-            boxes[:, 0::2] *= sx
-            boxes[:, 1::2] *= sy
-            interpolation = cv2.INTER_AREA if (sx + sy) <= 2 else cv2.INTER_CUBIC
-            hwc = cv2.resize(image, (w, h), interpolation=interpolation)
+            hwc = self._load_cached_resize(index, inp_size)
+            if hwc is None:
+                image = self._load_image(index)
+                hwc = self._resize_image(image, inp_size)
+                orig_h, orig_w = image.shape[0:2]
+            else:
+                orig_h, orig_w = self._get_image_cache()['shapes'][index][0:2]
+            boxes[:, 0::2] *= float(w) / orig_w
+            boxes[:, 1::2] *= float(h) / orig_h
             return hwc, boxes, gt_classes
 
+    def _resize_image(self, image, inp_size):
+        """
+        Squishes an image to `inp_size`. Subclasses that resize differently
+        override this so the image cache stores their resized images.
+        """
+        w, h = inp_size
+        sx = float(w) / image.shape[1]
+        sy = float(h) / image.shape[0]
+        interpolation = cv2.INTER_AREA if (sx + sy) <= 2 else cv2.INTER_CUBIC
+        hwc = cv2.resize(image, (int(w), int(h)), interpolation=interpolation)
+        return hwc
+
     def _load_image(self, index):
+        cache = self._get_image_cache()
+        if cache is None:
+            return self._read_image(index)
+        start, stop = cache['offsets'][index:index + 2]
+        shape = tuple(cache['shapes'][index])
+        return np.array(cache['native'][start:stop]).reshape(shape)
+
+    def _read_image(self, index):
         fpath = self.gpaths[index]
         imbgr = cv2.imread(fpath, flags=cv2.IMREAD_COLOR)
         imrgb_255 = cv2.cvtColor(imbgr, cv2.COLOR_BGR2RGB)
         return imrgb_255
 
+    def _load_cached_resize(self, index, inp_size):
+        """
+        Returns the image resized to `inp_size` by `_resize_image` if it is in
+        the image cache, otherwise None.
+        """
+        cache = self._get_image_cache()
+        if cache is None:
+            return None
+        shard = cache['resized'].get(tuple(map(int, inp_size)))
+        if shard is None:
+            return None
+        return np.array(shard[index])
+
+    def _get_image_cache(self):
+        if self.image_cache_sizes is None:
+            return None
+        if self._image_cache is None:
+            # Reopen the shards (e.g. in a loader worker)
+            self.ensure_image_cache(sizes=self.image_cache_sizes)
+        return self._image_cache
+
+    def ensure_image_cache(self, sizes=None, workers=0):
+        """
+        Decodes every image once and stores the RGB uint8 pixels in
+        memory-mapped shard files, which `_load_image` reads instead of the
+        JPEG files.
+
+        The `native` shard holds the full size images back to back, indexed
+        by `offsets` and `shapes`. For each size in `sizes` a shard of the
+        images resized by `_resize_image` is also stored, so `_load_item`
+        does not resize. The shards are opened read-only, so DataLoader
+        workers share their pages.
+
+        Args:
+            sizes (List[Tuple[int, int]]): (w, h) sizes to pre-resize to
+            workers (int): number of threads used to decode and resize
+
+        Returns:
+            Dict: the native shard, its index, and the resized shards
+
+        Example:
+            >>> # xdoc: +REQUIRES(--voc)
+            >>> self = VOCDataset(split='test', years=[2007])
+            >>> cache = self.ensure_image_cache(sizes=[(416, 416)], workers=4)
+            >>> assert np.all(self._load_image(3) == self._read_image(3))
+            >>> chw, label = self[3]
+            >>> assert chw.shape == (3, 416, 416)
+        """
+        sizes = [tuple(map(int, size)) for size in (sizes or [])]
+        hashid = ub.hash_data(self.gpaths)[0:16]
+        dpath = ub.ensuredir((self._cache_dpath(), 'voc_images_' + hashid))
+        n = len(self)
+        # Dont let _load_image read old shards while we build them
+        self.image_cache_sizes = None
+        self._image_cache = None
+
+        fpaths = {key: join(dpath, 'native_' + key + '.npy')
+                  for key in ['offsets', 'shapes']}
+        fpaths['native'] = join(dpath, 'native.bin')
+        stamp = ub.CacheStamp('voc_images_native', dpath=dpath, cfgstr=hashid,
+                              product=list(fpaths.values()), hasher=None)
+        if stamp.expired():
+            shapes = np.zeros((n, 3), dtype=np.int64)
+            # Keep a bounded number of decoded images in memory
+            chunksize = max(workers, 1) * 8
+            prog = ub.ProgIter(total=n, label='decode voc images')
+            prog.begin()
+            with open(fpaths['native'], 'wb') as file:
+                with ub.Executor(mode='thread', max_workers=workers) as executor:
+                    for start in range(0, n, chunksize):
+                        idxs = range(start, min(start + chunksize, n))
+                        jobs = [executor.submit(self._read_image, index)
+                                for index in idxs]
+                        for index, job in zip(idxs, jobs):
+                            image = job.result()
+                            shapes[index] = image.shape
+                            np.ascontiguousarray(image).tofile(file)
+                            prog.step()
+            prog.end()
+            offsets = np.hstack([[0], np.cumsum(shapes.prod(axis=1))])
+            np.save(fpaths['offsets'], offsets.astype(np.int64))
+            np.save(fpaths['shapes'], shapes)
+            stamp.renew()
+
+        self._image_cache = {
+            'native': (np.memmap(fpaths['native'], dtype=np.uint8, mode='r')
+                       if n else np.empty(0, dtype=np.uint8)),
+            'offsets': np.load(fpaths['offsets']),
+            'shapes': np.load(fpaths['shapes']),
+            'resized': {},
+        }
+        self.image_cache_sizes = []
+
+        # The resized images depend on how this class resizes them
+        resize_id = type(self).__name__
+        for size in sizes:
+            w, h = size
+            fpath = join(dpath, 'resized_{}_{}x{}.npy'.format(resize_id, w, h))
+            stamp = ub.CacheStamp('voc_images_{}_{}x{}'.format(resize_id, w, h),
+                                  dpath=dpath, cfgstr=hashid, product=[fpath],
+                                  hasher=None)
+            if stamp.expired():
+                shard = np.lib.format.open_memmap(
+                    fpath, mode='w+', dtype=np.uint8, shape=(n, h, w, 3))
+
+                def _fill(index):
+                    shard[index] = self._resize_image(
+                        self._load_image(index), size)
+
+                with ub.Executor(mode='thread', max_workers=workers) as executor:
+                    jobs = [executor.submit(_fill, index) for index in range(n)]
+                    label = 'resize voc images to {}x{}'.format(w, h)
+                    for job in ub.ProgIter(jobs, label=label):
+                        job.result()
+                shard.flush()
+                del shard
+                stamp.renew()
+            self._image_cache['resized'][size] = np.load(fpath, mmap_mode='r')
+            self.image_cache_sizes.append(size)
+        return self._image_cache
+
     def _load_annotation(self, index):
+        """
+        Returns the annotations of one image from the annotation cache
+
+        Example:
+            >>> # xdoc: +REQUIRES(--voc)
+            >>> self = VOCDataset(split='test', years=[2007])
+            >>> annot = self._load_annotation(0)
+            >>> assert len(annot['boxes']) == len(annot['gt_classes'])
+        """
+        cache = self._ensure_annot_cache()
+        start, stop = cache['offsets'][index:index + 2]
+        boxes = np.array(cache['boxes'][start:stop])
+        gt_classes = np.array(cache['class_idxs'][start:stop], dtype=np.int32)
+        ishards = np.array(cache['ishards'][start:stop], dtype=np.int32)
+        # "Seg" area for pascal is just the box area
+        seg_areas = ((boxes[:, 2] - boxes[:, 0] + 1.0) *
+                     (boxes[:, 3] - boxes[:, 1] + 1.0)).astype(np.float32)
+        annots = {'boxes': boxes,
+                  'gt_classes': gt_classes,
+                  'gt_ishard': ishards,
+                  'flipped': False,
+                  'fpath': self.apaths[index],
+                  'seg_areas': seg_areas}
+        return annots
+
+    def _parse_annotation(self, fpath):
+        """
+        Reads the boxes, classes, and difficult flags from one VOC xml file
+        """
         import xml.etree.ElementTree as ET
-        fpath = self.apaths[index]
         tree = ET.parse(fpath)
         objs = tree.findall('object')
 
         num_objs = len(objs)
-
         boxes = np.zeros((num_objs, 4), dtype=np.uint16)
         gt_classes = np.zeros((num_objs), dtype=np.int32)
-        overlaps = np.zeros((num_objs, self.num_classes), dtype=np.float32)
-        # "Seg" area for pascal is just the box area
-        seg_areas = np.zeros((num_objs), dtype=np.float32)
         ishards = np.zeros((num_objs), dtype=np.int32)
 
-        # Load object bounding boxes into a data frame.
         for ix, obj in enumerate(objs):
             bbox = obj.find('bndbox')
             # Make pixel indexes 0-based
@@ -269,19 +448,65 @@ class VOCDataset(torch_data.Dataset, ub.NiceRepr):
             cls = self._class_to_ind[clsname]
             boxes[ix, :] = [x1, y1, x2, y2]
             gt_classes[ix] = cls
-            overlaps[ix, cls] = 1.0
-            seg_areas[ix] = (x2 - x1 + 1) * (y2 - y1 + 1)
+        return boxes, gt_classes, ishards
 
-        overlaps = scipy.sparse.csr_matrix(overlaps)
+    def _cache_dpath(self):
+        if self.workdir is None:
+            return ub.ensure_app_cache_dir('netharn', 'voc')
+        else:
+            return ub.ensuredir((self.workdir, '_cache'))
 
-        annots = {'boxes': boxes,
-                  'gt_classes': gt_classes,
-                  'gt_ishard': ishards,
-                  'gt_overlaps': overlaps,
-                  'flipped': False,
-                  'fpath': fpath,
-                  'seg_areas': seg_areas}
-        return annots
+    def _ensure_annot_cache(self):
+        """
+        Parses every annotation file once into flat arrays: `boxes` (uint16
+        tlbr), `class_idxs`, `ishards` (difficult flags), and `offsets`, where
+        the annotations of image `i` are rows `offsets[i]:offsets[i + 1]`.
+
+        The arrays are saved in the cache directory keyed by a hash of the
+        annotation paths and are opened as memmaps, so DataLoader workers
+        share the same pages instead of each holding a copy.
+
+        Returns:
+            Dict[str, ndarray]: the cached arrays
+        """
+        if self._annot_cache is not None:
+            return self._annot_cache
+        hashid = ub.hash_data(self.apaths)[0:16]
+        dpath = ub.ensuredir((self._cache_dpath(), 'voc_annots_' + hashid))
+        keys = ['boxes', 'class_idxs', 'ishards', 'offsets']
+        fpaths = {key: join(dpath, key + '.npy') for key in keys}
+
+        stamp = ub.CacheStamp('voc_annots', dpath=dpath, cfgstr=hashid,
+                              product=list(fpaths.values()), hasher=None)
+        if stamp.expired():
+            parts = [self._parse_annotation(fpath) for fpath in
+                     ub.ProgIter(self.apaths, label='parse voc annots')]
+            counts = [len(boxes) for boxes, _, _ in parts]
+            arrays = {
+                'boxes': np.vstack([p[0] for p in parts] +
+                                   [np.empty((0, 4), dtype=np.uint16)]),
+                'class_idxs': np.hstack([p[1] for p in parts] +
+                                        [np.empty(0, dtype=np.int32)]),
+                'ishards': np.hstack([p[2] for p in parts] +
+                                     [np.empty(0, dtype=np.int32)]),
+                'offsets': np.hstack([[0], np.cumsum(counts)]),
+            }
+            arrays['class_idxs'] = arrays['class_idxs'].astype(np.uint8)
+            arrays['ishards'] = arrays['ishards'].astype(np.uint8)
+            arrays['offsets'] = arrays['offsets'].astype(np.int64)
+            for key in keys:
+                np.save(fpaths[key], arrays[key])
+            stamp.renew()
+        self._annot_cache = {key: np.load(fpaths[key], mmap_mode='r')
+                             for key in keys}
+        return self._annot_cache
+
+    def __getstate__(self):
+        # Dont pickle the memmaps, workers reopen them
+        state = self.__dict__.copy()
+        state['_annot_cache'] = None
+        state['_image_cache'] = None
+        return state
 
     def show_image(self, index, fnum=None):
         from netharn import util
@@ -340,6 +565,8 @@ class VOCDataset(torch_data.Dataset, ub.NiceRepr):
             >>> assert len(labels) == 2
             >>> assert len(labels[0]) == len(images)
         """
+        # Build the annotation cache before any workers are started
+        self._ensure_annot_cache()
         kwargs['collate_fn'] = collate.list_collate
         loader = torch_data.DataLoader(self, *args, **kwargs)
         return loader
@@ -354,17 +581,19 @@ class VOCDataset(torch_data.Dataset, ub.NiceRepr):
         for cx, catname in enumerate(self.label_names):
             coco_dset.add_category(catname, cid=int(cx))
 
+        cache = self._ensure_annot_cache()
+        boxes = np.asarray(cache['boxes'])
+        cxs = np.asarray(cache['class_idxs'])
+        weights = 1 - np.asarray(cache['ishards'], dtype=np.int32)
+        offsets = cache['offsets']
         for gx, gpath in enumerate(ub.ProgIter(voc_dset.gpaths,
                                                label='convert coco')):
             coco_dset.add_image(gpath, gid=int(gx))
-            voc_anno = self._load_annotation(gx)
-
-            for i in range(len(voc_anno['boxes'])):
-                box = nh.util.Boxes(voc_anno['boxes'][i], 'tlbr')
-                cx = voc_anno['gt_classes'][i]
-                weight = 1 - voc_anno['gt_ishard'][i]
+            for i in range(offsets[gx], offsets[gx + 1]):
+                box = nh.util.Boxes(boxes[i], 'tlbr')
                 coco_dset.add_annotation(
-                    gid=int(gx), cid=int(cx), bbox=box, weight=weight)
+                    gid=int(gx), cid=int(cxs[i]), bbox=box,
+                    weight=weights[i])
         return coco_dset
 
 
@@ -11,7 +11,7 @@ import six
 import os
 
 
-__all__ = ['XPU']
+__all__ = ['XPU', 'spawn_distributed']
 
 try:
     # minimum memory (MB) needed for auto to resolve to GPU by default
@@ -40,6 +40,15 @@ class DataParallel(torch.nn.DataParallel, MountedModel):
     pass
 
 
+class DistributedDataParallel(torch.nn.parallel.DistributedDataParallel,
+                              MountedModel):
+    """
+    Hack to redefine DistributedDataParallel such that it shares a base with
+    DataSerial
+    """
+    pass
+
+
 class DataSerial(MountedModel):
     """
     Wraper to create consistent API with DataParallel
@@ -59,8 +68,10 @@ class XPU(ub.NiceRepr):
     Args:
         item (None, int, or list): None for cpu, an int for a gpu, or a list of
             ints for multiple gpus.
-    TODO:
-        distributed processing
+
+    Note:
+        Use `XPU.distributed` to create the device of one process in a
+        multi-process (DistributedDataParallel) group.
 
     CommandLine:
         python -m netharn.device XPU
@@ -81,6 +92,11 @@ class XPU(ub.NiceRepr):
         xpu._device_ids = None
         xpu.mode = None
 
+        # Only used in distributed mode
+        xpu.rank = 0
+        xpu.world_size = 1
+        xpu.backend = None
+
         # For context manager
         xpu._cuda_device = None
 
@@ -130,6 +146,44 @@ class XPU(ub.NiceRepr):
         if xpu._main_device_id is not None:
             xpu._cuda_device = torch.cuda.device(xpu._main_device_id)
 
+    @classmethod
+    def distributed(XPU, item=None, backend=None, rank=None, world_size=None):
+        """
+        The device of one process in a group of processes that train a model
+        with DistributedDataParallel. Each process uses a single device.
+
+        Args:
+            item (None or int): None for cpu or an int for a gpu
+            backend (str): torch.distributed backend. Defaults to nccl for
+                gpus and gloo for cpus.
+            rank (int): index of this process. Defaults to the RANK
+                environment variable (set by `torch.distributed.launch`).
+            world_size (int): number of processes. Defaults to the
+                WORLD_SIZE environment variable.
+
+        Example:
+            >>> xpu = XPU.distributed(None, rank=1, world_size=2)
+            >>> print(xpu)
+            Distributed(CPU, rank=1/2)
+            >>> print(xpu.__json__())
+            Distributed(CPU, world_size=2)
+            >>> assert xpu.is_distributed() and not xpu.is_main_process()
+        """
+        xpu = XPU(item)
+        if xpu._device_ids:
+            raise ValueError('distributed processes use a single device')
+        if rank is None:
+            rank = int(os.environ.get('RANK', 0))
+        if world_size is None:
+            world_size = int(os.environ.get('WORLD_SIZE', 1))
+        if backend is None:
+            backend = 'nccl' if xpu.is_gpu() else 'gloo'
+        xpu.mode = 'distributed'
+        xpu.rank = rank
+        xpu.world_size = world_size
+        xpu.backend = backend
+        return xpu
+
     @property
     def main_device(xpu):
         """
@@ -231,6 +285,8 @@ class XPU(ub.NiceRepr):
                 return XPU.from_auto(**kwargs)
             elif item == 'argv':
                 return XPU.from_argv(**kwargs)
+            elif item == 'distributed':
+                return XPU._distributed_from_env()
             if item == 'cpu' or item is None:
                 return XPU(None)
             elif item == 'cpu' or item is None:
@@ -291,7 +347,9 @@ class XPU(ub.NiceRepr):
             gpu_num = XPU.default_gpu()
         else:
             gpu_num = ub.argval('--gpu', default=None)
-        if ub.argflag('--cpu'):
+        if ub.argflag('--distributed'):
+            xpu = XPU._distributed_from_env()
+        elif ub.argflag('--cpu'):
             xpu = XPU(None)
         elif gpu_num is None:
             xpu = XPU.from_auto(**kwargs)
@@ -305,6 +363,18 @@ class XPU(ub.NiceRepr):
                 xpu = XPU(int(gpu_num))
         return xpu
 
+    @classmethod
+    def _distributed_from_env(XPU):
+        """
+        Uses the LOCAL_RANK environment variable (set by
+        `torch.distributed.launch`) to pick the gpu of this process.
+        """
+        if torch.cuda.is_available():
+            item = int(os.environ.get('LOCAL_RANK', 0))
+        else:
+            item = None
+        return XPU.distributed(item)
+
     def __str__(xpu):
         return xpu.__nice__()
 
@@ -318,6 +388,12 @@ class XPU(ub.NiceRepr):
             return xpu._cuda_device.__exit__(ex_type, ex_value, tb)
 
     def __nice__(xpu):
+        if xpu.is_distributed():
+            return 'Distributed({}, rank={}/{})'.format(
+                xpu._device_nice(), xpu.rank, xpu.world_size)
+        return xpu._device_nice()
+
+    def _device_nice(xpu):
         if xpu.is_gpu():
             if xpu._device_ids:
                 parts = [str(n) + '*' if n == xpu._main_device_id else str(n)
@@ -341,6 +417,10 @@ class XPU(ub.NiceRepr):
             >>> print(XPU([1, 2, 3], check=False).__json__())
             GPU(1*,2,3)
         """
+        if xpu.is_distributed():
+            # Every process must have the same json
+            return 'Distributed({}, world_size={})'.format(
+                xpu._device_nice(), xpu.world_size)
         return str(xpu)
 
     def __int__(xpu):
@@ -350,6 +430,70 @@ class XPU(ub.NiceRepr):
         """ The number of underlying devices abstracted by this XPU """
         return 1 if not xpu._device_ids else len(xpu._device_ids)
 
+    def is_distributed(xpu):
+        """ True if this is one process of a distributed group """
+        return xpu.mode == 'distributed'
+
+    def is_main_process(xpu):
+        """
+        True unless this is a distributed process other than rank 0. Only the
+        main process should write logs and snapshots.
+        """
+        return xpu.rank == 0
+
+    def init_process_group(xpu):
+        """
+        Joins the distributed process group (if it has not been joined yet).
+
+        The group is found with the MASTER_ADDR and MASTER_PORT environment
+        variables, which default to localhost:29500.
+        """
+        import torch.distributed as dist
+        if not dist.is_initialized():
+            os.environ.setdefault('MASTER_ADDR', 'localhost')
+            os.environ.setdefault('MASTER_PORT', '29500')
+            dist.init_process_group(xpu.backend, init_method='env://',
+                                    rank=xpu.rank, world_size=xpu.world_size)
+
+    def barrier(xpu):
+        """ Waits for all distributed processes to get here """
+        if xpu.is_distributed():
+            import torch.distributed as dist
+            dist.barrier()
+
+    def broadcast_state(xpu, model):
+        """
+        Copies the parameters and buffers of the main process to the model of
+        every other process (e.g. after they were initialized differently).
+        """
+        if xpu.is_distributed():
+            import torch.distributed as dist
+            with torch.no_grad():
+                for tensor in model.state_dict().values():
+                    dist.broadcast(tensor, src=0)
+
+    def all_reduce_mean(xpu, values):
+        """
+        Averages a list of numbers over all distributed processes.
+
+        Args:
+            values (List[float]): the same number of values in each process
+
+        Returns:
+            List[float]: the averages
+
+        Example:
+            >>> XPU(None).all_reduce_mean([1.0, 2.0])
+            [1.0, 2.0]
+        """
+        if not xpu.is_distributed() or xpu.world_size == 1:
+            return list(values)
+        import torch.distributed as dist
+        tensor = xpu.move(torch.tensor(values, dtype=torch.float64))
+        dist.all_reduce(tensor)
+        tensor /= xpu.world_size
+        return tensor.cpu().tolist()
+
     def is_gpu(xpu):
         """ True if running in single or parallel gpu mode """
         return xpu._main_device_id is not None
@@ -369,12 +513,17 @@ class XPU(ub.NiceRepr):
             >>> model = torch.nn.Conv2d(1, 1, 1)
             >>> xpu = XPU()
         """
-        if isinstance(model, (MountedModel, torch.nn.DataParallel)):
+        if isinstance(model, (MountedModel, torch.nn.DataParallel,
+                              torch.nn.parallel.DistributedDataParallel)):
             # Unwrap the core model
             model = model.module
 
         model = xpu.move(model)
-        if xpu._device_ids:
+        if xpu.is_distributed():
+            xpu.init_process_group()
+            device_ids = [xpu._main_device_id] if xpu.is_gpu() else None
+            model = DistributedDataParallel(model, device_ids=device_ids)
+        elif xpu._device_ids:
             model = DataParallel(model, device_ids=xpu._device_ids,
                                  output_device=xpu._main_device_id)
         else:
@@ -475,6 +624,9 @@ class XPU(ub.NiceRepr):
         """
         Loads data from a filepath onto this XPU
 
+        Snapshot manifests written by `util.save_deduplicated` are loaded
+        with their stored tensors.
+
         Args:
             fpath (str or file): path to torch data file or file-like object
 
@@ -489,8 +641,16 @@ class XPU(ub.NiceRepr):
             >>> assert all(data == loaded)
         """
         # print('Loading data onto {} from {}'.format(xpu, fpath))
+        from netharn.util import util_snapshot
         try:
-            return torch.load(fpath, map_location=xpu._map_location)
+            data = torch.load(fpath, map_location=xpu._map_location)
+            if util_snapshot.is_manifest(data):
+                # A deduplicated snapshot (see `util.save_deduplicated`)
+                if not isinstance(fpath, six.string_types):
+                    fpath = getattr(fpath, 'name', None)
+                data = util_snapshot.resolve_manifest(
+                    data, fpath, map_location=xpu._map_location)
+            return data
         except Exception:
             print('XPU={} Failed to load fpath={}'.format(xpu, fpath))
             raise
@@ -521,6 +681,56 @@ class XPU(ub.NiceRepr):
             torch.cuda.synchronize()
 
 
+def _find_free_port():
+    import socket
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('', 0))
+        return sock.getsockname()[1]
+
+
+def _distributed_worker(rank, func, world_size, gpus, backend, master_port,
+                        args):
+    os.environ.setdefault('MASTER_ADDR', 'localhost')
+    os.environ['MASTER_PORT'] = str(master_port)
+    item = None if gpus is None else gpus[rank]
+    xpu = XPU.distributed(item, backend=backend, rank=rank,
+                          world_size=world_size)
+    func(xpu, *args)
+
+
+def spawn_distributed(func, world_size, args=(), gpus=None, backend=None,
+                      master_port=None):
+    """
+    Runs `func(xpu, *args)` in `world_size` processes on this machine, where
+    `xpu` is the distributed device of each process.
+
+    `func` usually builds a `FitHarn` with `xpu` as its xpu and runs it. The
+    processes are started with the spawn method, so `func` must be importable
+    (i.e. defined at the top level of a module).
+
+    To train on multiple machines, start the processes with
+    `python -m torch.distributed.launch` and use `--distributed` (or
+    `XPU.cast('distributed')`) instead.
+
+    Args:
+        func (callable): the function to run in each process
+        world_size (int): the number of processes
+        args (tuple): extra arguments to `func`
+        gpus (List[int]): the gpu of each process. If None the processes run
+            on the cpu.
+        backend (str): defaults to nccl for gpus and gloo for cpus
+        master_port (int): port of the rank 0 process. Defaults to a free
+            port.
+    """
+    import torch.multiprocessing as mp
+    if gpus is not None and len(gpus) != world_size:
+        raise ValueError('need one gpu per process')
+    if master_port is None:
+        master_port = _find_free_port()
+    mp.spawn(_distributed_worker, nprocs=world_size, join=True,
+             args=(func, world_size, gpus, backend, master_port, args))
+
+
 def find_unused_gpu(min_memory=0):
     """
     Finds GPU with the lowest memory usage by parsing output of nvidia-smi
@@ -135,6 +135,26 @@ def find_best_snapshot(train_dpath):
     """
     Returns snapshot written by monitor if available otherwise takes the last
     one.
+
+    The snapshot may be a manifest of a deduplicated snapshot (see
+    `harn.config['dedup_snapshots']`). `XPU.load` and
+    `netharn.util.load_deduplicated` read both kinds of snapshots.
+
+    Example:
+        >>> import torch
+        >>> import netharn as nh
+        >>> dpath = ub.ensure_app_cache_dir('netharn', 'tests/find_best_dedup')
+        >>> ub.delete(dpath)
+        >>> snapshot_dpath = ub.ensuredir((dpath, 'torch_snapshots'))
+        >>> state = {'epoch': 3, 'model_state_dict': {'w': torch.rand(64, 64)}}
+        >>> fpath = join(snapshot_dpath, '_epoch_00000003.pt')
+        >>> nh.util.save_deduplicated(state, fpath)
+        >>> nh.util.link_or_copy(fpath, join(dpath, 'best_snapshot.pt'))
+        >>> snap_fpath = find_best_snapshot(dpath)
+        >>> assert snap_fpath == join(dpath, 'best_snapshot.pt')
+        >>> loaded = nh.XPU(None).load(snap_fpath)
+        >>> assert torch.all(loaded['model_state_dict']['w'] ==
+        >>>                  state['model_state_dict']['w'])
     """
     # Netharn should populate best_snapshot.pt if there is a validation set.
     # Other names are to support older codebases.
@@ -210,8 +230,18 @@ def _package_deploy(train_dpath):
         state = torch.load(snap_fpath)
         epoch = '{:03d}'.format(state['epoch'])
     except Exception:
+        state = None
         epoch = 'UNKNOWN-EPOCH'
 
+    deploy_snap_fpath = snap_fpath
+    from netharn.util import util_snapshot
+    if util_snapshot.is_manifest(state):
+        # The deployment needs the snapshot with its deduplicated tensors
+        from netharn.util import util_io
+        state = util_snapshot.resolve_manifest(state, snap_fpath)
+        deploy_snap_fpath = join(train_dpath, '.deploy_snapshot.pt')
+        util_io.atomic_save(state, deploy_snap_fpath)
+
     deploy_name = 'deploy_{model}_{trainid}_{epoch}_{weights}'.format(
         model=model_name,
         trainid=train_hash,
@@ -229,7 +259,7 @@ def _package_deploy(train_dpath):
     with zipfile.ZipFile(zipfpath, 'w') as myzip:
         if exists(train_info_fpath):
             zwrite(myzip, train_info_fpath)
-        zwrite(myzip, snap_fpath, fname='deploy_snapshot.pt')
+        zwrite(myzip, deploy_snap_fpath, fname='deploy_snapshot.pt')
         for model_fpath in model_fpaths:
             zwrite(myzip, model_fpath)
         # Add some quick glanceable info
@@ -237,6 +267,8 @@ def _package_deploy(train_dpath):
         #     zwrite(myzip, bestacc_fpath)
         for p in glob.glob(join(train_dpath, 'glance/*')):
             zwrite(myzip, p)
+    if deploy_snap_fpath != snap_fpath:
+        os.remove(deploy_snap_fpath)
     print('[DEPLOYER] Deployed zipfpath={}'.format(zipfpath))
     return zipfpath
 
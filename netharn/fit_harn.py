@@ -123,17 +123,19 @@ Example:
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 import glob
+import copy
+import contextlib
 import itertools as it
 import logging
 import os
 import parse
-import shutil
 import time
 import sys
 import six
 import warnings
 import functools
 from os.path import join
+from os.path import exists
 
 import torch
 import numpy as np
@@ -232,27 +234,39 @@ class InitializeMixin:
         """
         Uses the hyper parameters to initialize the necessary resources and
         restart from previously
+
+        In a distributed run (see `XPU.distributed`) every process calls this,
+        but only the main process writes to the training directory.
         """
+        harn._setup_xpu()
+        is_main = harn._is_main_process()
+
         if reset == 'delete':
-            print('RESET HARNESS BY DELETING EVERYTHING IN TRAINING DIR')
             if harn.train_info is None:
                 # Need to determine which path needs deletion.
                 harn._setup_paths()
-            for path in glob.glob(join(harn.train_dpath, '*')):
-                ub.delete(path)
-        elif reset:
+            if is_main:
+                print('RESET HARNESS BY DELETING EVERYTHING IN TRAINING DIR')
+                for path in glob.glob(join(harn.train_dpath, '*')):
+                    ub.delete(path)
+        elif reset and is_main:
             print('RESET HARNESS BY RESTARTING FROM EPOCH 0')
 
         if harn.train_info is None:
             harn._setup_paths()
-        else:
+        elif is_main:
             ub.ensuredir(harn.train_dpath)
 
-        # Dump training info to disk
-        # TODO: if train_info already exists, and it is not the same as this
-        # train info, keep a backup of the old ones.
-        train_info_fpath = join(harn.train_dpath, 'train_info.json')
-        util.write_json(train_info_fpath, harn.train_info)
+        if is_main:
+            # Dump training info to disk
+            # TODO: if train_info already exists, and it is not the same as
+            # this train info, keep a backup of the old ones.
+            train_info_fpath = join(harn.train_dpath, 'train_info.json')
+            util.write_json(train_info_fpath, harn.train_info)
+
+        # The other processes wait until the main one has setup the train_dpath
+        if harn.xpu is not None:
+            harn.xpu.barrier()
 
         harn._setup_loggers()
 
@@ -273,6 +287,10 @@ class InitializeMixin:
         except CannotResume:
             harn.reset_weights()
 
+        if harn.xpu.is_distributed():
+            # Start every process from the weights of the main one
+            harn.xpu.broadcast_state(harn.model)
+
         if harn.train_dpath:
             harn.info(' * harn.train_dpath = {!r}'.format(harn.train_dpath))
             harn.info(' * harn.nice_dpath  = {!r}'.format(harn.nice_dpath))
@@ -284,12 +302,61 @@ class InitializeMixin:
         harn._initialized = True
         harn.after_initialize()
 
+    def _setup_xpu(harn):
+        """
+        Creates the device (and joins the process group in a distributed run)
+
+        Example:
+            >>> # A distributed run with a single process
+            >>> import netharn as nh
+            >>> import torch.distributed as dist
+            >>> from netharn.device import _find_free_port
+            >>> os.environ['MASTER_PORT'] = str(_find_free_port())
+            >>> harn = nh.FitHarn({
+            >>>     'workdir': ub.ensure_app_cache_dir('netharn/tests/ddp'),
+            >>>     'nice': 'ddp',
+            >>>     'xpu': nh.XPU.distributed(None, rank=0, world_size=1),
+            >>>     'datasets': {'train': nh.data.ToyData2d(size=3, n=32),
+            >>>                  'vali': nh.data.ToyData2d(size=3, n=16)},
+            >>>     'loaders': {'batch_size': 8},
+            >>>     'model': (nh.models.ToyNet2d, {}),
+            >>>     'optimizer': (nh.optimizers.SGD, {'lr': 0.001}),
+            >>>     'criterion': (nh.criterions.CrossEntropyLoss, {}),
+            >>>     'monitor': (nh.Monitor, {'max_epoch': 2}),
+            >>> })
+            >>> harn.config['show_prog'] = False
+            >>> harn.initialize(reset='delete')
+            >>> assert dist.is_initialized()
+            >>> assert isinstance(harn.model, torch.nn.parallel.DistributedDataParallel)
+            >>> harn.run()
+            >>> assert len(harn.prev_snapshots()) > 0
+            >>> dist.destroy_process_group()
+        """
+        if harn.hyper is not None:
+            harn.debug('make XPU')
+            harn.xpu = harn.hyper.make_xpu()
+            harn.debug('harn.xpu = {!r}'.format(harn.xpu))
+        if harn.xpu is not None:
+            if harn.xpu.is_distributed():
+                harn.xpu.init_process_group()
+            harn.xpu.set_as_default()
+
+    def _is_main_process(harn):
+        """
+        False if this is a distributed process other than rank 0
+        """
+        return harn.xpu is None or harn.xpu.is_main_process()
+
     def _setup_paths(harn):
         if harn.hyper is None:
             harn.warn('harn.train_dpath is None, cannot setup_paths')
         else:
             paths = folders.Folders(hyper=harn.hyper)
-            train_info = paths.setup_dpath(train_dpath=harn.train_dpath)
+            if harn._is_main_process():
+                train_info = paths.setup_dpath(train_dpath=harn.train_dpath)
+            else:
+                # Only the main process creates directories and symlinks
+                train_info = paths.train_info(train_dpath=harn.train_dpath)
             harn.train_info = train_info
             harn.nice_dpath = train_info['nice_dpath']
             harn.train_dpath = train_info['train_dpath']
@@ -303,6 +370,21 @@ class InitializeMixin:
             harn.warn('harn.train_dpath is None, cannot setup loggers')
             return
 
+        if not harn._is_main_process():
+            # Only the main process writes logs. The others just report
+            # warnings and errors.
+            if harn._log is None:
+                _log = logging.getLogger(harn.__class__.__name__ + ':' + six.text_type(id(harn)))
+                _log.propagate = False
+                _log.setLevel(logging.WARNING)
+                s_formatter = logging.Formatter(
+                    'rank{}: %(levelname)s: %(message)s'.format(harn.xpu.rank))
+                stdout_handler = logging.StreamHandler(sys.stdout)
+                stdout_handler.setFormatter(s_formatter)
+                _log.addHandler(stdout_handler)
+                harn._log = _log
+            return
+
         use_py_logger = True
         if use_py_logger and harn._log is None:
 
@@ -361,10 +443,8 @@ class InitializeMixin:
         harn.debug('harn.train_info[hyper] = {}'.format(ub.repr2(harn.train_info['hyper'], nl=3)))
         harn.debug('harn.hyper = {!r}'.format(harn.hyper))
 
-        harn.debug('make XPU')
-        harn.xpu = harn.hyper.make_xpu()
-        harn.debug('harn.xpu = {!r}'.format(harn.xpu))
-        harn.xpu.set_as_default()
+        if harn.xpu is None:
+            harn._setup_xpu()
 
         if harn.hyper.criterion_cls:
             harn.debug('Criterion: {}'.format(harn.hyper.criterion_cls.__name__))
@@ -381,6 +461,11 @@ class InitializeMixin:
         harn.debug('Making loaders')
         harn.datasets = harn.hyper.datasets
         harn.loaders = harn.hyper.make_loaders()
+        if harn.xpu.is_distributed():
+            harn.loaders = {
+                key: harn._make_distributed_loader(loader)
+                for key, loader in harn.loaders.items()
+            }
 
         harn.debug('Making model')
         harn.model = harn.hyper.make_model()
@@ -412,8 +497,98 @@ class InitializeMixin:
 
         harn.debug('Make dynamics')
         harn.dynamics = harn.hyper.dynamics.copy()
+        harn._setup_precision()
+
+        if harn._is_main_process():
+            harn._export()
+
+    def _make_distributed_loader(harn, loader):
+        """
+        Makes a copy of `loader` that only loads the part of the dataset that
+        belongs to this process. Each epoch the data is shuffled (if the
+        original loader shuffled it) in the same way in every process.
+
+        Example:
+            >>> import netharn as nh
+            >>> import torch.utils.data as torch_data
+            >>> harn = FitHarn({})
+            >>> harn.xpu = nh.XPU.distributed(None, rank=1, world_size=3)
+            >>> dset = nh.data.ToyData2d(size=3, n=10)
+            >>> loader = torch_data.DataLoader(dset, batch_size=4, shuffle=True)
+            >>> dist_loader = harn._make_distributed_loader(loader)
+            >>> sampler = dist_loader.batch_sampler.sampler
+            >>> assert sampler.rank == 1
+            >>> assert sampler.shuffle
+            >>> assert len(sampler) == 7
+            >>> assert len(dist_loader) == 2
+        """
+        import torch.utils.data as torch_data
+        from torch.utils.data.distributed import DistributedSampler
+        old_batch_sampler = loader.batch_sampler
+        old_sampler = getattr(old_batch_sampler, 'sampler', loader.sampler)
+        sampler = DistributedSampler(
+            loader.dataset, num_replicas=harn.xpu.world_size,
+            rank=harn.xpu.rank,
+            shuffle=isinstance(old_sampler, torch_data.RandomSampler))
+        if type(old_batch_sampler) is torch_data.BatchSampler:
+            batch_sampler = torch_data.BatchSampler(
+                sampler, old_batch_sampler.batch_size,
+                old_batch_sampler.drop_last)
+        else:
+            # Custom batch samplers (e.g. MultiScaleBatchSampler) keep their
+            # settings and just draw indices from the new sampler
+            batch_sampler = copy.copy(old_batch_sampler)
+            batch_sampler.sampler = sampler
+        dist_loader = harn._clone_loader(loader, batch_sampler)
+        return dist_loader
+
+    def _clone_loader(harn, loader, batch_sampler):
+        """
+        Makes a loader like `loader` that uses a different batch sampler
+        """
+        import torch.utils.data as torch_data
+        new_loader = torch_data.DataLoader(
+            loader.dataset, batch_sampler=batch_sampler,
+            num_workers=loader.num_workers, collate_fn=loader.collate_fn,
+            pin_memory=loader.pin_memory, timeout=loader.timeout,
+            worker_init_fn=loader.worker_init_fn)
+        return new_loader
+
+    def _setup_precision(harn):
+        """
+        Sets the dtype `run_batch` is autocast to and creates the gradient
+        scaler for `harn.dynamics['precision']`.
 
-        harn._export()
+        The `mixed` precision uses float16 on gpus and bfloat16 on cpus.
+        float16 gradients can overflow or underflow, so float16 training
+        scales the loss dynamically and skips steps with inf / nan gradients.
+        bfloat16 has the range of float32 and is not scaled.
+
+        Example:
+            >>> import netharn as nh
+            >>> harn = FitHarn({})
+            >>> harn.xpu = nh.XPU(None)
+            >>> harn.dynamics['precision'] = 'mixed'
+            >>> harn._setup_precision()
+            >>> assert harn._autocast_dtype == torch.bfloat16
+            >>> assert harn._scaler is None
+        """
+        precision = harn.dynamics.get('precision', 'float32')
+        device_type = 'cuda' if harn.xpu.is_gpu() else 'cpu'
+        if precision == 'mixed':
+            precision = 'float16' if device_type == 'cuda' else 'bfloat16'
+
+        harn._autocast_dtype = None
+        harn._scaler = None
+        if precision != 'float32':
+            harn._autocast_dtype = getattr(torch, precision)
+            harn.info('Training with {} precision'.format(precision))
+        if precision == 'float16':
+            try:
+                harn._scaler = torch.amp.GradScaler(device_type)
+            except (AttributeError, TypeError):
+                # older torch versions only have cuda scalers
+                harn._scaler = torch.cuda.amp.GradScaler()
 
     def _export(harn):
         """ Export the model topology to the train_dpath """
@@ -456,6 +631,17 @@ class InitializeMixin:
 
         prev_states = harn.prev_snapshots()
         harn.info('There are {} existing snapshots'.format(len(prev_states)))
+
+        # A mid-epoch checkpoint is only useful if it is newer than every
+        # epoch snapshot
+        last_epoch = max(map(harn._snapshot_epoch, prev_states), default=-1)
+        checkpoints = [fpath for fpath in harn.prev_checkpoints()
+                       if harn._snapshot_epoch(fpath) > last_epoch]
+        if checkpoints:
+            harn.info('There are {} newer mid-epoch checkpoints'.format(
+                len(checkpoints)))
+            prev_states = prev_states + checkpoints
+
         if not prev_states:
             raise CannotResume('no previous snapshots')
 
@@ -465,7 +651,7 @@ class InitializeMixin:
         for load_path in reversed(prev_states):
             try:
                 harn.load_snapshot(load_path)
-            except (RuntimeError, EOFError):
+            except (RuntimeError, EOFError, IOError):
                 harn.info('Failed to load {}. Skiping.'.format(load_path))
             else:
                 success = True
@@ -479,7 +665,11 @@ class InitializeMixin:
                     'param "initial_lr" is not specified '
                     'in param_groups[{}] when resuming an optimizer'.format(i))
 
-        harn.info('Resuming from epoch={}'.format(harn.epoch))
+        if harn._resume_state is not None:
+            harn.info('Resuming from epoch={}, batch={}'.format(
+                harn.epoch, harn._resume_state['bx']))
+        else:
+            harn.info('Resuming from epoch={}'.format(harn.epoch))
 
 
 @register_mixin
@@ -495,6 +685,8 @@ class ProgMixin:
             Prog = functools.partial(ub.ProgIter, chunksize=chunksize, verbose=1)
         else:
             raise KeyError(harn.config['prog_backend'])
+        if not harn._is_main_process():
+            kw['disable'] = True
         return Prog(**kw)
 
     def _batch_msg(harn, metric_dict, batch_size, learn=False):
@@ -718,6 +910,7 @@ class SnapshotMixin:
         TODO:
             [ ] - keep the top epochs for every metric
         """
+        harn._wait_for_snapshots()
         snapshots = harn.prev_snapshots()
         existing_epochs = sorted([
             int(parse.parse('{}_epoch_{num:d}.pt', path).named['num'])
@@ -734,10 +927,22 @@ class SnapshotMixin:
         for fpath in ub.take(epoch_to_fpath, to_remove):
             ub.delete(fpath)
 
+        store_dpath = join(harn.snapshot_dpath, 'tensors')
+        if exists(store_dpath):
+            # Remove the deduplicated tensors no remaining snapshot uses
+            manifests = harn.prev_snapshots() + harn.prev_checkpoints()
+            best_path = join(harn.train_dpath, 'best_snapshot.pt')
+            if exists(best_path):
+                manifests.append(best_path)
+            n_removed = util.remove_unreferenced_tensors(store_dpath,
+                                                         manifests)
+            harn.debug('removed {} unreferenced tensors'.format(n_removed))
+
     def backtrack_weights(harn, epoch):
         """
         Reset the weights to a previous good state
         """
+        harn._wait_for_snapshots()
         load_path = join(harn.snapshot_dpath, '_epoch_{:08d}.pt'.format(epoch))
         snapshot = harn.xpu.load(load_path)
 
@@ -752,6 +957,25 @@ class SnapshotMixin:
         prev_states = sorted(glob.glob(join(harn.snapshot_dpath, '_epoch_*.pt')))
         return prev_states
 
+    def prev_checkpoints(harn):
+        """
+        Returns:
+            List[str]: paths to the mid-epoch checkpoints in order
+        """
+        ub.ensuredir(harn.snapshot_dpath)
+        checkpoints = sorted(glob.glob(join(harn.snapshot_dpath,
+                                            '_checkpoint_*.pt')))
+        return checkpoints
+
+    @staticmethod
+    def _snapshot_epoch(fpath):
+        """ The epoch of an epoch snapshot or mid-epoch checkpoint path """
+        if '_checkpoint_' in fpath:
+            result = parse.parse('{}_checkpoint_{num:d}_{bx:d}.pt', fpath)
+        else:
+            result = parse.parse('{}_epoch_{num:d}.pt', fpath)
+        return result.named['num']
+
     def load_snapshot(harn, load_path):
         """
         Sets the harness to its state just after an epoch finished
@@ -760,21 +984,211 @@ class SnapshotMixin:
             str: path to previously saved snapshot
         """
         harn.info('Loading previous state: {}'.format(load_path))
+        harn._wait_for_snapshots()
         snapshot_state = harn.xpu.load(load_path)
         harn.set_snapshot_state(snapshot_state)
         harn.info('Previous snapshot loaded...')
 
     def save_snapshot(harn):
+        """
+        Writes the current snapshot state to disk.
+
+        If `harn.config['async_snapshot']` is True, the state is copied to the
+        CPU and serialized in a background thread, so the returned path may
+        not exist until `harn._wait_for_snapshots()` is called. In either case
+        the file is written to a temporary path and renamed into place.
+
+        Returns:
+            str: path to the snapshot
+        """
         # save snapshot
         ub.ensuredir(harn.snapshot_dpath)
         save_fname = '_epoch_{:08d}.pt'.format(harn.epoch)
         safe_fpath = join(harn.snapshot_dpath, save_fname)
         harn.debug('Saving snapshot to {}'.format(safe_fpath))
         snapshot_state = harn.get_snapshot_state()
-        torch.save(snapshot_state, safe_fpath)
-        harn.debug('Snapshot saved to {}'.format(safe_fpath))
+        if harn.config['async_snapshot']:
+            # Copy the state so training can modify the weights inplace
+            snapshot_state = util.cpu_state_copy(snapshot_state)
+            harn._submit_snapshot_job(harn._write_snapshot, snapshot_state,
+                                      safe_fpath)
+            harn.debug('Snapshot queued for {}'.format(safe_fpath))
+        else:
+            harn._write_snapshot(snapshot_state, safe_fpath)
+            harn.debug('Snapshot saved to {}'.format(safe_fpath))
+        return safe_fpath
+
+    def _write_snapshot(harn, snapshot_state, fpath):
+        """
+        Writes a snapshot (or, if `harn.config['dedup_snapshots']`, a manifest
+        that references its tensors in `<snapshot_dpath>/tensors`)
+
+        Example:
+            >>> import netharn as nh
+            >>> harn = nh.FitHarn({
+            >>>     'workdir': ub.ensure_app_cache_dir('netharn/tests/dedup'),
+            >>>     'nice': 'dedup',
+            >>>     'datasets': {'train': nh.data.ToyData2d(size=3, n=32),
+            >>>                  'vali': nh.data.ToyData2d(size=3, n=16)},
+            >>>     'loaders': {'batch_size': 16},
+            >>>     'model': (nh.models.ToyNet2d, {}),
+            >>>     'optimizer': (nh.optimizers.SGD, {'lr': 0.001}),
+            >>>     'criterion': (nh.criterions.CrossEntropyLoss, {}),
+            >>>     'monitor': (nh.Monitor, {'max_epoch': 3}),
+            >>> })
+            >>> harn.config['show_prog'] = False
+            >>> harn.config['dedup_snapshots'] = True
+            >>> harn.initialize(reset='delete')
+            >>> # Freeze the first layer
+            >>> frozen = harn.model.module.layers[0].weight
+            >>> frozen.requires_grad = False
+            >>> harn.run()
+            >>> store_dpath = join(harn.snapshot_dpath, 'tensors')
+            >>> # The frozen weights are stored once and shared by all snapshots
+            >>> snapshots = harn.prev_snapshots()
+            >>> refs = [util.manifest_hashes(torch.load(p)) for p in snapshots]
+            >>> assert len(snapshots) > 1 and len(set.intersection(*refs)) > 0
+            >>> assert len(glob.glob(join(store_dpath, '*', '*.pt'))) < sum(map(len, refs))
+            >>> # Snapshots load transparently
+            >>> harn.backtrack_weights(0)
+            >>> state = harn.xpu.load(snapshots[-1])
+            >>> assert torch.all(state['model_state_dict']['module.layers.0.weight'] == frozen)
+            >>> # Deployments contain the full snapshot
+            >>> deployed = nh.export.DeployedModel(harn._deploy())
+            >>> model = deployed.load_model()
+        """
+        if harn.config['dedup_snapshots']:
+            util.save_deduplicated(snapshot_state, fpath)
+        else:
+            util.atomic_save(snapshot_state, fpath)
+        return fpath
+
+    def save_checkpoint(harn, bx, epoch_moving_metrics):
+        """
+        Writes a mid-epoch checkpoint after training batch `bx`. Unlike an
+        epoch snapshot, it also holds the order of the batches in this epoch
+        and the metrics so far, so resuming from it continues with batch
+        `bx + 1` as if training was never interrupted.
+
+        Older checkpoints are removed once this one is written.
+
+        Args:
+            bx (int): index of the last finished batch
+            epoch_moving_metrics (CumMovingAve): training metrics so far
+
+        Returns:
+            str: path to the checkpoint
+        """
+        ub.ensuredir(harn.snapshot_dpath)
+        save_fname = '_checkpoint_{:08d}_{:08d}.pt'.format(harn.epoch, bx + 1)
+        safe_fpath = join(harn.snapshot_dpath, save_fname)
+        harn.debug('Saving checkpoint to {}'.format(safe_fpath))
+        snapshot_state = harn.get_snapshot_state()
+        snapshot_state['checkpoint_state'] = {
+            'bx': bx + 1,
+            'batch_order': harn._batch_order,
+            'epoch_totals': {k: float(v) for k, v in
+                             epoch_moving_metrics.totals.items()},
+            'epoch_weights': {k: float(v) for k, v in
+                              epoch_moving_metrics.weights.items()},
+        }
+        if harn.config['async_snapshot']:
+            snapshot_state = util.cpu_state_copy(snapshot_state)
+            harn._submit_snapshot_job(harn._write_snapshot, snapshot_state,
+                                      safe_fpath)
+            harn._submit_snapshot_job(harn._remove_checkpoints, safe_fpath)
+        else:
+            harn._write_snapshot(snapshot_state, safe_fpath)
+            harn._remove_checkpoints(safe_fpath)
         return safe_fpath
 
+    def _remove_checkpoints(harn, keep=None):
+        """
+        Removes the mid-epoch checkpoints (except `keep`). When snapshots are
+        written asynchronously, this waits for pending writes.
+        """
+        if keep is None and harn.config['async_snapshot']:
+            harn._submit_snapshot_job(harn._remove_checkpoints, '')
+            return
+        for fpath in harn.prev_checkpoints():
+            if fpath != keep:
+                ub.delete(fpath)
+
+    def _resumable_loader(harn, loader):
+        """
+        If mid-epoch checkpoints are enabled (or we are resuming from one),
+        fixes the order of the batches of this training epoch, so a checkpoint
+        can save it, and skips the batches that ran before the checkpoint.
+
+        Returns:
+            Tuple[DataLoader, int, dict]: a loader over the remaining batches,
+                the index of the first batch, and the state of the checkpoint
+                we resumed from (or None)
+        """
+        resume_state = harn._resume_state
+        harn._resume_state = None
+        harn._batch_order = None
+        if resume_state is None and not harn.intervals['checkpoint']:
+            return loader, 0, None
+
+        if resume_state is None:
+            start_bx = 0
+            batch_order = [list(b) for b in loader.batch_sampler]
+        else:
+            start_bx = resume_state['bx']
+            sampler = getattr(loader.batch_sampler, 'sampler', None)
+            if isinstance(sampler, torch.utils.data.DistributedSampler):
+                # Every process has its own (deterministic) order
+                batch_order = [list(b) for b in loader.batch_sampler]
+            else:
+                batch_order = resume_state['batch_order']
+            if len(batch_order) != len(loader):
+                raise ValueError('the number of batches changed since the '
+                                 'checkpoint was written')
+        harn._batch_order = batch_order
+        loader = harn._clone_loader(loader, batch_order[start_bx:])
+        return loader, start_bx, resume_state
+
+    def _link_best_snapshot(harn, save_fpath):
+        """
+        Points `best_snapshot.pt` in the train_dpath at `save_fpath` using a
+        hardlink instead of a full copy.
+        """
+        best_path = join(harn.train_dpath, 'best_snapshot.pt')
+        if harn.config['async_snapshot']:
+            # jobs run in order, so this happens after save_fpath is written
+            harn._submit_snapshot_job(util.link_or_copy, save_fpath, best_path)
+        else:
+            util.link_or_copy(save_fpath, best_path)
+        return best_path
+
+    def _submit_snapshot_job(harn, func, *args):
+        """
+        Runs a snapshot IO job in a single background thread (jobs run in the
+        order they are submitted).
+        """
+        if harn._snapshot_executor is None:
+            from concurrent import futures
+            harn._snapshot_executor = futures.ThreadPoolExecutor(max_workers=1)
+        # Raise errors from any previously finished jobs
+        for future in [f for f in harn._snapshot_jobs if f.done()]:
+            harn._snapshot_jobs.remove(future)
+            future.result()
+        future = harn._snapshot_executor.submit(func, *args)
+        harn._snapshot_jobs.append(future)
+        return future
+
+    def _wait_for_snapshots(harn):
+        """
+        Blocks until all pending background snapshot writes are finished
+        """
+        if harn._snapshot_jobs:
+            harn.debug('Waiting for {} pending snapshot jobs'.format(
+                len(harn._snapshot_jobs)))
+        while harn._snapshot_jobs:
+            future = harn._snapshot_jobs.pop(0)
+            future.result()
+
 
 @register_mixin
 class SnapshotCallbacks:
@@ -795,7 +1209,12 @@ class SnapshotCallbacks:
             'model_state_dict': harn.model.state_dict(),
             'optimizer_state_dict': harn.optimizer.state_dict(),
             'monitor_state_dict': harn.monitor.state_dict(),
+            'rng_state': util.get_global_rng_state(),
         }
+        if harn.scheduler is not None:
+            snapshot_state['scheduler_state_dict'] = harn.scheduler.state_dict()
+        if harn._scaler is not None:
+            snapshot_state['scaler_state_dict'] = harn._scaler.state_dict()
         return snapshot_state
 
     def set_snapshot_state(harn, snapshot_state):
@@ -809,9 +1228,15 @@ class SnapshotCallbacks:
         Args:
             snapshot_state (dict): information corresponding to
         """
+        checkpoint_state = snapshot_state.get('checkpoint_state', None)
         if 'epoch' in snapshot_state:
-            # the snapshot holds the previous epoch; add one to move to current
-            harn.epoch = snapshot_state['epoch'] + 1
+            if checkpoint_state is None:
+                # the snapshot holds the previous epoch; add one to move to
+                # current
+                harn.epoch = snapshot_state['epoch'] + 1
+            else:
+                # a mid-epoch checkpoint holds the epoch it interrupted
+                harn.epoch = snapshot_state['epoch']
 
         if 'model_state_dict' in snapshot_state:
             harn.model.load_state_dict(snapshot_state['model_state_dict'])
@@ -830,8 +1255,25 @@ class SnapshotCallbacks:
             harn.optimizer.load_state_dict(snapshot_state['optimizer_state_dict'])
             harn.debug('loaded optimizer_state_dict')
 
+        if 'scaler_state_dict' in snapshot_state and harn._scaler is not None:
+            harn._scaler.load_state_dict(snapshot_state['scaler_state_dict'])
+            harn.debug('loaded scaler_state_dict')
+
+        if checkpoint_state is not None:
+            # The random state is restored when the epoch continues
+            harn._resume_state = dict(checkpoint_state)
+            harn._resume_state['rng_state'] = snapshot_state['rng_state']
+            harn.debug('loaded checkpoint_state')
+        elif 'rng_state' in snapshot_state:
+            util.set_global_rng_state(snapshot_state['rng_state'])
+            harn.debug('loaded rng_state')
+
         # Ensure scheduler is given current information
-        if harn.scheduler:
+        if harn.scheduler and 'scheduler_state_dict' in snapshot_state:
+            harn.scheduler.load_state_dict(
+                snapshot_state['scheduler_state_dict'])
+            harn.debug('loaded scheduler_state_dict')
+        elif harn.scheduler:
             if getattr(harn.scheduler, '__batchaware__', False):
                 harn.scheduler.reset_epoch(epoch=harn.epoch)
             else:
@@ -1035,8 +1477,14 @@ class CoreMixin:
             tb = traceback.format_exc()
             harn.info(tb)
             harn._close_prog()
+            try:
+                harn._wait_for_snapshots()
+            except Exception as ex2:
+                harn.error('a snapshot write also failed: {!r}'.format(ex2))
             raise
 
+        harn._wait_for_snapshots()
+
         harn.info('\n\n\n')
         harn.info('training completed')
         harn.info('current lrs: {}'.format(harn._current_lrs()))
@@ -1048,7 +1496,8 @@ class CoreMixin:
             harn.info('view tensorboard results for this run via:\n'
                       '    tensorboard --logdir ' + ub.compressuser(train_base))
 
-        harn._deploy()
+        if harn._is_main_process():
+            harn._deploy()
 
         harn.on_complete()
         harn.info('exiting fit harness.')
@@ -1094,19 +1543,29 @@ class CoreMixin:
         if test_loader and harn.check_interval('test', harn.epoch):
             harn._run_epoch(test_loader, tag='test', learn=False)
 
-        if harn.train_dpath is not None:
+        # Step to move to the next epoch
+        # change learning rate (modified optimizer inplace)
+        # (This happens before the snapshot, so it holds the scheduler state
+        # the next epoch starts with)
+        harn._step_scheduler_epoch(improved)
+
+        if harn.train_dpath is not None and harn._is_main_process():
+            save_fpath = None
             if improved:
                 save_fpath = harn.save_snapshot()
                 if save_fpath:
                     harn.debug('new best_snapshot {}'.format(save_fpath))
-                    # copy the best snapshot the the main directory
-                    best_path = join(harn.train_dpath, 'best_snapshot.pt')
-                    shutil.copy2(save_fpath, best_path)
+                    # link the best snapshot into the main directory
+                    harn._link_best_snapshot(save_fpath)
             else:
                 # todo: allow monitor to clean up old snapshots
                 if harn.check_interval('snapshot', harn.epoch):
                     save_fpath = harn.save_snapshot()
 
+            if save_fpath:
+                # The mid-epoch checkpoints of this epoch are obsolete
+                harn._remove_checkpoints()
+
             if harn.check_interval('cleanup', harn.epoch):
                 harn.cleanup_snapshots()
 
@@ -1116,10 +1575,6 @@ class CoreMixin:
         if harn._check_termination():
             raise StopTraining()
         else:
-            # Step to move to the next epoch
-            # change learning rate (modified optimizer inplace)
-            harn._step_scheduler_epoch(improved)
-
             if harn.config['prog_backend'] == 'progiter':
                 harn.info(ub.color_text(
                     '=== finish epoch {!r} / {!r} : {} ==='.format(
@@ -1139,24 +1594,49 @@ class CoreMixin:
         harn.debug(' * loader.batch_size = {}'.format(loader.batch_size))
 
         harn.current_tag = tag
+        n_batches = len(loader)
+        bsize = loader.batch_sampler.batch_size
+
+        # Measure where the time of this epoch goes
+        timer = harn._timer
+        timer.enabled = harn.config['timing']
+        timer.sync = harn.config['timing_sync'] and harn.xpu.is_gpu()
+        timer.reset()
+        epoch_start = time.perf_counter()
+
+        sampler = getattr(loader.batch_sampler, 'sampler', None)
+        if hasattr(sampler, 'set_epoch'):
+            # A distributed sampler shuffles differently each epoch
+            sampler.set_epoch(harn.epoch)
 
-        # use exponentially weighted or windowed moving averages across epochs
-        iter_moving_metrics = harn._run_metrics[tag]
         # use simple moving average within an epoch
         epoch_moving_metrics = util.CumMovingAve(nan_method='ignore')
 
+        start_bx = 0
+        resume_rng_state = None
+        if learn:
+            # Fix the order of the batches if we are taking mid-epoch
+            # checkpoints, or continue from one
+            loader, start_bx, resume_state = harn._resumable_loader(loader)
+            if resume_state is not None:
+                resume_rng_state = resume_state['rng_state']
+                epoch_moving_metrics.totals.update(resume_state['epoch_totals'])
+                epoch_moving_metrics.weights.update(resume_state['epoch_weights'])
+
+        # use exponentially weighted or windowed moving averages across epochs
+        iter_moving_metrics = harn._run_metrics[tag]
+
         # Flag if model is training (influences batch-norm / dropout)
         # if harn.model.training != learn or learn:
         harn.model.train(learn)
 
-        bsize = loader.batch_sampler.batch_size
         msg = harn._batch_msg({'loss': -1}, bsize, learn)
         desc = tag + ' ' + msg
         position = (list(harn.loaders.keys()).index(tag) +
                     harn.main_prog.pos + 1)
-        prog = harn._make_prog(desc=desc, total=len(loader),
+        prog = harn._make_prog(desc=desc, total=n_batches,
                                disable=not harn.config['show_prog'],
-                               position=position,
+                               position=position, initial=start_bx,
                                chunksize=bsize, leave=True, dynamic_ncols=True)
         harn.epoch_prog = prog
         harn._update_prog_postfix(prog)
@@ -1180,49 +1660,106 @@ class CoreMixin:
                     break
                 n_trys_remain -= 0
 
-            harn.debug('Starting batch iteration for tag={}, epoch={}'.format(
-                tag, harn.epoch))
-
-            for bx in range(len(loader)):
-                if DUMMY and bx > 2:
-                    break
-
-                raw_batch = next(batch_iter)
-
-                harn.bxs[tag] = bx
-                # harn.debug('{} batch iteration {}'.format(tag, bx))
-
-                batch = harn.prepare_batch(raw_batch)
-
-                # core learning / backprop
-                outputs, loss = harn._run_batch(bx, batch, learn=learn)
-
-                # measure train accuracy and other informative metrics
-                cur_metrics = harn._on_batch(bx, batch, outputs, loss)
+            if resume_rng_state is not None:
+                # Creating the iterator used the random state, so restore it
+                # afterwards to continue exactly where the checkpoint was made
+                util.set_global_rng_state(resume_rng_state)
 
-                # accumulate measures
-                epoch_moving_metrics.update(cur_metrics)
-                iter_moving_metrics.update(cur_metrics)
+            n_prefetch = harn.config['prefetch']
+            if n_prefetch:
+                # Run prepare_batch for upcoming batches in a background thread
+                batch_iter = util.PrefetchIterator(
+                    batch_iter, prepare=harn.prepare_batch, size=n_prefetch,
+                    device=harn.xpu.main_device)
 
-                # display_train training info
-                if harn.check_interval('display_' + tag, bx):
-                    ave_metrics = iter_moving_metrics.average()
+            # If non-zero, batch metrics stay on the device until a display /
+            # log interval (or the buffer fills), avoiding per-batch syncs.
+            n_defer = harn.config['defer_metrics']
+            metric_buffer = []
 
-                    msg = harn._batch_msg({'loss': ave_metrics['loss']}, bsize, learn)
-                    prog.set_description(tag + ' ' + msg)
-
-                    # log_iter_train, log_iter_test, log_iter_vali
-                    if harn.check_interval('log_iter_' + tag, bx):
-                        iter_idx = (harn.epoch * len(loader) + bx)
-                        for key, value in ave_metrics.items():
-                            harn.log_value(tag + ' iter ' + key, value, iter_idx)
+            harn.debug('Starting batch iteration for tag={}, epoch={}'.format(
+                tag, harn.epoch))
 
-                    prog.update(harn.intervals['display_' + tag])
-                    harn._update_prog_postfix(prog)
+            try:
+                for bx in range(start_bx, n_batches):
+                    if DUMMY and bx > 2:
+                        break
 
-                # Some schedulers update every batch
-                if learn:
-                    harn._step_scheduler_batch()
+                    # With prefetch, this also waits for prepare_batch
+                    with timer('data'):
+                        if n_prefetch:
+                            batch = next(batch_iter)
+                        else:
+                            raw_batch = next(batch_iter)
+
+                    harn.bxs[tag] = bx
+                    # harn.debug('{} batch iteration {}'.format(tag, bx))
+
+                    if not n_prefetch:
+                        with timer('prepare'):
+                            batch = harn.prepare_batch(raw_batch)
+
+                    # core learning / backprop
+                    outputs, loss = harn._run_batch(bx, batch, learn=learn)
+
+                    # measure train accuracy and other informative metrics
+                    cur_metrics = harn._on_batch(bx, batch, outputs, loss)
+
+                    checkpoint = (learn and harn.train_dpath is not None and
+                                  harn.check_interval('checkpoint', bx) and
+                                  bx + 1 < n_batches)
+
+                    if n_defer:
+                        metric_buffer.append(cur_metrics)
+                        flush = (len(metric_buffer) >= n_defer or
+                                 bx + 1 == n_batches or checkpoint or
+                                 harn.check_interval('display_' + tag, bx) or
+                                 harn.check_interval('log_iter_' + tag, bx))
+                        if flush:
+                            ready_metrics = harn._reduce_metrics(metric_buffer)
+                            metric_buffer = []
+                        else:
+                            ready_metrics = []
+                    else:
+                        ready_metrics = [cur_metrics]
+
+                    # accumulate measures
+                    for cur_metrics in ready_metrics:
+                        epoch_moving_metrics.update(cur_metrics)
+                        iter_moving_metrics.update(cur_metrics)
+
+                    # display_train training info
+                    if harn.check_interval('display_' + tag, bx):
+                        ave_metrics = iter_moving_metrics.average()
+
+                        msg = harn._batch_msg({'loss': ave_metrics['loss']}, bsize, learn)
+                        prog.set_description(tag + ' ' + msg)
+
+                        # log_iter_train, log_iter_test, log_iter_vali
+                        if harn.check_interval('log_iter_' + tag, bx):
+                            iter_idx = (harn.epoch * n_batches + bx)
+                            for key, value in ave_metrics.items():
+                                harn.log_value(tag + ' iter ' + key, value, iter_idx)
+
+                        prog.update(harn.intervals['display_' + tag])
+                        harn._update_prog_postfix(prog)
+
+                    # Some schedulers update every batch
+                    if learn:
+                        harn._step_scheduler_batch()
+
+                    if checkpoint and harn._is_main_process():
+                        harn.save_checkpoint(bx, epoch_moving_metrics)
+            finally:
+                # Stop the prefetch thread even if the epoch raised
+                if n_prefetch:
+                    batch_iter.close()
+
+            if metric_buffer:
+                # Handle any batches left over if the loop ended early
+                for cur_metrics in harn._reduce_metrics(metric_buffer):
+                    epoch_moving_metrics.update(cur_metrics)
+                    iter_moving_metrics.update(cur_metrics)
 
         # do a final step when bstep > 1, so the last few batches arent skipped
         # if harn.dynamics['batch_step'] > 1:
@@ -1238,11 +1775,21 @@ class CoreMixin:
         epoch_metrics = epoch_moving_metrics.average()
 
         # call hooks after every epoch
-        custom_metrics = harn.on_epoch()
+        with timer('on_epoch'):
+            custom_metrics = harn.on_epoch()
         _disjoint_dict_update(epoch_metrics, custom_metrics)
 
+        if harn.xpu.is_distributed():
+            # Average over all processes, so every process makes the same
+            # decisions based on these metrics (e.g. in the monitor).
+            keys = sorted(epoch_metrics.keys())
+            values = harn.xpu.all_reduce_mean(
+                [float(epoch_metrics[k]) for k in keys])
+            epoch_metrics = ub.odict(zip(keys, values))
+
         for key, value in epoch_metrics.items():
             harn.log_value(tag + ' epoch ' + key, value, harn.epoch)
+        harn._log_timings(tag, time.perf_counter() - epoch_start)
         harn.debug('Finished batch iteration for tag={}, epoch={}'.format(
             tag, harn.epoch))
 
@@ -1256,31 +1803,143 @@ class CoreMixin:
         if profiler.IS_PROFILING:
             torch.cuda.synchronize()
 
-        # Run the forward pass to compute outputs and loss
-        outputs, loss = harn.run_batch(batch)
+        # When accumulating gradients over several batches, distributed
+        # processes only need to average them on the batch that steps.
+        is_ddp = isinstance(harn.model,
+                            torch.nn.parallel.DistributedDataParallel)
+        if learn and is_ddp and (bx + 1) % harn.dynamics['batch_step'] != 0:
+            sync_context = harn.model.no_sync()
+        else:
+            sync_context = contextlib.nullcontext()
 
-        if profiler.IS_PROFILING:
-            torch.cuda.synchronize()
+        with sync_context:
+            # Run the forward pass to compute outputs and loss
+            device_type = 'cuda' if harn.xpu.is_gpu() else 'cpu'
+            with harn._timer('forward'):
+                with util.autocast_context(device_type, harn._autocast_dtype):
+                    outputs, loss = harn.run_batch(batch)
 
-        # Backpropogate to accumulate gradients and step the optimizer
-        if learn:
-            harn.backpropogate(bx, batch, loss)
+            if profiler.IS_PROFILING:
+                torch.cuda.synchronize()
+
+            # Backpropogate to accumulate gradients and step the optimizer
+            if learn:
+                harn.backpropogate(bx, batch, loss)
 
         return outputs, loss
 
     @profiler.profile
     def _on_batch(harn, bx, batch, outputs, loss):
         """ Internal function that prepares to call the `on_batch` callback. """
-        loss_value = float(loss.data.cpu().item())
-        harn._check_loss(loss_value)
+        if harn.config['defer_metrics']:
+            # Keep the value on the device. It is checked in _reduce_metrics
+            loss_value = loss.detach()
+        else:
+            loss_value = float(loss.data.cpu().item())
+            harn._check_loss(loss_value)
         metrics_dict = {
             'loss': loss_value,
         }
-        custom_metrics = harn.on_batch(batch, outputs, loss)
+        with harn._timer('on_batch'):
+            custom_metrics = harn.on_batch(batch, outputs, loss)
         _disjoint_dict_update(metrics_dict, custom_metrics)
 
         return metrics_dict
 
+    def _log_timings(harn, tag, epoch_time):
+        """
+        Logs the time spent in each phase of the last epoch and adds it to
+        `<train_dpath>/timings/epoch_<epoch>.json`.
+
+        The phases are `data` (waiting on the loader), `prepare`
+        (`prepare_batch`), `forward` (`run_batch`), `backward` and `step`
+        (in the default `backpropogate`), and the `on_batch` and `on_epoch`
+        hooks. Everything else is counted as `other`.
+
+        Example:
+            >>> import netharn as nh
+            >>> harn = nh.FitHarn({
+            >>>     'workdir': ub.ensure_app_cache_dir('netharn/tests/timing'),
+            >>>     'nice': 'timing',
+            >>>     'datasets': {'train': nh.data.ToyData2d(size=3, n=32)},
+            >>>     'loaders': {'batch_size': 16},
+            >>>     'model': (nh.models.ToyNet2d, {}),
+            >>>     'optimizer': (nh.optimizers.SGD, {'lr': 0.001}),
+            >>>     'criterion': (nh.criterions.CrossEntropyLoss, {}),
+            >>>     'monitor': (nh.Monitor, {'max_epoch': 1}),
+            >>> })
+            >>> harn.config['show_prog'] = False
+            >>> harn.initialize(reset='delete')
+            >>> harn.run()
+            >>> fpath = join(harn.train_dpath, 'timings', 'epoch_0000.json')
+            >>> timings = util.read_json(fpath)
+            >>> n_batches = len(harn.loaders['train'])
+            >>> assert timings['train']['data']['count'] == n_batches
+            >>> assert {'forward', 'backward', 'step'} < set(timings['train'])
+        """
+        if not harn.config['timing']:
+            return
+        summary = harn._timer.summary(total=epoch_time)
+        for phase, info in summary.items():
+            harn.log_value(tag + ' epoch time ' + phase, info['total'],
+                           harn.epoch)
+        if 'data' in summary and epoch_time > 0:
+            # A large fraction means the run is data bound
+            data_frac = summary['data']['total'] / epoch_time
+            harn.log_value(tag + ' epoch time data_frac', data_frac,
+                           harn.epoch)
+        harn.debug('{} epoch {} took {:.3f}s: {}'.format(
+            tag, harn.epoch, epoch_time,
+            ub.repr2({k: round(v['total'], 3) for k, v in summary.items()},
+                     nl=0)))
+        if harn.train_dpath is not None and harn._is_main_process():
+            timing_dpath = ub.ensuredir((harn.train_dpath, 'timings'))
+            fpath = join(timing_dpath, 'epoch_{:04d}.json'.format(harn.epoch))
+            timings = util.read_json(fpath) if exists(fpath) else {}
+            timings[tag] = summary
+            util.write_json(fpath, timings)
+
+    @profiler.profile
+    def _reduce_metrics(harn, metric_buffer):
+        """
+        Moves a buffer of per-batch metrics (which may contain scalar device
+        tensors) to the host with a single transfer and checks the loss.
+
+        Args:
+            metric_buffer (List[Dict]): metrics returned by `_on_batch` for
+                several consecutive batches.
+
+        Returns:
+            List[Dict[str, float]]: the same metrics as python floats
+
+        Example:
+            >>> harn = FitHarn({})
+            >>> harn.config['defer_metrics'] = 4
+            >>> metric_buffer = [{'loss': torch.tensor(.5), 'acc': 1.0},
+            >>>                  {'loss': torch.tensor(.25), 'acc': 0.0}]
+            >>> harn._reduce_metrics(metric_buffer)
+            [{'loss': 0.5, 'acc': 1.0}, {'loss': 0.25, 'acc': 0.0}]
+        """
+        positions = []
+        device_vals = []
+        for bx, metrics in enumerate(metric_buffer):
+            for key, value in metrics.items():
+                if torch.is_tensor(value):
+                    positions.append((bx, key))
+                    device_vals.append(value.detach().float().view(-1))
+
+        reduced = [dict(metrics) for metrics in metric_buffer]
+        if device_vals:
+            host_vals = torch.cat(device_vals).cpu().numpy().tolist()
+            for (bx, key), value in zip(positions, host_vals):
+                reduced[bx][key] = value
+
+        losses = [metrics['loss'] for metrics in reduced]
+        if losses:
+            # max propagates non-finite values, so one check covers the buffer
+            harn._check_loss(float(np.max(losses)))
+        return reduced
+
 
 @register_mixin
 class ChecksMixin:
@@ -1405,8 +2064,46 @@ class CoreCallbacks:
         TODO:
             perhaps remove dynamics as a netharn core component and simply
             allow the end-application to take care of that detail.
+
+        Example:
+            >>> # float16 training scales the loss and skips overflowed steps
+            >>> import netharn as nh
+            >>> harn = nh.FitHarn({
+            >>>     'workdir': ub.ensure_app_cache_dir('netharn/tests/precision'),
+            >>>     'nice': 'precision',
+            >>>     'datasets': {'train': nh.data.ToyData2d(size=3, n=32)},
+            >>>     'loaders': {'batch_size': 16},
+            >>>     'model': (nh.models.ToyNet2d, {}),
+            >>>     'optimizer': (nh.optimizers.SGD, {'lr': 0.001}),
+            >>>     'criterion': (nh.criterions.CrossEntropyLoss, {}),
+            >>>     'monitor': (nh.Monitor, {'max_epoch': 1}),
+            >>>     'dynamics': {'precision': 'float16', 'grad_norm_max': 35},
+            >>> })
+            >>> harn.config['show_prog'] = False
+            >>> harn.initialize(reset='delete')
+            >>> batch = harn._demo_batch(0)
+            >>> # A huge scale overflows, so the weights do not change
+            >>> harn._scaler = torch.amp.GradScaler('cpu', init_scale=2.0 ** 100)
+            >>> params = dict(harn.model.named_parameters())
+            >>> before = util.cpu_state_copy(params)
+            >>> outputs, loss = harn._run_batch(0, batch, learn=True)
+            >>> assert outputs.dtype == torch.float16
+            >>> assert all(torch.all(before[k] == params[k]) for k in before)
+            >>> assert harn._scaler.get_scale() < 2.0 ** 100
+            >>> # A normal scale steps
+            >>> harn._scaler.update(new_scale=2.0 ** 8)
+            >>> outputs, loss = harn._run_batch(0, batch, learn=True)
+            >>> assert not all(torch.all(before[k] == params[k]) for k in before)
+            >>> assert 'scaler_state_dict' in harn.get_snapshot_state()
         """
-        loss.backward()
+        scaler = harn._scaler
+        with harn._timer('backward'):
+            if scaler is None:
+                loss.backward()
+            else:
+                # Gradients of the scaled loss accumulate over batch_step
+                # batches, and the scale only changes after a step.
+                scaler.scale(loss).backward()
 
         if profiler.IS_PROFILING:
             torch.cuda.synchronize()
@@ -1414,20 +2111,34 @@ class CoreCallbacks:
         # approximates a batch size of (bsize * bstep) if step > 1,
         bstep = harn.dynamics['batch_step']
         if (bx + 1) % bstep == 0:
-            if harn.dynamics['grad_norm_max']:
-                total_norm = torch.nn.utils.clip_grad_norm_(
-                    harn.model.parameters(),
-                    max_norm=harn.dynamics['grad_norm_max'],
-                    norm_type=float('inf'),
-                )
-                if total_norm > harn.dynamics['grad_norm_max'] * 100:
-                    harn.warn('grad norm is too high: '
-                              'total_norm = {!r}'.format(total_norm))
-            # if False:
-            #     harn._check_gradients(batch, loss)
-            # harn.debug("STEP")
-            harn.optimizer.step()
-            harn.optimizer.zero_grad()
+            with harn._timer('step'):
+                if harn.dynamics['grad_norm_max']:
+                    if scaler is not None:
+                        # clip the real gradients, not the scaled ones
+                        scaler.unscale_(harn.optimizer)
+                    total_norm = torch.nn.utils.clip_grad_norm_(
+                        harn.model.parameters(),
+                        max_norm=harn.dynamics['grad_norm_max'],
+                        norm_type=float('inf'),
+                    )
+                    too_high = total_norm > harn.dynamics['grad_norm_max'] * 100
+                    if scaler is not None and not np.isfinite(float(total_norm)):
+                        # an overflow is expected now and then when scaling
+                        too_high = False
+                    if too_high:
+                        harn.warn('grad norm is too high: '
+                                  'total_norm = {!r}'.format(total_norm))
+                # if False:
+                #     harn._check_gradients(batch, loss)
+                # harn.debug("STEP")
+                if scaler is None:
+                    harn.optimizer.step()
+                else:
+                    # skips the step if the gradients overflowed and then
+                    # adjusts the scale
+                    scaler.step(harn.optimizer)
+                    scaler.update()
+                harn.optimizer.zero_grad()
 
         if profiler.IS_PROFILING:
             torch.cuda.synchronize()
@@ -1441,6 +2152,11 @@ class CoreCallbacks:
 
         Overload Encouraged
 
+        Note:
+            When `harn.config['defer_metrics']` is set, returned values may be
+            scalar tensors that live on the device. These are only copied to
+            the host when the metrics are displayed or logged.
+
         Returns:
             dict or None: dictionary of scalar batch measures
         """
@@ -1540,6 +2256,9 @@ class FitHarn(ExtraMixins, InitializeMixin, ProgMixin, LogMixin, SnapshotMixin,
         harn.datasets = None
         harn.loaders = None
 
+        # Initialized in harn._setup_xpu()
+        harn.xpu = None
+
         # The following attributes will be initialized in harn._setup_modules()
         harn.model = None
         harn.optimizer = None
@@ -1551,6 +2270,7 @@ class FitHarn(ExtraMixins, InitializeMixin, ProgMixin, LogMixin, SnapshotMixin,
         harn.dynamics = {
             'batch_step': 1,
             'grad_norm_max': None,
+            'precision': 'float32',
         }
 
         # Output directories
@@ -1590,6 +2310,9 @@ class FitHarn(ExtraMixins, InitializeMixin, ProgMixin, LogMixin, SnapshotMixin,
 
             # how often to remove old snapshots
             'cleanup': 10,
+
+            # how often (in training batches) to write a mid-epoch checkpoint
+            'checkpoint': None,
         }
         harn.config = {
             'show_prog': True,
@@ -1603,6 +2326,31 @@ class FitHarn(ExtraMixins, InitializeMixin, ProgMixin, LogMixin, SnapshotMixin,
             # number of recent / best snapshots to keep
             'num_keep': 10,
             'keep_freq': 10,
+
+            # If non-zero, prepare this many batches ahead of time in a
+            # background thread (overlaps host-to-device copies with compute)
+            'prefetch': 0,
+
+            # If non-zero, batch metrics (including loss) are kept on the
+            # device and only copied to the host (in one transfer) at display
+            # / log intervals, or once this many batches are buffered.
+            'defer_metrics': 0,
+
+            # If True, snapshots are serialized in a background thread
+            'async_snapshot': True,
+
+            # If True, snapshots are small manifests and each distinct tensor
+            # is stored once in `<snapshot_dpath>/tensors`, so tensors that
+            # do not change (e.g. frozen layers) are not written every epoch.
+            'dedup_snapshots': False,
+
+            # If True, the time spent in each phase of an epoch (data
+            # loading, forward, backward, ...) is logged and written to
+            # `<train_dpath>/timings`.
+            'timing': True,
+            # If True, synchronize cuda around each timed phase. This makes
+            # the times exact but slows training down.
+            'timing_sync': False,
         }
         harn.current_tag = None
 
@@ -1610,6 +2358,16 @@ class FitHarn(ExtraMixins, InitializeMixin, ProgMixin, LogMixin, SnapshotMixin,
         harn._initialized = False
         harn._log = None
         harn._tlog = None
+        harn._snapshot_executor = None
+        harn._snapshot_jobs = []
+        # The batch order of the current training epoch and the state of a
+        # mid-epoch checkpoint to continue from (see harn.save_checkpoint)
+        harn._batch_order = None
+        harn._resume_state = None
+        harn._timer = util.PhaseTimer()
+        # Set by harn._setup_precision()
+        harn._autocast_dtype = None
+        harn._scaler = None
 
     def check_interval(harn, tag, idx):
         """
@@ -225,9 +225,14 @@ def _rectify_dynamics(arg, kw):
         'batch_step': arg.pop('batch_step', 1),
         # Clips gradients
         'grad_norm_max': arg.pop('grad_norm_max', None),
+        # Runs the forward pass in reduced precision. Can be float32,
+        # float16, bfloat16, or mixed (float16 on gpus and bfloat16 on cpus)
+        'precision': arg.pop('precision', 'float32'),
     }
     if not isinstance(dynamics['batch_step'], int):
         raise ValueError('batch_step must be an integer')
+    if dynamics['precision'] not in {'float32', 'float16', 'bfloat16', 'mixed'}:
+        raise KeyError('UNKNOWN precision: {}'.format(dynamics['precision']))
     if arg:
         raise KeyError('UNKNOWN dynamics: {}'.format(arg))
     return dynamics
@@ -504,7 +509,11 @@ class HyperParams(object):
 
         # Loader is a bit hacked
         _append_part('loader', hyper.loader_cls, hyper.loader_params_nice)
-        _append_part('dynamics', 'Dynamics', hyper.dynamics)
+        dynamics = hyper.dynamics.copy()
+        if dynamics['precision'] == 'float32':
+            # Keep the hash of full precision runs unchanged
+            dynamics.pop('precision')
+        _append_part('dynamics', 'Dynamics', dynamics)
 
         return initkw
 
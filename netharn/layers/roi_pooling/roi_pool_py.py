@@ -1,10 +1,319 @@
+"""
+Vectorized RoI pooling in pure torch.
+
+All ROIs and pooled cells are handled by a few batched indexing operations,
+so these layers run on any device and support autograd.
+"""
 import torch
 import torch.nn as nn
-from torch.autograd import Variable
-import numpy as np
+
+
+def _roi_batch_indices(rois):
+    return rois[:, 0].long()
+
+
+def roi_pool(features, rois, pooled_height, pooled_width, spatial_scale):
+    """
+    Max pools the features inside each ROI into a fixed size grid using the
+    same quantization as the `roi_pool_c` kernels.
+
+    Like the kernels, the gradient of each pooled cell goes to a single
+    feature: the first maximum of the bin in row-major order.
+
+    Args:
+        features (Tensor): [B, C, H, W] feature maps
+        rois (Tensor): [R, 5] rows of (batch_index, x1, y1, x2, y2) in image
+            coordinates
+        pooled_height (int): number of output rows
+        pooled_width (int): number of output columns
+        spatial_scale (float): scale from image to feature coordinates
+
+    Returns:
+        Tensor: [R, C, pooled_height, pooled_width]
+
+    Example:
+        >>> features = torch.arange(2 * 1 * 6 * 6).float().view(2, 1, 6, 6)
+        >>> rois = torch.FloatTensor([[0, 0, 0, 5, 5], [1, 2, 2, 3, 5]])
+        >>> out = roi_pool(features, rois, 2, 2, spatial_scale=1.0)
+        >>> print(out[:, 0].tolist())
+        [[[14.0, 17.0], [32.0, 35.0]], [[56.0, 57.0], [68.0, 69.0]]]
+
+    Example:
+        >>> # supports autograd
+        >>> features = torch.rand(1, 3, 8, 8, requires_grad=True)
+        >>> rois = torch.FloatTensor([[0, 0, 0, 15, 15], [0, 4, 4, 9, 13]])
+        >>> out = roi_pool(features, rois, 3, 3, spatial_scale=0.5)
+        >>> out.sum().backward()
+        >>> assert features.grad.sum() == out.numel()
+
+    Example:
+        >>> # Tied maxima do not split the gradient
+        >>> features = torch.zeros(1, 1, 4, 4, requires_grad=True)
+        >>> rois = torch.FloatTensor([[0, 0, 0, 3, 3]])
+        >>> roi_pool(features, rois, 1, 1, spatial_scale=1.0).sum().backward()
+        >>> print(features.grad[0, 0].tolist())
+        [[1.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0]]
+    """
+    B, C, H, W = features.shape
+    rois = rois.detach()
+    device = features.device
+
+    # quantize the roi to feature coordinates (float32 arithmetic and round
+    # half away from zero like the C kernels)
+    coords = rois[:, 1:].float() * spatial_scale
+    coords = (torch.sign(coords) * torch.floor(coords.abs() + 0.5)).long()
+    start_w, start_h, end_w, end_h = coords.t()
+    roi_w = torch.clamp(end_w - start_w + 1, min=1)
+    roi_h = torch.clamp(end_h - start_h + 1, min=1)
+
+    def _bins(start, length, n_bins, size):
+        # start and stop of every bin [R, n_bins] clipped to the feature map
+        bin_size = length.float()[:, None] / n_bins
+        cells = torch.arange(n_bins, device=device, dtype=torch.float32)
+        lo = torch.floor(cells * bin_size).long() + start[:, None]
+        hi = torch.ceil((cells + 1) * bin_size).long() + start[:, None]
+        lo = lo.clamp(0, size)
+        hi = hi.clamp(0, size)
+        return lo, hi
+
+    hlo, hhi = _bins(start_h.to(device), roi_h.to(device), pooled_height, H)
+    wlo, whi = _bins(start_w.to(device), roi_w.to(device), pooled_width, W)
+    is_empty = (hhi <= hlo)[:, :, None] | (whi <= wlo)[:, None, :]
+
+    # The bins have different sizes, so each bin max is answered with a
+    # sparse table: level (i, j) holds the max of each 2^i x 2^j block, and
+    # any bin is covered by four (overlapping) blocks of one level.
+    hlen = (hhi - hlo).clamp(min=1)
+    wlen = (whi - wlo).clamp(min=1)
+    levels_h = int(hlen.max()).bit_length() - 1 if len(rois) else 0
+    levels_w = int(wlen.max()).bit_length() - 1 if len(rois) else 0
+    # The table is not differentiated through. When a gradient is needed
+    # the positions of the maxima are tracked and the features gathered.
+    track = features.requires_grad and torch.is_grad_enabled()
+    table, argtable, offsets, heights, widths = _max_table(
+        features.detach(), levels_h, levels_w, track=track)
+
+    def _blocks(lo, length, levels, size):
+        # The level and the first and last block that cover each bin. The
+        # starts of empty bins are only clipped, they are zeroed below.
+        level = torch.zeros_like(length)
+        for i in range(1, levels + 1):
+            level += (length >= 2 ** i).long()
+        first = lo.clamp(max=size - 1)
+        last = (lo + length - 2 ** level).clamp(0, size - 1)
+        return level, first, last
+
+    kh, y1, y2 = _blocks(hlo, hlen, levels_h, H)
+    kw, x1, x2 = _blocks(wlo, wlen, levels_w, W)
+
+    # Table rows of the four blocks [R, PH, PW, 2, 2]
+    bidxs = _roi_batch_indices(rois).to(device).view(-1, 1, 1, 1, 1)
+    ys = torch.stack([y1, y2], dim=2)[:, :, None, :, None]
+    xs = torch.stack([x1, x2], dim=2)[:, None, :, None, :]
+    kh = kh[:, :, None, None, None]
+    kw = kw[:, None, :, None, None]
+    flat_idxs = (offsets.to(device)[kh, kw] +
+                 (bidxs * heights.to(device)[kh] + ys) *
+                 widths.to(device)[kw] + xs)
+
+    # [R, PH, PW, 4, C]
+    blocks = table.index_select(0, flat_idxs.view(-1))
+    blocks = blocks.view(len(rois), pooled_height, pooled_width, 4, C)
+    output = blocks.amax(dim=3)
+    if track:
+        # The first position (in the image) of the max of the four blocks
+        argblocks = argtable.index_select(0, flat_idxs.view(-1))
+        argblocks = argblocks.view(len(rois), pooled_height, pooled_width,
+                                   4, C)
+        is_max = blocks == output[:, :, :, None, :]
+        argblocks.masked_fill_(~is_max, H * W)
+        argmax = argblocks.amin(dim=3).long()
+        chans = torch.arange(C, device=device)
+        feat_idxs = ((bidxs[..., 0] * C + chans) * (H * W) +
+                     argmax.clamp(max=H * W - 1))
+        output = features.reshape(-1)[feat_idxs]
+    output = output.masked_fill(is_empty[..., None], 0)
+    return output.permute(0, 3, 1, 2).contiguous()
+
+
+def _max_table(features, levels_h, levels_w, track=False):
+    """
+    Sparse table for range max queries over the spatial dimensions of
+    features [B, C, H, W].
+
+    Level (i, j) holds the max of every 2^i x 2^j block. It is the max of
+    two shifted copies of the previous level, 2^(i - 1) (or 2^(j - 1))
+    apart.
+
+    Args:
+        track (bool): if True, also build a table of the positions
+            (`y * W + x`) of the maxima. Ties go to the first position.
+
+    Returns:
+        Tuple: table - [N, C] the channels of every entry of every level.
+            argtable - [N, C] int32 positions of the maxima (or None).
+            offsets - [levels_h + 1, levels_w + 1] the first row of each
+            level. heights and widths - the size of the levels along each
+            dimension. The block of image b at (y, x) in level (i, j) is row
+            `offsets[i, j] + (b * heights[i] + y) * widths[j] + x`.
+    """
+    B, C, H, W = features.shape
+    parts = []
+    argparts = []
+    offsets = torch.empty(levels_h + 1, levels_w + 1, dtype=torch.long)
+    heights = torch.empty(levels_h + 1, dtype=torch.long)
+    widths = torch.empty(levels_w + 1, dtype=torch.long)
+
+    def _shift_max(data, args, dim, step):
+        size = data.shape[dim] - step
+        data1, data2 = data.narrow(dim, 0, size), data.narrow(dim, step, size)
+        if args is None:
+            return torch.max(data1, data2), None
+        args1, args2 = args.narrow(dim, 0, size), args.narrow(dim, step, size)
+        take2 = (data2 > data1) | ((data2 == data1) & (args2 < args1))
+        return (torch.where(take2, data2, data1),
+                torch.where(take2, args2, args1))
+
+    offset = 0
+    # channels-last so each entry is a contiguous row
+    row_level = features.permute(0, 2, 3, 1).contiguous()
+    row_args = None
+    if track:
+        row_args = torch.arange(H * W, dtype=torch.int32,
+                                device=features.device)
+        row_args = row_args.view(1, H, W, 1).expand(B, H, W, C)
+    for i in range(levels_h + 1):
+        if i > 0:
+            row_level, row_args = _shift_max(row_level, row_args, 1,
+                                             2 ** (i - 1))
+        level, args = row_level, row_args
+        for j in range(levels_w + 1):
+            if j > 0:
+                level, args = _shift_max(level, args, 2, 2 ** (j - 1))
+            height, width = level.shape[1:3]
+            parts.append(level.reshape(-1, C))
+            if track:
+                argparts.append(args.reshape(-1, C))
+            offsets[i, j] = offset
+            heights[i] = height
+            widths[j] = width
+            offset += B * height * width
+    table = torch.cat(parts, dim=0)
+    argtable = torch.cat(argparts, dim=0) if track else None
+    return table, argtable, offsets, heights, widths
+
+
+def _bilinear_coords(coords, size):
+    """
+    Neighbors and interpolation weights of sample coordinates along one
+    dimension. Samples more than one pixel outside the map get zero weight.
+
+    Returns:
+        Tuple[Tensor, Tensor]: the low and high neighbor indices and their
+            weights stacked in a trailing dimension of size 2.
+    """
+    valid = ((coords >= -1.0) & (coords <= size)).to(coords.dtype)
+    coords = coords.clamp(min=0)
+    low = coords.floor().long()
+    at_edge = low >= size - 1
+    low = torch.where(at_edge, torch.full_like(low, size - 1), low)
+    high = torch.where(at_edge, low, low + 1)
+    coords = torch.where(at_edge, low.to(coords.dtype), coords)
+    frac = coords - low.to(coords.dtype)
+    idxs = torch.stack([low, high], dim=-1)
+    weights = torch.stack([(1 - frac) * valid, frac * valid], dim=-1)
+    return idxs, weights
+
+
+def roi_align(features, rois, pooled_height, pooled_width, spatial_scale,
+              sampling_ratio=2):
+    """
+    RoIAlign [1]_. Each pooled cell is the average of a
+    `sampling_ratio x sampling_ratio` grid of bilinearly interpolated samples,
+    so the ROI is not quantized.
+
+    Args:
+        features (Tensor): [B, C, H, W] feature maps
+        rois (Tensor): [R, 5] rows of (batch_index, x1, y1, x2, y2) in image
+            coordinates
+        pooled_height (int): number of output rows
+        pooled_width (int): number of output columns
+        spatial_scale (float): scale from image to feature coordinates
+        sampling_ratio (int): number of samples along each side of a cell
+
+    Returns:
+        Tensor: [R, C, pooled_height, pooled_width]
+
+    References:
+        .. [1] He et al. "Mask R-CNN" ICCV 2017.
+
+    Example:
+        >>> # A linear ramp is reproduced exactly by bilinear sampling
+        >>> features = torch.arange(8).float().view(1, 1, 1, 8).repeat(1, 1, 8, 1)
+        >>> rois = torch.FloatTensor([[0, 1, 1, 5, 5]])
+        >>> out = roi_align(features, rois, 2, 2, spatial_scale=1.0)
+        >>> print(out[0, 0].tolist())
+        [[2.0, 4.0], [2.0, 4.0]]
+    """
+    B, C, H, W = features.shape
+    rois = rois.detach()
+    device = features.device
+    dtype = features.dtype
+    n_rois = len(rois)
+    s = int(sampling_ratio)
+
+    boxes = rois[:, 1:].to(device=device, dtype=dtype) * spatial_scale
+    x1, y1, x2, y2 = boxes.t()
+    roi_w = torch.clamp(x2 - x1, min=1.0)
+    roi_h = torch.clamp(y2 - y1, min=1.0)
+
+    def _sample_coords(start, length, n_bins):
+        # [R, n_bins * s] sample positions, ordered by bin then sample. The
+        # operations are ordered like the reference kernels so samples on
+        # the border of the map are treated the same way.
+        bin_size = (length / n_bins)[:, None, None]
+        cells = torch.arange(n_bins, device=device, dtype=dtype)
+        subs = torch.arange(s, device=device, dtype=dtype) + 0.5
+        coords = ((start[:, None, None] + cells[None, :, None] * bin_size) +
+                  (subs[None, None, :] * bin_size) / s)
+        return coords.view(len(start), n_bins * s)
+
+    ys = _sample_coords(y1, roi_h, pooled_height)
+    xs = _sample_coords(x1, roi_w, pooled_width)
+    # [R, n_bins, s, 2] neighbor indices and weights of each sample
+    yidxs, ywts = _bilinear_coords(ys, H)
+    xidxs, xwts = _bilinear_coords(xs, W)
+    yidxs = yidxs.view(n_rois, pooled_height, 1, s, 2, 1, 1)
+    ywts = ywts.view(n_rois, pooled_height, 1, s, 2, 1, 1)
+    xidxs = xidxs.view(n_rois, 1, pooled_width, 1, 1, s, 2)
+    xwts = xwts.view(n_rois, 1, pooled_width, 1, 1, s, 2)
+
+    # Each output cell is a weighted sum of the 4 * s * s feature vectors
+    # around its samples, which is computed as a batched matrix product.
+    bidxs = _roi_batch_indices(rois).to(device).view(-1, 1, 1, 1, 1, 1, 1)
+    flat_idxs = (bidxs * H + yidxs) * W + xidxs
+    weights = (ywts * xwts) / (s * s)
+
+    n_cells = n_rois * pooled_height * pooled_width
+    features_hwc = features.permute(0, 2, 3, 1).reshape(-1, C)
+    neighbors = features_hwc.index_select(0, flat_idxs.reshape(-1))
+    neighbors = neighbors.view(n_cells, 4 * s * s, C)
+    output = torch.bmm(weights.reshape(n_cells, 1, 4 * s * s), neighbors)
+    output = output.view(n_rois, pooled_height, pooled_width, C)
+    return output.permute(0, 3, 1, 2).contiguous()
 
 
 class RoIPool(nn.Module):
+    """
+    Module wrapper around `roi_pool`
+
+    Example:
+        >>> self = RoIPool(7, 7, spatial_scale=1 / 16)
+        >>> features = torch.rand(2, 4, 20, 30)
+        >>> rois = torch.FloatTensor([[0, 0, 0, 100, 100], [1, 50, 60, 300, 200]])
+        >>> self(features, rois).shape
+        torch.Size([2, 4, 7, 7])
+    """
     def __init__(self, pooled_height, pooled_width, spatial_scale):
         super(RoIPool, self).__init__()
         self.pooled_width = int(pooled_width)
@@ -12,38 +321,110 @@ class RoIPool(nn.Module):
         self.spatial_scale = float(spatial_scale)
 
     def forward(self, features, rois):
-        batch_size, num_channels, data_height, data_width = features.size()
-        num_rois = rois.size()[0]
-        outputs = Variable(torch.zeros(num_rois, num_channels,
-                                       self.pooled_height,
-                                       self.pooled_width)).cuda()
-
-        for roi_ind, roi in enumerate(rois):
-            batch_ind = int(roi[0].data[0])
-            roi_start_w, roi_start_h, roi_end_w, roi_end_h = np.round(
-                roi[1:].data.cpu().numpy() * self.spatial_scale).astype(int)
-            roi_width = max(roi_end_w - roi_start_w + 1, 1)
-            roi_height = max(roi_end_h - roi_start_h + 1, 1)
-            bin_size_w = float(roi_width) / float(self.pooled_width)
-            bin_size_h = float(roi_height) / float(self.pooled_height)
-
-            for ph in range(self.pooled_height):
-                hstart = int(np.floor(ph * bin_size_h))
-                hend = int(np.ceil((ph + 1) * bin_size_h))
-                hstart = min(data_height, max(0, hstart + roi_start_h))
-                hend = min(data_height, max(0, hend + roi_start_h))
-                for pw in range(self.pooled_width):
-                    wstart = int(np.floor(pw * bin_size_w))
-                    wend = int(np.ceil((pw + 1) * bin_size_w))
-                    wstart = min(data_width, max(0, wstart + roi_start_w))
-                    wend = min(data_width, max(0, wend + roi_start_w))
-
-                    is_empty = (hend <= hstart) or(wend <= wstart)
-                    if is_empty:
-                        outputs[roi_ind, :, ph, pw] = 0
-                    else:
-                        data = features[batch_ind]
-                        outputs[roi_ind, :, ph, pw] = torch.max(
-                            torch.max(data[:, hstart:hend, wstart:wend], 1)[0], 2)[0].view(-1)  # noqa
-
-        return outputs
+        return roi_pool(features, rois, self.pooled_height, self.pooled_width,
+                        self.spatial_scale)
+
+
+class RoIAlign(nn.Module):
+    """
+    Module wrapper around `roi_align`
+
+    Example:
+        >>> self = RoIAlign(7, 7, spatial_scale=1 / 16)
+        >>> features = torch.rand(2, 4, 20, 30)
+        >>> rois = torch.FloatTensor([[0, 0, 0, 100, 100], [1, 50, 60, 300, 200]])
+        >>> self(features, rois).shape
+        torch.Size([2, 4, 7, 7])
+    """
+    def __init__(self, pooled_height, pooled_width, spatial_scale,
+                 sampling_ratio=2):
+        super(RoIAlign, self).__init__()
+        self.pooled_width = int(pooled_width)
+        self.pooled_height = int(pooled_height)
+        self.spatial_scale = float(spatial_scale)
+        self.sampling_ratio = int(sampling_ratio)
+
+    def forward(self, features, rois):
+        return roi_align(features, rois, self.pooled_height,
+                         self.pooled_width, self.spatial_scale,
+                         sampling_ratio=self.sampling_ratio)
+
+
+def benchmark_roi_pool(nums=[16, 128, 512], spatial_scale=1 / 16,
+                       verbose=1):
+    """
+    Times the vectorized RoIPool and RoIAlign against the compiled
+    `roi_pool_c` RoIPool (when it is available) and checks that the two
+    RoIPool implementations agree.
+
+    Returns:
+        Dict[str, List[float]]: best time (in seconds) of each implementation
+            for each number of rois
+
+    CommandLine:
+        python -m netharn.layers.roi_pooling.roi_pool_py benchmark_roi_pool
+
+    Example:
+        >>> ydata = benchmark_roi_pool(nums=[4], verbose=0)
+        >>> assert {'py', 'align'}.issubset(set(ydata))
+
+    Benchmark:
+        >>> import netharn as nh
+        >>> ydata = benchmark_roi_pool()
+        >>> nh.util.mplutil.qtensure()
+        >>> nh.util.mplutil.multi_plot([16, 128, 512], ydata,
+        >>>                            xlabel='num rois', ylabel='seconds')
+    """
+    import numpy as np
+    import ubelt as ub
+    impls = {
+        'py': RoIPool(7, 7, spatial_scale),
+        'align': RoIAlign(7, 7, spatial_scale),
+    }
+    try:
+        from netharn.layers.roi_pooling import roi_pool_c
+    except Exception:
+        pass
+    else:
+        impls['c'] = roi_pool_c.RoIPool(7, 7, spatial_scale)
+
+    rng = np.random.RandomState(0)
+    features = torch.from_numpy(rng.rand(2, 256, 38, 50).astype(np.float32))
+    img_h, img_w = (38 / spatial_scale, 50 / spatial_scale)
+
+    ydata = ub.ddict(list)
+    for num in nums:
+        xs = np.sort(rng.rand(num, 2) * img_w, axis=1)
+        ys = np.sort(rng.rand(num, 2) * img_h, axis=1)
+        bidxs = rng.randint(0, len(features), num)
+        rois = np.stack([bidxs, xs[:, 0], ys[:, 0], xs[:, 1], ys[:, 1]], 1)
+        rois = torch.from_numpy(rois.astype(np.float32))
+
+        outputs = {}
+        for key, layer in impls.items():
+            ti = ub.Timerit(3, bestof=1, label='{}-{}'.format(key, num),
+                            verbose=verbose)
+            try:
+                for timer in ti:
+                    with timer:
+                        outputs[key] = layer(features, rois)
+            except Exception as ex:
+                # The compiled extension may not support this torch / device
+                if verbose:
+                    print('{} failed: {!r}'.format(key, ex))
+                ydata[key].append(np.nan)
+            else:
+                ydata[key].append(ti.min())
+        if 'c' in outputs:
+            assert torch.allclose(outputs['c'].cpu(), outputs['py']), (
+                'RoIPool implementations disagree')
+    return ydata
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python -m netharn.layers.roi_pooling.roi_pool_py all
+    """
+    import xdoctest
+    xdoctest.doctest_module(__file__)
@@ -1,9 +1,11 @@
+import itertools as it
 import pandas as pd
 import numpy as np
 import ubelt as ub
 from netharn import util
 from netharn.util import profiler
 import warnings
+from os.path import join
 
 
 class DetectionMetrics(object):
@@ -142,61 +144,127 @@ class DetectionMetrics(object):
         for bbox, cid, weight in zip(true_boxes.to_xywh(), true_cids, true_weights):
             dmet.true.add_annotation(true_gid, cid, bbox=bbox, weight=weight)
 
-    def score_netharn(dmet, ovthresh=0.5, bias=0, method='voc2012', gids=None):
-        y_accum = ub.ddict(list)
-        # confusions = []
-        if gids is None:
-            gids = dmet.pred.imgs.keys()
-        for gid in gids:
-            pred_annots = dmet.pred.annots(gid=gid)
-            true_annots = dmet.true.annots(gid=gid)
+    def score_netharn(dmet, ovthresh=0.5, bias=0, method='voc2012', gids=None,
+                      workers=0):
+        """
+        Scores the predictions by assigning them to the truth in all images at
+        once (see `batch_detection_confusions`).
 
-            true_boxes = true_annots.boxes
-            true_cxs = true_annots.cids
-            true_weights = true_annots._lookup('weight')
+        Args:
+            workers (int): if non-zero, the images are split into shards that
+                are assigned in this many processes. The result does not
+                depend on the number of workers.
 
-            pred_boxes = pred_annots.boxes
-            pred_cxs = pred_annots.cids
-            pred_scores = pred_annots._lookup('score')
+        Example:
+            >>> dmet = DetectionMetrics.demo(
+            >>>     nimgs=10, nboxes=(0, 3), n_fp=(0, 1), nclasses=2)
+            >>> nh_scores = dmet.score_netharn()
+            >>> assert set(nh_scores['perclass'].keys()) == {0, 1}
+            >>> assert 0 < nh_scores['mAP'] <= 1
+            >>> # Sharding the images across processes gives the same scores
+            >>> assert dmet.score_netharn(workers=2)['mAP'] == nh_scores['mAP']
+        """
+        if gids is None:
+            gids = list(dmet.pred.imgs.keys())
+        else:
+            gids = list(gids)
 
-            y = detection_confusions(true_boxes, true_cxs, true_weights,
-                                     pred_boxes, pred_scores, pred_cxs,
-                                     bg_weight=1.0, ovthresh=ovthresh,
-                                     bg_cls=-1, bias=bias)
-            y['gid'] = [gid] * len(y['pred'])
-            for k, v in y.items():
-                y_accum[k].extend(v)
+        true_boxes, true_cxs, true_weights, true_gxs = _gather_detections(
+            dmet.true, gids, 'weight')
+        pred_boxes, pred_cxs, pred_scores, pred_gxs = _gather_detections(
+            dmet.pred, gids, 'score')
 
-        y_df = pd.DataFrame(y_accum)
+        y = _sharded_detection_confusions(
+            true_boxes, true_cxs, true_weights, true_gxs,
+            pred_boxes, pred_scores, pred_cxs, pred_gxs, len(gids),
+            workers=workers, bg_weight=1.0, ovthresh=ovthresh, bg_cls=-1,
+            bias=bias)
+        y['gid'] = np.array(gids, dtype=object)[y['gxs']]
 
-        # class agnostic score
-        ap, prec, rec = pr_curves(y_df)
-        peritem = {
-            'ap': ap,
-            'pr': (prec, rec),
-        }
+        return _summarize_confusions(y, method=method)
 
-        # perclass scores
-        perclass = {}
-        cx_to_group = dict(iter(y_df.groupby('cx')))
-        for cx in cx_to_group:
-            # for cx, group in cx_to_group.items():
-            group = cx_to_group.get(cx, None)
-            ap, prec, rec = pr_curves(group, method=method)
-            perclass[cx] = {
-                'ap': ap,
-                'pr': (prec, rec),
-            }
+    def score_iou_sweep(dmet, ovthreshs=None, bias=0, method='coco',
+                        gids=None):
+        """
+        Scores the predictions at several overlap thresholds (by default the
+        COCO range .5:.05:.95) without pycocotools.
+
+        The overlaps are computed once (see `multi_detection_confusions`),
+        and the per threshold scores are computed like `score_netharn`. The
+        101 point `coco` AP interpolation is used by default, but netharn's
+        assignment rules (e.g. weights instead of crowd regions) still apply,
+        so the numbers are close to, but not the same as, `score_coco`.
+
+        Args:
+            ovthreshs (Iterable[float]): overlap thresholds
+            method (str): AP method, can be coco, voc2007, or voc2012
+
+        Returns:
+            Dict: with keys
+                mAP: the mAP averaged over all thresholds,
+                ap_table (pd.DataFrame): AP of each threshold (rows) and
+                    class (columns),
+                per_thresh (Dict[float, Dict]): the `score_netharn`-style
+                    scores of each threshold
 
-        mAP = np.nanmean([d['ap'] for d in perclass.values()])
-        nh_scores = {
+        Example:
+            >>> dmet = DetectionMetrics.demo(
+            >>>     nimgs=10, nboxes=(0, 3), n_fp=(0, 1), nclasses=2,
+            >>>     box_noise=2)
+            >>> sweep = dmet.score_iou_sweep()
+            >>> assert sweep['ap_table'].shape == (10, 2)
+            >>> nh_scores = dmet.score_netharn(ovthresh=.75, method='coco')
+            >>> assert sweep['per_thresh'][.75]['mAP'] == nh_scores['mAP']
+        """
+        if ovthreshs is None:
+            ovthreshs = np.round(np.linspace(.5, .95, 10), 2).tolist()
+        if gids is None:
+            gids = list(dmet.pred.imgs.keys())
+        else:
+            gids = list(gids)
+
+        true_boxes, true_cxs, true_weights, true_gxs = _gather_detections(
+            dmet.true, gids, 'weight')
+        pred_boxes, pred_cxs, pred_scores, pred_gxs = _gather_detections(
+            dmet.pred, gids, 'score')
+
+        ys = multi_detection_confusions(
+            true_boxes, true_cxs, true_weights, true_gxs,
+            pred_boxes, pred_scores, pred_cxs, pred_gxs, ovthreshs,
+            bg_weight=1.0, bg_cls=-1, bias=bias)
+
+        per_thresh = ub.odict()
+        for ovthresh, y in ys.items():
+            per_thresh[ovthresh] = _summarize_confusions(y, method=method)
+
+        ap_table = pd.DataFrame.from_dict(ub.odict([
+            (ovthresh, {cx: d['ap'] for cx, d in scores['perclass'].items()})
+            for ovthresh, scores in per_thresh.items()
+        ]), orient='index')
+        ap_table.index.name = 'ovthresh'
+        mAP = np.nanmean([scores['mAP'] for scores in per_thresh.values()])
+        sweep_scores = {
             'mAP': mAP,
-            'perclass': perclass,
-            'peritem': peritem
+            'ap_table': ap_table,
+            'per_thresh': per_thresh,
         }
-        return nh_scores
+        return sweep_scores
 
-    def score_voc(dmet, ovthresh=0.5, bias=1, method='voc2012', gids=None):
+    def score_voc(dmet, ovthresh=0.5, bias=1, method='voc2012', gids=None,
+                  workers=0):
+        """
+        Scores the predictions with the original VOC evaluation code.
+
+        Args:
+            workers (int): if non-zero, each class is evaluated in one of
+                this many processes.
+
+        Example:
+            >>> dmet = DetectionMetrics.demo(
+            >>>     nimgs=10, nboxes=(0, 3), n_fp=(0, 1), nclasses=2)
+            >>> voc_scores = dmet.score_voc()
+            >>> assert dmet.score_voc(workers=2)['mAP'] == voc_scores['mAP']
+        """
         recs = {}
         cx_to_lines = ub.ddict(list)
         # confusions = []
@@ -228,13 +296,26 @@ class DetectionMetrics(object):
                 cx_to_lines[cx].append([gid, score] + list(bbox))
 
         perclass = ub.ddict(dict)
-        for cx in cx_to_lines.keys():
-            lines = cx_to_lines[cx]
-            classname = cx
-            rec, prec, ap = voc_eval(lines, recs, classname, ovthresh=ovthresh,
-                                     bias=bias, method=method)
-            perclass[cx]['pr'] = (rec, prec)
-            perclass[cx]['ap'] = ap
+        executor = ub.Executor(mode='process', max_workers=workers)
+        with executor:
+            jobs = ub.odict()
+            for cx in cx_to_lines.keys():
+                lines = cx_to_lines[cx]
+                classname = cx
+                if workers:
+                    # Only send the truth this class needs to the worker
+                    class_recs = {
+                        gid: [obj for obj in objs if obj['name'] == classname]
+                        for gid, objs in recs.items()}
+                else:
+                    class_recs = recs
+                jobs[cx] = executor.submit(
+                    voc_eval, lines, class_recs, classname, ovthresh=ovthresh,
+                    bias=bias, method=method)
+            for cx, job in jobs.items():
+                rec, prec, ap = job.result()
+                perclass[cx]['pr'] = (rec, prec)
+                perclass[cx]['ap'] = ap
 
         mAP = np.nanmean([d['ap'] for d in perclass.values()])
         voc_scores = {
@@ -272,6 +353,186 @@ class DetectionMetrics(object):
         return coco_scores
 
 
+class DetectionAccumulator(object):
+    """
+    Scores detections as they arrive, one image at a time, without keeping
+    the boxes around.
+
+    Each call to `add` assigns the predictions of one image to its truth
+    (with `batch_detection_confusions`) and keeps only the class, score,
+    weight, and outcome (TP / FP / FN) of each resulting row. Calling `score`
+    gives the same result as `DetectionMetrics.score_netharn` on the same
+    images.
+
+    If `nbins` is specified, the rows are not kept at all. Instead each class
+    keeps a histogram of true and false positives over `score_range`, which
+    bounds the memory regardless of how many images are added, and `score`
+    computes an approximate AP by treating every bin as a single threshold.
+
+    Args:
+        ovthresh (float): overlap threshold
+        bias (float): for computing overlap either 1 or 0
+        bg_weight (float): weight of background predictions
+        nbins (int | None): if specified, use score histograms with this many
+            bins instead of exact rows.
+        score_range (Tuple[float, float]): range of the histogram bins.
+            Scores outside of this range are clipped into the first / last bin.
+
+    Example:
+        >>> dmet = DetectionMetrics.demo(
+        >>>     nimgs=30, nboxes=(0, 5), n_fp=(0, 2), nclasses=3,
+        >>>     box_noise=3)
+        >>> accum = DetectionAccumulator()
+        >>> for gid in dmet.pred.imgs.keys():
+        >>>     true = _gather_detections(dmet.true, [gid], 'weight')
+        >>>     pred = _gather_detections(dmet.pred, [gid], 'score')
+        >>>     accum.add(true[0], true[1], true[2], pred[0], pred[1], pred[2])
+        >>> assert accum.score()['mAP'] == dmet.score_netharn()['mAP']
+
+    Example:
+        >>> # Histogram scores approximate the exact ones
+        >>> dmet = DetectionMetrics.demo(
+        >>>     nimgs=30, nboxes=(0, 5), n_fp=(0, 2), nclasses=3,
+        >>>     box_noise=3)
+        >>> accum = DetectionAccumulator(nbins=1000, score_range=(0, 10))
+        >>> for gid in dmet.pred.imgs.keys():
+        >>>     true = _gather_detections(dmet.true, [gid], 'weight')
+        >>>     pred = _gather_detections(dmet.pred, [gid], 'score')
+        >>>     accum.add(true[0], true[1], true[2], pred[0], pred[1], pred[2])
+        >>> approx = accum.score()['mAP']
+        >>> exact = dmet.score_netharn()['mAP']
+        >>> assert np.isclose(approx, exact, atol=0.01)
+    """
+    # outcome of each kept row
+    _TP, _FP, _FN = 0, 1, 2
+
+    def __init__(accum, ovthresh=0.5, bias=0, bg_weight=1.0, nbins=None,
+                 score_range=(0, 1)):
+        accum.ovthresh = ovthresh
+        accum.bias = bias
+        accum.bg_weight = bg_weight
+        accum.nbins = nbins
+        accum.score_range = score_range
+        accum.reset()
+
+    def reset(accum):
+        """
+        Forgets everything that was added (e.g. at the end of an epoch)
+        """
+        accum.n_images = 0
+        # exact mode: chunks of compact rows
+        accum._rows = []
+        # histogram mode: per class true / false positive counts and the
+        # total weight of the truth
+        accum._hists = ub.ddict(lambda: np.zeros((2, accum.nbins)))
+        accum._npos = ub.ddict(float)
+
+    def add(accum, true_boxes, true_cids, true_weights, pred_boxes,
+            pred_cids, pred_scores):
+        """
+        Adds the truth and predictions of a single image.
+
+        Args:
+            true_boxes (ndarray | nh.util.Boxes): groundtruth boxes
+                (ndarrays are in tlbr format)
+            true_cids (ndarray): class of each true box
+            true_weights (ndarray | None): weight of each true box
+            pred_boxes (ndarray | nh.util.Boxes): predicted boxes
+            pred_cids (ndarray): class of each prediction
+            pred_scores (ndarray): score of each prediction
+        """
+        true_boxes = _as_tlbr(true_boxes)
+        pred_boxes = _as_tlbr(pred_boxes)
+        y = batch_detection_confusions(
+            true_boxes, np.asarray(true_cids, dtype=np.int64), true_weights,
+            np.zeros(len(true_boxes), dtype=np.int64),
+            pred_boxes, np.asarray(pred_scores, dtype=np.float64),
+            np.asarray(pred_cids, dtype=np.int64),
+            np.zeros(len(pred_boxes), dtype=np.int64),
+            bg_weight=accum.bg_weight, ovthresh=accum.ovthresh, bg_cls=-1,
+            bias=accum.bias)
+        accum.n_images += 1
+
+        outcome = np.full(len(y['cx']), accum._TP, dtype=np.int8)
+        outcome[y['true'] == -1] = accum._FP
+        outcome[y['pred'] == -1] = accum._FN
+
+        if accum.nbins is None:
+            accum._rows.append({
+                'cx': y['cx'].astype(np.int32),
+                'outcome': outcome,
+                'score': y['score'],
+                'weight': y['weight'],
+            })
+        else:
+            binxs = accum._binxs(y['score'])
+            is_det = outcome != accum._FN
+            is_pos = y['true'] >= 0
+            for cx, idxs in ub.group_items(range(len(outcome)),
+                                           y['cx'].tolist()).items():
+                idxs = np.array(idxs)
+                det_idxs = idxs[is_det[idxs]]
+                hist = accum._hists[cx]
+                np.add.at(hist, (outcome[det_idxs], binxs[det_idxs]), 1)
+                accum._npos[cx] += y['weight'][idxs[is_pos[idxs]]].sum()
+
+    def _binxs(accum, scores):
+        low, high = accum.score_range
+        binxs = np.floor((scores - low) / (high - low) * accum.nbins)
+        return np.clip(binxs, 0, accum.nbins - 1).astype(np.int64)
+
+    def confusions(accum):
+        """
+        Returns:
+            Dict[str, ndarray]: the `pred`, `true`, `score`, `weight`, and
+                `cx` columns of the accumulated confusion rows (only
+                available when `nbins` is None).
+        """
+        if accum.nbins is not None:
+            raise ValueError('confusion rows are not kept in histogram mode')
+        keys = ['cx', 'outcome', 'score', 'weight']
+        if accum._rows:
+            rows = {k: np.hstack([r[k] for r in accum._rows]) for k in keys}
+        else:
+            rows = {'cx': np.empty(0, dtype=np.int32),
+                    'outcome': np.empty(0, dtype=np.int8),
+                    'score': np.empty(0), 'weight': np.empty(0)}
+        cx = rows['cx'].astype(np.int64)
+        y = {
+            'pred': np.where(rows['outcome'] == accum._FN, -1, cx),
+            'true': np.where(rows['outcome'] == accum._FP, -1, cx),
+            'score': rows['score'],
+            'weight': rows['weight'],
+            'cx': cx,
+        }
+        return y
+
+    def score(accum, method='voc2012'):
+        """
+        Returns:
+            Dict: with the same `mAP`, `perclass`, and `peritem` entries as
+                `DetectionMetrics.score_netharn`
+        """
+        if accum.nbins is None:
+            return _summarize_confusions(accum.confusions(), method=method)
+
+        # The bins are visited from the highest to the lowest score
+        perclass = {}
+        total_hist = np.zeros((2, accum.nbins))
+        total_npos = 0.0
+        for cx in sorted(accum._hists.keys()):
+            hist = accum._hists[cx]
+            npos = accum._npos[cx]
+            total_hist += hist
+            total_npos += npos
+            ap, prec, rec = _hist_pr_curves(hist, npos, method=method)
+            perclass[cx] = {'ap': ap, 'pr': (prec, rec)}
+        ap, prec, rec = _hist_pr_curves(total_hist, total_npos)
+        peritem = {'ap': ap, 'pr': (prec, rec)}
+        mAP = np.nanmean([d['ap'] for d in perclass.values()])
+        return {'mAP': mAP, 'perclass': perclass, 'peritem': peritem}
+
+
 @profiler.profile
 def detection_confusions(true_boxes, true_cxs, true_weights, pred_boxes, pred_scores, pred_cxs, bg_weight=1.0, ovthresh=0.5, bg_cls=-1, bias=0.0):
     """ Classify detections by assigning to groundtruth boxes.
@@ -347,134 +608,430 @@ def detection_confusions(true_boxes, true_cxs, true_weights, pred_boxes, pred_sc
         >>> y = pd.DataFrame(y)
         >>> print(y)  # xdoc: +IGNORE_WANT
     """
-    y_pred = []
-    y_true = []
-    y_score = []
-    y_weight = []
-    cxs = []
+    if isinstance(true_boxes, util.Boxes):
+        true_boxes = true_boxes.to_tlbr().data
+    if isinstance(pred_boxes, util.Boxes):
+        pred_boxes = pred_boxes.to_tlbr().data
+    true_boxes = np.asarray(true_boxes, dtype=np.float64).reshape(-1, 4)
+    pred_boxes = np.asarray(pred_boxes, dtype=np.float64).reshape(-1, 4)
+    y = batch_detection_confusions(
+        true_boxes, true_cxs, true_weights, np.zeros(len(true_boxes), int),
+        pred_boxes, pred_scores, pred_cxs, np.zeros(len(pred_boxes), int),
+        bg_weight=bg_weight, ovthresh=ovthresh, bg_cls=bg_cls, bias=bias)
+    y.pop('gxs')
+    return y
 
-    y_pxs = []
-    y_txs = []
 
-    if bg_weight is None:
-        bg_weight = 1.0
+def _pair_ious(boxes1, boxes2, bias=0):
+    """
+    Elementwise IoU between corresponding rows of two (N, 4) tlbr arrays
 
-    if False:
-        if isinstance(true_boxes, util.Boxes):
-            true_boxes = true_boxes.data
-        if isinstance(pred_boxes, util.Boxes):
-            pred_boxes = pred_boxes.data
-    else:
-        if not isinstance(true_boxes, util.Boxes):
-            true_boxes = util.Boxes(true_boxes, 'tlbr')
-        if not isinstance(pred_boxes, util.Boxes):
-            pred_boxes = util.Boxes(pred_boxes, 'tlbr')
+    Example:
+        >>> boxes1 = np.array([[0, 0, 10, 10], [0, 0, 10, 10]])
+        >>> boxes2 = np.array([[5, 0, 15, 10], [20, 20, 30, 30]])
+        >>> _pair_ious(boxes1, boxes2).tolist()
+        [0.3333333333333333, 0.0]
+    """
+    w1 = boxes1[:, 2] - boxes1[:, 0] + bias
+    h1 = boxes1[:, 3] - boxes1[:, 1] + bias
+    w2 = boxes2[:, 2] - boxes2[:, 0] + bias
+    h2 = boxes2[:, 3] - boxes2[:, 1] + bias
+    iws = np.maximum(np.minimum(boxes1[:, 2], boxes2[:, 2]) -
+                     np.maximum(boxes1[:, 0], boxes2[:, 0]) + bias, 0)
+    ihs = np.maximum(np.minimum(boxes1[:, 3], boxes2[:, 3]) -
+                     np.maximum(boxes1[:, 1], boxes2[:, 1]) + bias, 0)
+    inter_areas = iws * ihs
+    union_areas = w1 * h1 + w2 * h2 - inter_areas
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ious = inter_areas / union_areas
+    return ious
+
+
+@profiler.profile
+def batch_detection_confusions(true_boxes, true_cxs, true_weights, true_gxs,
+                               pred_boxes, pred_scores, pred_cxs, pred_gxs,
+                               bg_weight=1.0, ovthresh=0.5, bg_cls=-1,
+                               bias=0.0):
+    """
+    Assigns predictions to groundtruth in many images at once.
+
+    This computes the same assignment as calling `detection_confusions` on
+    each image, but works on the concatenated boxes of all images. Every
+    prediction is compared with the truth of the same image and class using
+    a single flat array of candidate pairs, and the greedy highest-score-first
+    assignment is resolved with sorts instead of a python loop.
+
+    Args:
+        true_boxes (ndarray): (N, 4) groundtruth boxes in tlbr format
+        true_cxs (ndarray): class of each true box
+        true_weights (ndarray | None): weight of each true box
+        true_gxs (ndarray): index of the image each true box belongs to
+        pred_boxes (ndarray): (M, 4) predicted boxes in tlbr format
+        pred_scores (ndarray): score of each prediction
+        pred_cxs (ndarray): class of each prediction
+        pred_gxs (ndarray): index of the image each prediction belongs to
+        bg_weight (float): weight of background predictions
+        ovthresh (float): overlap threshold
+        bg_cls (int): true class assigned to false positives
+        bias (float): for computing overlap either 1 or 0
+
+    Returns:
+        Dict[str, ndarray]: the columns of `detection_confusions` and a `gxs`
+            column. The rows of each image are contiguous (in increasing
+            image index), `txs` and `pxs` index into the concatenated inputs.
 
-    # Keep track of which true items have been used
-    true_unused = np.ones(len(true_cxs), dtype=np.bool)
+    Example:
+        >>> from netharn.metrics.detections import *
+        >>> true_boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10],
+        >>>                        [20, 0, 30, 10]])
+        >>> true_cxs = np.array([0, 0, 1])
+        >>> true_gxs = np.array([0, 1, 1])
+        >>> pred_boxes = np.array([[1, 1, 10, 10], [1, 1, 10, 10],
+        >>>                        [0, 0, 10, 10]])
+        >>> pred_scores = np.array([.9, .8, .7])
+        >>> pred_cxs = np.array([0, 0, 0])
+        >>> pred_gxs = np.array([0, 0, 1])
+        >>> y = batch_detection_confusions(
+        >>>     true_boxes, true_cxs, None, true_gxs,
+        >>>     pred_boxes, pred_scores, pred_cxs, pred_gxs)
+        >>> print(ub.repr2(ub.map_vals(list, y), nl=1))
+        {
+            'cx': [0, 0, 0, 1],
+            'gxs': [0, 0, 1, 1],
+            'pred': [0, 0, 0, -1],
+            'pxs': [0, 1, 2, -1],
+            'score': [0.9, 0.8, 0.7, 0.0],
+            'true': [0, -1, 0, 1],
+            'txs': [0, -1, 1, 2],
+            'weight': [1.0, 1.0, 1.0, 1.0],
+        }
+    """
+    matches = _match_detections(true_boxes, true_cxs, true_weights, true_gxs,
+                                pred_boxes, pred_scores, pred_cxs, pred_gxs,
+                                bias=bias)
+    return _assign_detections(matches, ovthresh=ovthresh, bg_weight=bg_weight,
+                              bg_cls=bg_cls)
+
+
+def multi_detection_confusions(true_boxes, true_cxs, true_weights, true_gxs,
+                               pred_boxes, pred_scores, pred_cxs, pred_gxs,
+                               ovthreshs, bg_weight=1.0, bg_cls=-1, bias=0.0):
+    """
+    Computes the `batch_detection_confusions` of several overlap thresholds
+    at once.
+
+    The overlaps, and the best truth of each prediction, do not depend on the
+    threshold, so they are computed a single time and only the final greedy
+    assignment is done for each threshold.
+
+    Args:
+        ovthreshs (Iterable[float]): overlap thresholds
+        **: see `batch_detection_confusions`
+
+    Returns:
+        Dict[float, Dict[str, ndarray]]: the confusion rows of each threshold
+
+    Example:
+        >>> true_boxes = np.array([[0, 0, 10, 10], [20, 0, 30, 10]])
+        >>> pred_boxes = np.array([[0, 0, 10, 10], [20, 2, 30, 10]])
+        >>> ys = multi_detection_confusions(
+        >>>     true_boxes, [0, 0], None, [0, 0],
+        >>>     pred_boxes, [.9, .8], [0, 0], [0, 0], ovthreshs=[.5, .9])
+        >>> print({thresh: y['true'].tolist() for thresh, y in ys.items()})
+        {0.5: [0, 0], 0.9: [0, -1, 0]}
+    """
+    matches = _match_detections(true_boxes, true_cxs, true_weights, true_gxs,
+                                pred_boxes, pred_scores, pred_cxs, pred_gxs,
+                                bias=bias)
+    ys = ub.odict()
+    for ovthresh in ovthreshs:
+        ys[ovthresh] = _assign_detections(
+            matches, ovthresh=ovthresh, bg_weight=bg_weight, bg_cls=bg_cls)
+    return ys
+
+
+def _match_detections(true_boxes, true_cxs, true_weights, true_gxs,
+                      pred_boxes, pred_scores, pred_cxs, pred_gxs, bias=0.0):
+    """
+    Finds the processing order of the predictions and the truth each one
+    overlaps the most (the threshold independent part of
+    `batch_detection_confusions`).
+    """
+    true_boxes = np.asarray(true_boxes, dtype=np.float64).reshape(-1, 4)
+    pred_boxes = np.asarray(pred_boxes, dtype=np.float64).reshape(-1, 4)
+    true_cxs = np.asarray(true_cxs, dtype=np.int64).reshape(-1)
+    pred_cxs = np.asarray(pred_cxs, dtype=np.int64).reshape(-1)
+    true_gxs = np.asarray(true_gxs, dtype=np.int64).reshape(-1)
+    pred_gxs = np.asarray(pred_gxs, dtype=np.int64).reshape(-1)
+    pred_scores = np.asarray(pred_scores, dtype=np.float64).reshape(-1)
     if true_weights is None:
         true_weights = np.ones(len(true_cxs))
     else:
-        true_weights = np.array(true_weights)
-    pred_scores = np.array(pred_scores)
-    pred_cxs = np.array(pred_cxs)
-    true_cxs = np.array(true_cxs)
-
-    # Group true boxes by class
-    # Keep track which true boxes are unused / not assigned
-    cx_to_idxs = ub.group_items(range(len(true_cxs)), true_cxs)
-    cx_to_tboxes = util.group_items(true_boxes, true_cxs, axis=0)
-    cx_to_tweight = util.group_items(true_weights, true_cxs, axis=0)
-
-    # cx_to_boxes = ub.group_items(true_boxes, true_cxs)
-    # cx_to_boxes = ub.map_vals(np.array, cx_to_boxes)
-
-    # sort predictions by descending score
-    _pred_sortx = pred_scores.argsort()[::-1]
-    _pred_boxes = pred_boxes.take(_pred_sortx, axis=0)
-    _pred_cxs = pred_cxs.take(_pred_sortx, axis=0)
-    _pred_scores = pred_scores.take(_pred_sortx, axis=0)
-
-    # For each predicted detection box
-    # Allow it to match the truth of a particular class
-    for px, cx, box, score in zip(_pred_sortx, _pred_cxs, _pred_boxes, _pred_scores):
-        cls_true_idxs = cx_to_idxs.get(cx, [])
-
-        ovmax = -np.inf
-        ovidx = None
-        weight = bg_weight
-        tx = None  # we will set this to the index of the assignd gt
-
-        if len(cls_true_idxs):
-            cls_true_boxes = cx_to_tboxes[cx]
-            cls_true_weights = cx_to_tweight[cx]
-            # cls_true_boxes = true_boxes.take(cls_true_idxs, axis=0)
-            # cls_true_weights = true_weights.take(cls_true_idxs, axis=0)
-
-            overlaps = cls_true_boxes.ious(box, bias=bias)
-
-            # choose best score by default
-            ovidx = overlaps.argsort()[-1]
-            ovmax = overlaps[ovidx]
-            weight = cls_true_weights[ovidx]
-            tx = cls_true_idxs[ovidx]
-
-        if ovmax > ovthresh and true_unused[tx]:
-            # Assign this prediction to a groundtruth object
-            # Mark this prediction as a true positive
-            y_pred.append(cx)
-            y_true.append(cx)
-            y_score.append(score)
-            y_weight.append(weight)
-            cxs.append(cx)
-            # cls_unused[ovidx] = False
-
-            tx = cls_true_idxs[ovidx]
-            true_unused[tx] = False
-
-            y_pxs.append(px)
-            y_txs.append(tx)
-        else:
-            # Assign this prediction to a the background
-            # Mark this prediction as a false positive
-            y_pred.append(cx)
-            y_true.append(bg_cls)  # use -1 as background ignore class
-            y_score.append(score)
-            y_weight.append(bg_weight)
-            cxs.append(cx)
-
-            tx = -1
-            y_pxs.append(px)
-            y_txs.append(tx)
-
-    # All pred boxes have been assigned to a truth box or the background.
-    # Mark unused true boxes we failed to predict as false negatives
-    for tx in np.where(true_unused)[0]:
-        # Mark each unmatched truth as a false negative
-        y_pred.append(-1)
-        y_true.append(true_cxs[tx])
-        y_score.append(0.0)
-        y_weight.append(true_weights[tx])
-        cxs.append(true_cxs[tx])
-
-        px = -1
-        y_pxs.append(px)
-        y_txs.append(tx)
+        true_weights = np.asarray(true_weights, dtype=np.float64).reshape(-1)
+    n_true = len(true_cxs)
+    n_pred = len(pred_cxs)
+
+    # Process predictions in each image by descending score (ties are
+    # broken by descending index, as in a reversed stable argsort)
+    pred_order = np.lexsort((-np.arange(n_pred), -pred_scores, pred_gxs))
+
+    # Each (image, class) pair is a group. Sort the truth by group so the
+    # candidates of each prediction are a contiguous slice.
+    _, cx_codes = np.unique(np.hstack([true_cxs, pred_cxs]),
+                            return_inverse=True)
+    n_codes = cx_codes.max() + 1 if len(cx_codes) else 1
+    true_keys = true_gxs * n_codes + cx_codes[:n_true]
+    pred_keys = pred_gxs * n_codes + cx_codes[n_true:]
+    true_sortx = np.argsort(true_keys, kind='mergesort')
+    sorted_keys = true_keys[true_sortx]
+    lo = np.searchsorted(sorted_keys, pred_keys, 'left')
+    hi = np.searchsorted(sorted_keys, pred_keys, 'right')
+
+    # Expand every (prediction, candidate truth) pair
+    counts = hi - lo
+    pair_px = np.repeat(np.arange(n_pred), counts)
+    pair_starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+    pair_tx = true_sortx[pair_starts + np.arange(len(pair_px))]
+    pair_ious = _pair_ious(pred_boxes[pair_px], true_boxes[pair_tx], bias)
+
+    # The best truth for each prediction is the last pair after sorting by
+    # overlap (ties go to the highest true index, nan sorts last)
+    best_tx = np.full(n_pred, -1, dtype=np.int64)
+    ovmax = np.full(n_pred, -np.inf)
+    if len(pair_px):
+        pairx = np.lexsort((pair_tx, pair_ious, pair_px))
+        is_last = np.r_[pair_px[pairx][1:] != pair_px[pairx][:-1], True]
+        lastx = pairx[is_last]
+        best_tx[pair_px[lastx]] = pair_tx[lastx]
+        ovmax[pair_px[lastx]] = pair_ious[lastx]
+
+    matches = {
+        'true_cxs': true_cxs, 'true_weights': true_weights,
+        'true_gxs': true_gxs, 'pred_scores': pred_scores,
+        'pred_cxs': pred_cxs, 'pred_gxs': pred_gxs,
+        'pred_order': pred_order, 'best_tx': best_tx, 'ovmax': ovmax,
+    }
+    return matches
 
+
+def _assign_detections(matches, ovthresh=0.5, bg_weight=1.0, bg_cls=-1):
+    """
+    Greedily assigns the predictions in `_match_detections` output to the
+    truth and builds the confusion rows.
+    """
+    if bg_weight is None:
+        bg_weight = 1.0
+    true_cxs = matches['true_cxs']
+    true_weights = matches['true_weights']
+    true_gxs = matches['true_gxs']
+    pred_scores = matches['pred_scores']
+    pred_cxs = matches['pred_cxs']
+    pred_gxs = matches['pred_gxs']
+    pred_order = matches['pred_order']
+    best_tx = matches['best_tx']
+    ovmax = matches['ovmax']
+    n_true = len(true_cxs)
+    n_pred = len(pred_cxs)
+
+    # A prediction is a true positive if its best truth overlaps enough and
+    # was not already claimed by a higher scoring prediction. Predictions
+    # that do not qualify never claim anything.
+    with np.errstate(invalid='ignore'):
+        qualified = ovmax[pred_order] > ovthresh
+    is_tp = np.zeros(n_pred, dtype=bool)
+    claim_order = pred_order[qualified]
+    _, firstx = np.unique(best_tx[claim_order], return_index=True)
+    is_tp[claim_order[firstx]] = True
+    true_used = np.zeros(n_true, dtype=bool)
+    true_used[best_tx[is_tp]] = True
+
+    # Predictions (in processing order) followed by the missed truth
+    fn_txs = np.where(~true_used)[0]
+    px = pred_order
+    tp = is_tp[px]
+    pred_cx = pred_cxs[px]
     y = {
-        'pred': y_pred,
-        'true': y_true,
-        'score': y_score,
-        'weight': y_weight,
-        'cx': cxs,
-        'txs': y_txs,  # index into the original true box for this row
-        'pxs': y_pxs,  # index into the original pred box for this row
+        'pred': np.hstack([pred_cx, np.full(len(fn_txs), -1)]),
+        'true': np.hstack([np.where(tp, pred_cx, bg_cls),
+                           true_cxs[fn_txs]]),
+        'score': np.hstack([pred_scores[px], np.zeros(len(fn_txs))]),
+        'weight': np.hstack([
+            np.where(tp, true_weights[np.maximum(best_tx[px], 0)],
+                     bg_weight) if n_true else np.full(n_pred, bg_weight),
+            true_weights[fn_txs]]),
+        'cx': np.hstack([pred_cx, true_cxs[fn_txs]]),
+        'txs': np.hstack([np.where(tp, best_tx[px], -1), fn_txs]),
+        'pxs': np.hstack([px, np.full(len(fn_txs), -1)]),
+        'gxs': np.hstack([pred_gxs[px], true_gxs[fn_txs]]),
     }
-    # print('y = {}'.format(ub.repr2(y, nl=1)))
-    # y = pd.DataFrame(y)
+    # Make the rows of each image contiguous
+    is_fn = np.r_[np.zeros(n_pred, dtype=bool), np.ones(len(fn_txs), bool)]
+    rowx = np.lexsort((is_fn, y['gxs']))
+    y = {key: val[rowx] for key, val in y.items()}
     return y
 
 
+def _sharded_detection_confusions(true_boxes, true_cxs, true_weights,
+                                  true_gxs, pred_boxes, pred_scores, pred_cxs,
+                                  pred_gxs, n_images, workers=0, **kw):
+    """
+    Calls `batch_detection_confusions` on contiguous shards of images in a
+    process pool.
+
+    The inputs are written once to a temporary directory and each worker
+    memory maps its slice, so the boxes are not pickled for every shard. The
+    shard results are concatenated in order and their indices are offset, so
+    the result is identical to a single call regardless of `workers`.
+
+    Args:
+        n_images (int): number of images (`true_gxs` and `pred_gxs` must be
+            sorted and less than this)
+        workers (int): number of processes. If 0, everything is done in
+            this process.
+        **kw: passed to `batch_detection_confusions`
+
+    Example:
+        >>> dmet = DetectionMetrics.demo(nimgs=7, nboxes=(0, 4), n_fp=(0, 2))
+        >>> gids = list(dmet.pred.imgs.keys())
+        >>> true = _gather_detections(dmet.true, gids, 'weight')
+        >>> pred = _gather_detections(dmet.pred, gids, 'score')
+        >>> args = true + (pred[0], pred[2], pred[1], pred[3], len(gids))
+        >>> y1 = _sharded_detection_confusions(*args, workers=0)
+        >>> y2 = _sharded_detection_confusions(*args, workers=3)
+        >>> assert all(np.all(y1[k] == y2[k]) for k in y1)
+    """
+    if true_weights is None:
+        true_weights = np.ones(len(true_boxes))
+    columns = ub.odict([
+        ('true_boxes', true_boxes), ('true_cxs', true_cxs),
+        ('true_weights', true_weights), ('true_gxs', true_gxs),
+        ('pred_boxes', pred_boxes), ('pred_scores', pred_scores),
+        ('pred_cxs', pred_cxs), ('pred_gxs', pred_gxs),
+    ])
+    if not workers or n_images < 2:
+        return batch_detection_confusions(**dict(columns, **kw))
+
+    # A few shards per worker to balance images with many boxes
+    n_shards = min(n_images, workers * 4)
+    gx_bounds = np.linspace(0, n_images, n_shards + 1).astype(np.int64)
+    true_bounds = np.searchsorted(true_gxs, gx_bounds)
+    pred_bounds = np.searchsorted(pred_gxs, gx_bounds)
+
+    with ub.TempDir() as temp:
+        for key, data in columns.items():
+            np.save(join(temp.dpath, key + '.npy'), np.asarray(data))
+        executor = ub.Executor(mode='process', max_workers=workers)
+        with executor:
+            jobs = [
+                executor.submit(_shard_confusions, temp.dpath,
+                                gx_bounds[i], true_bounds[i:i + 2],
+                                pred_bounds[i:i + 2], kw)
+                for i in range(n_shards)
+            ]
+            shards = []
+            for i, job in enumerate(jobs):
+                y = job.result()
+                y['gxs'] += gx_bounds[i]
+                y['txs'][y['txs'] > -1] += true_bounds[i]
+                y['pxs'][y['pxs'] > -1] += pred_bounds[i]
+                shards.append(y)
+    y = {key: np.hstack([shard[key] for shard in shards])
+         for key in shards[0].keys()}
+    return y
+
+
+def _shard_confusions(dpath, gx_offset, true_span, pred_span, kw):
+    """
+    Worker for `_sharded_detection_confusions`
+    """
+    columns = {}
+    for key, span in [('true_boxes', true_span), ('true_cxs', true_span),
+                      ('true_weights', true_span), ('true_gxs', true_span),
+                      ('pred_boxes', pred_span), ('pred_scores', pred_span),
+                      ('pred_cxs', pred_span), ('pred_gxs', pred_span)]:
+        data = np.load(join(dpath, key + '.npy'), mmap_mode='r')
+        columns[key] = np.array(data[span[0]:span[1]])
+    columns['true_gxs'] -= gx_offset
+    columns['pred_gxs'] -= gx_offset
+    return batch_detection_confusions(**dict(columns, **kw))
+
+
+def _gather_detections(dset, gids, key):
+    """
+    Concatenates the boxes (tlbr), class ids, and `key` attribute (e.g.
+    score or weight) of the annotations in each image, along with the index
+    of the image (in `gids`) each belongs to.
+    """
+    groups = [list(dset.gid_to_aids.get(gid, [])) for gid in gids]
+    aids = list(it.chain.from_iterable(groups))
+    gxs = np.repeat(np.arange(len(groups)), list(map(len, groups)))
+    annots = dset.annots(aids)
+    if aids:
+        boxes = annots.boxes.to_tlbr().data
+    else:
+        boxes = np.empty((0, 4))
+    cxs = np.array(annots.cids, dtype=np.int64)
+    values = np.array(annots._lookup(key), dtype=np.float64)
+    return boxes, cxs, values, gxs
+
+
+def _group_confusions(y, key):
+    """
+    Splits the columns of `y` into groups by the value of `key`, preserving
+    the order of rows in each group.
+
+    Example:
+        >>> y = {'cx': np.array([2, 1, 2]), 'score': np.array([.1, .2, .3])}
+        >>> groups = _group_confusions(y, 'cx')
+        >>> groups[2]['score'].tolist()
+        [0.1, 0.3]
+    """
+    keys = np.asarray(y[key])
+    sortx = np.argsort(keys, kind='mergesort')
+    unique_keys, starts = np.unique(keys[sortx], return_index=True)
+    stops = np.r_[starts[1:], len(keys)]
+    groups = {}
+    for k, start, stop in zip(unique_keys.tolist(), starts, stops):
+        idxs = sortx[start:stop]
+        groups[k] = {col: np.asarray(val)[idxs] for col, val in y.items()}
+    return groups
+
+
+def _summarize_confusions(y, method='voc2012'):
+    """
+    Computes the class agnostic and per class AP of confusion rows.
+    """
+    # class agnostic score
+    ap, prec, rec = pr_curves(y)
+    peritem = {
+        'ap': ap,
+        'pr': (prec, rec),
+    }
+
+    # perclass scores
+    perclass = {}
+    for cx, group in _group_confusions(y, 'cx').items():
+        ap, prec, rec = pr_curves(group, method=method)
+        perclass[cx] = {
+            'ap': ap,
+            'pr': (prec, rec),
+        }
+
+    mAP = np.nanmean([d['ap'] for d in perclass.values()])
+    nh_scores = {
+        'mAP': mAP,
+        'perclass': perclass,
+        'peritem': peritem
+    }
+    return nh_scores
+
+
+def _as_tlbr(boxes):
+    if isinstance(boxes, util.Boxes):
+        return boxes.to_tlbr().data
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+
 def _ave_precision(rec, prec, method='voc2012'):
     """ Compute AP from precision and recall
 
@@ -484,6 +1041,15 @@ def _ave_precision(rec, prec, method='voc2012'):
     ap = voc_ap(rec, prec, [use_07_metric])
     Compute VOC AP given precision and recall.
     If method == voc2007, uses the VOC 07 11 point method (default:False).
+    If method == coco, uses the 101 point interpolation of the COCO API.
+
+    Example:
+        >>> rec = np.array([.25, .5, .5, .75])
+        >>> prec = np.array([1., 1., .67, .75])
+        >>> print(_ave_precision(rec, prec, method='voc2012'))
+        0.6875
+        >>> print(round(_ave_precision(rec, prec, method='coco'), 4))
+        0.6906
     """
     if method == 'voc2007':
         # 11 point metric
@@ -510,6 +1076,14 @@ def _ave_precision(rec, prec, method='voc2012'):
 
         # and sum (\Delta recall) * prec
         ap = np.sum((mrec[i + 1] - mrec[i]) * mpre[i + 1])
+    elif method == 'coco':
+        # precision envelope sampled at 101 recall thresholds
+        rec = np.asarray(rec, dtype=np.float64)
+        mpre = np.maximum.accumulate(np.asarray(prec)[::-1])[::-1]
+        rec_thresholds = np.linspace(0, 1, 101)
+        idxs = np.searchsorted(rec, rec_thresholds, side='left')
+        valid = idxs < len(rec)
+        ap = mpre[idxs[valid]].sum() / len(rec_thresholds)
     else:
         raise KeyError(method)
 
@@ -588,13 +1162,30 @@ def score_detection_assignment(y, labels=None, method='voc2012'):
     return ave_precs
 
 
+def _argsort_descending(values):
+    """
+    Orders values from high to low exactly like the pandas
+    ``sort_values(ascending=False)`` call this replaced (nans go last), so
+    the scores of tied predictions are unchanged.
+
+    Example:
+        >>> _argsort_descending(np.array([.1, np.nan, .3, .2])).tolist()
+        [2, 3, 0, 1]
+    """
+    values = np.asarray(values)
+    isnan = np.isnan(values)
+    valid_idxs = np.where(~isnan)[0][::-1]
+    order = valid_idxs[values[valid_idxs].argsort(kind='quicksort')][::-1]
+    return np.hstack([order, np.where(isnan)[0]])
+
+
 def pr_curves(y, method='voc2012'):  # -> Tuple[float, ndarray, ndarray]:
     """ Compute a PR curve from a method
 
     Args:
-        y (pd.DataFrame): output of detection_confusions
+        y (pd.DataFrame | Dict[str, ndarray]): output of detection_confusions
     """
-    if method not in ['sklearn', 'voc2007', 'voc2012']:
+    if method not in ['sklearn', 'voc2007', 'voc2012', 'coco']:
         raise KeyError(method)
 
     # compute metrics on a per class basis
@@ -614,52 +1205,82 @@ def pr_curves(y, method='voc2012'):  # -> Tuple[float, ndarray, ndarray]:
     # eav_ap = _ave_precision(rec2, prec2, method=method)
     # print('eav_ap = {!r}'.format(eav_ap))
 
+    score = np.asarray(y['score'], dtype=np.float64)
+    true = np.asarray(y['true'])
+    pred = np.asarray(y['pred'])
+    weight = np.asarray(y['weight'], dtype=np.float64)
+
     if method == 'sklearn':
         # In the future, we should simply use the sklearn version
         # which gives nice easy to reproduce results.
         import sklearn.metrics
-        df = y
         ap = sklearn.metrics.average_precision_score(
-            y_true=(df['true'].values == df['pred'].values).astype(np.int),
-            y_score=df['score'].values,
-            sample_weight=df['weight'].values,
+            y_true=(true == pred).astype(np.int64),
+            y_score=score,
+            sample_weight=weight,
         )
         raise NotImplementedError('todo: return pr curves')
         return ap, [], []
-    elif method == 'voc2007' or method == 'voc2012':
-        y = y.sort_values('score', ascending=False)
+    elif method in ['voc2007', 'voc2012', 'coco']:
+        sortx = _argsort_descending(score)
+        true = true[sortx]
+        pred = pred[sortx]
         # if True:
         #     # ignore "difficult" matches
         #     y = y[y.weight > 0]
 
         # npos = sum(y.true >= 0)
-        npos = y[y.true >= 0].weight.sum()
-        dets = y[y.pred > -1]
-        if npos > 0 and len(dets) > 0:
-            tp = (dets.pred == dets.true).values.astype(np.int)
-            fp = 1 - tp
-            fp_cum = np.cumsum(fp)
-            tp_cum = np.cumsum(tp)
-
-            eps = np.finfo(np.float64).eps
-            rec = 1 if npos == 0 else tp_cum / npos
-            prec = tp_cum / np.maximum(tp_cum + fp_cum, eps)
-
-            ap = _ave_precision(rec, prec, method=method)
-        else:
-            prec, rec = None, None
-            if npos == 0:
-                ap = np.nan
-            if len(dets) == 0:
-                if npos == 0:
-                    ap = np.nan
-                ap = 0.0
+        npos = weight[sortx][true >= 0].sum()
+        is_det = pred > -1
+        tp = (pred[is_det] == true[is_det]).astype(np.int64)
+        fp = 1 - tp
+        ap, prec, rec = _pr_from_counts(tp, fp, npos, method=method)
     else:
         raise KeyError(method)
 
     return ap, prec, rec
 
 
+def _pr_from_counts(tp, fp, npos, method='voc2012'):
+    """
+    Computes a PR curve from the number of true and false positives at each
+    threshold (ordered from the highest to the lowest score) and the total
+    weight of the truth.
+    """
+    if npos > 0 and len(tp):
+        fp_cum = np.cumsum(fp)
+        tp_cum = np.cumsum(tp)
+
+        eps = np.finfo(np.float64).eps
+        rec = 1 if npos == 0 else tp_cum / npos
+        prec = tp_cum / np.maximum(tp_cum + fp_cum, eps)
+
+        ap = _ave_precision(rec, prec, method=method)
+    else:
+        prec, rec = None, None
+        if npos == 0:
+            ap = np.nan
+        if not len(tp):
+            ap = 0.0
+    return ap, prec, rec
+
+
+def _hist_pr_curves(hist, npos, method='voc2012'):
+    """
+    Approximate PR curve from a (2, nbins) histogram of true / false positive
+    counts, where each non-empty bin is a threshold.
+
+    Example:
+        >>> hist = np.array([[0, 1, 0, 2], [1, 0, 0, 0]])
+        >>> ap, prec, rec = _hist_pr_curves(hist, npos=4)
+        >>> prec.tolist(), rec.tolist()
+        ([1.0, 1.0, 0.75], [0.5, 0.75, 0.75])
+    """
+    hist = np.asarray(hist)[:, ::-1]
+    hist = hist[:, hist.sum(axis=0) > 0]
+    return _pr_from_counts(hist[0], hist[1], npos, method=method)
+
+
 def voc_eval(lines, recs, classname, ovthresh=0.5, method='voc2012', bias=1):
     import copy
     # imagenames = ([x.strip().split(' ')[0] for x in lines])
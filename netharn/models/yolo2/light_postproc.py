@@ -206,6 +206,34 @@ class GetBoundingBoxes(object):
             >>> assert len(boxes) == 16
             >>> assert all(len(b[0]) == 6 for b in boxes)
         """
+        detections, bxs = self._get_flat_boxes(output)
+        bsize = output.shape[0]
+        if len(detections) == 0:
+            return [torch.Tensor([]) for _ in range(bsize)]
+
+        # Group detections per image of batch (they are ordered by image)
+        det_per_batch = torch.bincount(bxs, minlength=bsize)
+        boxes = list(torch.split(detections, det_per_batch.tolist()))
+        return boxes
+
+    @profiler.profile
+    def _get_flat_boxes(self, output):
+        """
+        Returns the thresholded detections of all images in the batch
+        concatenated in a single [N, 6] tensor, along with the index of the
+        image each detection belongs to (in increasing order).
+
+        Example:
+            >>> import torch
+            >>> torch.random.manual_seed(0)
+            >>> anchors = np.array([(1.3221, 1.73145), (3.19275, 4.00944), (5.05587, 8.09892), (9.47112, 4.84053), (11.2364, 10.0071)])
+            >>> self = GetBoundingBoxes(anchors=anchors, num_classes=20, conf_thresh=.14, nms_thresh=0.5)
+            >>> output = torch.randn(4, 5, 5 + 20, 9, 9)
+            >>> detections, bxs = self._get_flat_boxes(output)
+            >>> boxes = self._get_boxes(output)
+            >>> assert torch.equal(torch.cat(boxes), detections)
+            >>> assert bxs.tolist() == sorted(bxs.tolist())
+        """
         # dont modify inplace
         output = output.clone()
 
@@ -245,13 +273,6 @@ class GetBoundingBoxes(object):
 
         # Newst lightnet code, which is based on my mode1 code
         score_thresh = cls_max > self.conf_thresh
-        score_thresh_flat = score_thresh.view(-1)
-
-        if score_thresh.sum() == 0:
-            boxes = []
-            for i in range(bsize):
-                boxes.append(torch.Tensor([]))
-            return boxes
 
         # Mask select boxes > conf_thresh
         coords = output_.transpose(2, 3)[..., 0:4]
@@ -260,20 +281,102 @@ class GetBoundingBoxes(object):
         idx = cls_max_idx[score_thresh]
         detections = torch.cat([coords, scores[:, None], idx[:, None].float()], dim=1)
 
-        # Get indexes of splits between images of batch
-        max_det_per_batch = len(self.anchors) * h * w
-        slices = [slice(max_det_per_batch * i, max_det_per_batch * (i + 1)) for i in range(bsize)]
-        det_per_batch = torch.IntTensor([score_thresh_flat[s].int().sum() for s in slices])
-        split_idx = torch.cumsum(det_per_batch, dim=0)
+        # The image each detection belongs to
+        bxs = torch.arange(bsize, device=output.device)[:, None, None]
+        bxs = bxs.expand_as(score_thresh)[score_thresh]
+        return detections, bxs
+
+    @profiler.profile
+    def batched(self, network_output, class_nms=True, topk=1000,
+                max_det=None):
+        """
+        Thresholds and applies NMS to all images in the batch at once.
+
+        Instead of splitting the detections by image, NMS is run a single
+        time over the whole batch where detections are only compared to each
+        other if they belong to the same group (image, or image and class if
+        `class_nms` is True).
 
-        # Group detections per image of batch
-        boxes = []
-        start = 0
-        for end in split_idx:
-            boxes.append(detections[start: end])
-            start = end
+        Args:
+            network_output (Tensor): Output tensor from the lightnet network
+            class_nms (bool): if True, boxes of different classes do not
+                suppress each other (as in nms_mode=0). Otherwise this is
+                equivalent to nms_mode=4.
+            topk (int, optional): only the `topk` highest scoring
+                detections in each image are considered for NMS. This bounds
+                the cost of NMS when a low `conf_thresh` lets through many
+                boxes. If None, all detections are considered.
+            max_det (int, optional): size of the padded output. Defaults to
+                the largest number of detections in an image.
+
+        Returns:
+            Tuple[Tensor, Tensor]:
+                dets: [B, maxDet, 6] tensor of **[x_center, y_center, width,
+                    height, confidence, class_id]** sorted by descending
+                    confidence in each image. Padding rows are zero with a
+                    class_id of -1.
+                counts: [B] number of (non-padding) detections per image
 
-        return boxes
+        Example:
+            >>> import torch
+            >>> torch.random.manual_seed(0)
+            >>> anchors = np.array([(1.3221, 1.73145), (3.19275, 4.00944), (5.05587, 8.09892), (9.47112, 4.84053), (11.2364, 10.0071)])
+            >>> self = GetBoundingBoxes(anchors=anchors, num_classes=20, conf_thresh=.14, nms_thresh=0.5)
+            >>> output = torch.randn(8, 5, 5 + 20, 9, 9)
+            >>> dets, counts = self.batched(output, class_nms=False)
+            >>> assert dets.shape == (8, int(counts.max()), 6)
+            >>> # Same detections as the per image postprocessing
+            >>> boxes = self(output, nms_mode=4)
+            >>> for bx, box in enumerate(boxes):
+            >>>     got = dets[bx, :counts[bx]]
+            >>>     want = box[box[:, 4].argsort(descending=True)]
+            >>>     assert torch.allclose(got, want)
+            >>> assert torch.all(dets[:, :, 5][dets[:, :, 4] == 0] == -1)
+            >>> # Top-k prefilter and fixed size output
+            >>> dets, counts = self.batched(output, topk=10, max_det=5)
+            >>> assert dets.shape == (8, 5, 6) and counts.max() <= 5
+        """
+        output = network_output.data
+        bsize = output.shape[0]
+        detections, bxs = self._get_flat_boxes(output)
+        scores = detections[:, 4]
+
+        # Order detections by image, then by descending score
+        order = scores.argsort(descending=True)
+        order = order[bxs[order].argsort(stable=True)]
+        detections = detections[order]
+        bxs = bxs[order]
+
+        if topk is not None:
+            ranks = _rank_within_groups(bxs, bsize)
+            keep = ranks < topk
+            detections = detections[keep]
+            bxs = bxs[keep]
+
+        if len(detections):
+            groups = bxs
+            if class_nms:
+                groups = bxs * self.num_classes + detections[:, 5].long()
+            a = detections[:, :2]
+            b = detections[:, 2:4]
+            # convert to tlbr
+            tlbr_tensor = torch.cat([a - b / 2, a + b / 2], 1)
+            keep = _grouped_nms(tlbr_tensor, detections[:, 4], groups,
+                                thresh=self.nms_thresh, bias=0)
+            detections = detections[keep]
+            bxs = bxs[keep]
+
+        counts = torch.bincount(bxs, minlength=bsize)
+        if max_det is None:
+            max_det = int(counts.max()) if len(counts) else 0
+        ranks = _rank_within_groups(bxs, bsize)
+        valid = ranks < max_det
+        counts = counts.clamp(max=max_det)
+
+        dets = detections.new_zeros((bsize, max_det, 6))
+        dets[..., 5] = -1
+        dets[bxs[valid], ranks[valid]] = detections[valid]
+        return dets, counts
 
     @profiler.profile
     def _nms(self, cxywh_score_cls, nms_mode=4):
@@ -392,6 +495,137 @@ class GetBoundingBoxes(object):
         return cxywh_score_cls[torch.LongTensor(keep)]
 
 
+def _grouped_nms(tlbr, scores, groups, thresh=.5, bias=0, blocksize=256):
+    """
+    Greedy NMS where boxes only suppress boxes of the same group.
+
+    Boxes are ordered by group and then by descending score, and visited in
+    blocks of `blocksize`. The conflicts inside a block are resolved on the
+    block's IoU matrix (by repeatedly applying "a box is kept if no kept box
+    before it conflicts with it" until nothing changes). The boxes kept in
+    the block then suppress the later unsuppressed boxes of their groups at
+    once, so suppressed boxes are never compared again and at most
+    `blocksize` times the size of the largest group overlaps exist at a time.
+
+    Args:
+        tlbr (Tensor): [N, 4] boxes
+        scores (Tensor): [N] scores
+        groups (LongTensor): [N] group id of each box
+        thresh (float): boxes with an overlap larger than this conflict
+        blocksize (int): number of boxes resolved at once
+
+    Returns:
+        Tensor: boolean keep mask aligned with the input boxes
+
+    Example:
+        >>> tlbr = torch.FloatTensor([[0, 0, 10, 10], [1, 0, 11, 10],
+        >>>                           [2, 0, 12, 10], [0, 0, 10, 10]])
+        >>> scores = torch.FloatTensor([.9, .8, .7, .6])
+        >>> # box 1 is suppressed by 0 so it can not suppress box 2
+        >>> _grouped_nms(tlbr, scores, torch.LongTensor([0, 0, 0, 1]),
+        >>>              thresh=.75).tolist()
+        [True, False, True, True]
+
+    Example:
+        >>> # Blocks give the same result as the per group greedy NMS
+        >>> from netharn import util
+        >>> rng = np.random.RandomState(0)
+        >>> tlbr = util.Boxes.random(300, scale=100., rng=rng, format='tlbr',
+        >>>                          tensor=True).data.float()
+        >>> scores = torch.rand(300)
+        >>> groups = torch.LongTensor(rng.randint(0, 3, 300))
+        >>> keep = _grouped_nms(tlbr, scores, groups, thresh=.3, blocksize=16)
+        >>> for gid in range(3):
+        >>>     idxs = np.where(groups.numpy() == gid)[0]
+        >>>     want = util.non_max_supression(
+        >>>         tlbr.numpy()[idxs], scores.numpy()[idxs], .3, impl='py')
+        >>>     assert sorted(idxs[want]) == np.where(keep.numpy())[0][
+        >>>         groups.numpy()[keep.numpy()] == gid].tolist()
+    """
+    n = len(scores)
+    device = scores.device
+    if n == 0:
+        return torch.zeros(0, dtype=torch.bool, device=device)
+
+    # Order boxes by group, then by descending score
+    order = scores.argsort(descending=True)
+    order = order[groups[order].argsort(stable=True)]
+    boxes = tlbr[order]
+    ordered_groups = groups[order]
+    _, group_codes = torch.unique(ordered_groups, return_inverse=True)
+    # The (exclusive) end position of the group of each ordered box
+    group_ends = torch.cumsum(torch.bincount(group_codes), dim=0)[group_codes]
+    group_ends = group_ends.tolist()
+
+    suppressed = torch.zeros(n, dtype=torch.bool, device=device)
+    for start in range(0, n, blocksize):
+        stop = min(start + blocksize, n)
+        # The block boxes that earlier blocks did not suppress
+        block = start + torch.nonzero(~suppressed[start:stop])[:, 0]
+        if len(block) == 0:
+            continue
+
+        block_groups = ordered_groups[block]
+        conflict = _pairwise_ious(boxes[block], boxes[block], bias) > thresh
+        conflict = conflict.triu(1)
+        conflict &= block_groups[:, None] == block_groups[None, :]
+
+        # A box is kept if no kept box before it conflicts with it. Applying
+        # this to the whole block converges to the greedy solution.
+        block_keep = torch.ones(len(block), dtype=torch.bool, device=device)
+        for _ in range(len(block)):
+            new_keep = ~(conflict & block_keep[:, None]).any(dim=0)
+            if torch.equal(new_keep, block_keep):
+                break
+            block_keep = new_keep
+        suppressed[block[~block_keep]] = True
+
+        # Suppress the later boxes (in the groups of this block) that
+        # conflict with a kept box
+        kept = block[block_keep]
+        rest_stop = group_ends[stop - 1]
+        rest = stop + torch.nonzero(~suppressed[stop:rest_stop])[:, 0]
+        if len(rest) == 0:
+            continue
+        conflict = _pairwise_ious(boxes[kept], boxes[rest], bias) > thresh
+        conflict &= ordered_groups[kept][:, None] == ordered_groups[rest]
+        suppressed[rest[conflict.any(dim=0)]] = True
+
+    # Unsort, so keep is aligned with input boxes
+    keep = torch.empty_like(suppressed)
+    keep[order] = ~suppressed
+    return keep
+
+
+def _pairwise_ious(b1, b2, bias=0):
+    """
+    IoU matrix between two sets of tlbr boxes
+    """
+    w1 = b1[:, 2] - b1[:, 0] + bias
+    h1 = b1[:, 3] - b1[:, 1] + bias
+    w2 = b2[:, 2] - b2[:, 0] + bias
+    h2 = b2[:, 3] - b2[:, 1] + bias
+    iws = (torch.min(b1[:, None, 2], b2[None, :, 2]) -
+           torch.max(b1[:, None, 0], b2[None, :, 0]) + bias).clamp(min=0)
+    ihs = (torch.min(b1[:, None, 3], b2[None, :, 3]) -
+           torch.max(b1[:, None, 1], b2[None, :, 1]) + bias).clamp(min=0)
+    inter = iws * ihs
+    return inter / ((w1 * h1)[:, None] + (w2 * h2)[None, :] - inter)
+
+
+def _rank_within_groups(group_ids, num_groups):
+    """
+    Position of each item within its group, where `group_ids` is sorted.
+
+    Example:
+        >>> _rank_within_groups(torch.LongTensor([0, 0, 2, 2, 2]), 3).tolist()
+        [0, 1, 0, 1, 2]
+    """
+    counts = torch.bincount(group_ids, minlength=num_groups)
+    starts = torch.cumsum(counts, dim=0) - counts
+    return torch.arange(len(group_ids), device=group_ids.device) - starts[group_ids]
+
+
 def benchmark_nms_version():
     """
         xdoctset netharn.models.yolo2.light_postproc benchmark_nms_version
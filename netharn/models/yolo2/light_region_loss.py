@@ -401,8 +401,8 @@ class RegionLoss(BaseLossWithCudaState):
             coord_mask = coord_mask.expand_as(tcoord)
             return coord_mask, conf_mask, cls_mask, tcoord, tconf, tcls
 
-        # Put this back into a non-flat view
-        pred_cxywh = pred_cxywh.view(nB, nA, nH, nW, 4)
+        # Put this back into a per batch item view
+        pred_cxywh = pred_cxywh.view(nB, nA * nPixels, 4)
         pred_boxes = util.Boxes(pred_cxywh, 'cxywh')
 
         gt_class = target[..., 0].data
@@ -415,9 +415,13 @@ class RegionLoss(BaseLossWithCudaState):
         rel_gt_boxes = gt_boxes.copy()
         rel_gt_boxes.data[..., 0:2] = 0
 
-        # true boxes with a class of -1 are fillers, ignore them
+        # true boxes with a class of -1 are fillers, ignore them. Like
+        # darknet, only the first `nT` boxes of each item are used.
+        nT_max = target.shape[1]
         gt_isvalid = (gt_class >= 0)
-        batch_nT = gt_isvalid.sum(dim=1).cpu().numpy()
+        batch_nT = gt_isvalid.sum(dim=1)
+        gt_used = (torch.arange(nT_max, device=batch_nT.device)[None, :] <
+                   batch_nT[:, None])
 
         # Compute the grid cell for each groundtruth box
         true_xs = gt_boxes.data[..., 0]
@@ -441,92 +445,70 @@ class RegionLoss(BaseLossWithCudaState):
         # Pre threshold classification weights
         gt_cls_weights = (gt_weights > .5)
 
-        # Loop over ground_truths and construct tensors
-        for bx in range(nB):
-            # Get the actual groundtruth boxes for this batch item
-            nT = batch_nT[bx]
-            if nT == 0:
-                continue
-
-            # Batch ground truth
-            cur_rel_gt_boxes = rel_gt_boxes[bx, 0:nT]
-            cur_gt_boxes = gt_boxes[bx, 0:nT]
-            cur_gt_cls = target[bx, 0:nT, 0]
-            # scalars, one for each true object
-            cur_true_is = true_is[bx, 0:nT]
-            cur_true_js = true_js[bx, 0:nT]
-            cur_true_coord_weights = gt_coord_weights[bx, 0:nT]
-            cur_true_conf_weights = gt_conf_weights[bx, 0:nT]
-            cur_true_cls_weights = gt_cls_weights[bx, 0:nT]
-
-            cur_gx, cur_gy, cur_gw, cur_gh = cur_gt_boxes.data.t()
-
-            # Batch predictions
-            cur_pred_boxes = pred_boxes[bx]
-
-            # NOTE: IOU computation is the bottleneck in this function
-
-            # Assign groundtruth boxes to anchor boxes
-            cur_anchor_gt_ious = self.rel_anchors_boxes.ious(
-                cur_rel_gt_boxes, bias=0)
-            _, cur_true_anchor_axs = cur_anchor_gt_ious.max(dim=0)  # best_ns in YOLO
-
-            # Get the anchor (w,h) assigned to each true object
-            cur_true_anchor_w, cur_true_anchor_h = self.anchors[cur_true_anchor_axs].t()
-
-            # Find the IOU of each predicted box with the groundtruth
-            cur_pred_true_ious = cur_pred_boxes.ious(cur_gt_boxes, bias=0)
-            # Assign groundtruth boxes to predicted boxes
-            cur_ious, _ = cur_pred_true_ious.max(dim=-1)
-
-            # Set loss to zero for any predicted boxes that had a high iou with
-            # a groundtruth target (we wont punish them for not being
-            # background), One of these will be selected as the best and be
-            # punished for not predicting the groundtruth value.
-            conf_mask[bx].view(-1)[cur_ious.view(-1) > self.thresh] = 0
-
-            ####
-            # Broadcast the loop over true boxes
-            ####
-            # Convert the true box coordinates to be comparable with pred output
-            # * translate each gtbox to be relative to its assignd gridcell
-            # * make w/h relative to anchor box w / h and convert to logspace
-            cur_tcoord_x = cur_gx - cur_true_is.float()
-            cur_tcoord_y = cur_gy - cur_true_js.float()
-            cur_tcoord_w = (cur_gw / cur_true_anchor_w).log()
-            cur_tcoord_h = (cur_gh / cur_true_anchor_h).log()
-
-            iou_raveled_idxs = np.ravel_multi_index([
-                cur_true_anchor_axs, cur_true_js, cur_true_is, np.arange(nT)
-            ], cur_pred_true_ious.shape)
-            # Get the ious with the assigned boxes for each truth
-            cur_true_ious = cur_pred_true_ious.view(-1)[iou_raveled_idxs]
-
-            raveled_idxs = np.ravel_multi_index([
-                [bx], cur_true_anchor_axs, [0], cur_true_js, cur_true_is
-            ], coord_mask.shape)
-
-            # --------------------------------------------
-            raveled_idxs_b0 = np.ravel_multi_index([
-                [bx], cur_true_anchor_axs, [0], cur_true_js, cur_true_is
-            ], tcoord.shape)
-            # A bit faster than ravel_multi_indexes with [1], [2], and [3]
-            raveled_idxs_b1 = raveled_idxs_b0 + nPixels
-            raveled_idxs_b2 = raveled_idxs_b0 + nPixels * 2
-            raveled_idxs_b3 = raveled_idxs_b0 + nPixels * 3
-            # --------------------------------------------
-
-            coord_mask.view(-1)[raveled_idxs] = cur_true_coord_weights
-            cls_mask.view(-1)[raveled_idxs]   = cur_true_cls_weights
-            conf_mask.view(-1)[raveled_idxs]  = cur_true_conf_weights
-
-            tcoord.view(-1)[raveled_idxs_b0] = cur_tcoord_x
-            tcoord.view(-1)[raveled_idxs_b1] = cur_tcoord_y
-            tcoord.view(-1)[raveled_idxs_b2] = cur_tcoord_w
-            tcoord.view(-1)[raveled_idxs_b3] = cur_tcoord_h
-
-            tcls.view(-1)[raveled_idxs]  = cur_gt_cls
-            tconf.view(-1)[raveled_idxs] = cur_true_ious
+        # The groundtruth of all batch items is handled at once. Every
+        # [B, T] array below is indexed by (batch item, true box).
+
+        # Assign groundtruth boxes to anchor boxes
+        anchor_gt_ious = self.rel_anchors_boxes.ious(
+            util.Boxes(rel_gt_boxes.data.view(-1, 4), 'cxywh'), bias=0)
+        _, true_anchor_axs = anchor_gt_ious.max(dim=0)  # best_ns in YOLO
+        true_anchor_axs = true_anchor_axs.view(nB, nT_max)
+
+        # Get the anchor (w,h) assigned to each true object
+        true_anchor_w = self.anchors[:, 0][true_anchor_axs]
+        true_anchor_h = self.anchors[:, 1][true_anchor_axs]
+
+        # Find the IOU of each predicted box with the groundtruth of its item
+        # NOTE: IOU computation is the bottleneck in this function
+        pred_true_ious = pred_boxes.ious(
+            util.Boxes(gt_boxes.data.view(nB, 1, nT_max, 4), 'cxywh'), bias=0)
+        # Assign groundtruth boxes to predicted boxes
+        masked_ious = pred_true_ious.masked_fill(~gt_used[:, None, :],
+                                                 float('-inf'))
+        best_ious, _ = masked_ious.max(dim=-1)
+
+        # Set loss to zero for any predicted boxes that had a high iou with
+        # a groundtruth target (we wont punish them for not being
+        # background), One of these will be selected as the best and be
+        # punished for not predicting the groundtruth value.
+        conf_mask.view(nB, -1).masked_fill_(best_ious > self.thresh, 0)
+
+        # Convert the true box coordinates to be comparable with pred output
+        # * translate each gtbox to be relative to its assignd gridcell
+        # * make w/h relative to anchor box w / h and convert to logspace
+        gx, gy, gw, gh = [gt_boxes.data[..., k] for k in range(4)]
+        tcoord_x = gx - true_is.float()
+        tcoord_y = gy - true_js.float()
+        tcoord_w = (gw / true_anchor_w).log()
+        tcoord_h = (gh / true_anchor_h).log()
+
+        # Get the ious with the assigned boxes for each truth
+        pred_idxs = (true_anchor_axs * nH + true_js) * nW + true_is
+        true_ious = pred_true_ious.gather(1, pred_idxs[:, None, :])[:, 0, :]
+
+        # Flat index of the (item, anchor, 0, j, i) target cell of each truth
+        bxs = torch.arange(nB, device=pred_idxs.device)[:, None]
+        raveled_idxs = bxs * (nA * nPixels) + pred_idxs
+        raveled_idxs_b0 = ((bxs * nA + true_anchor_axs) * 4 * nPixels +
+                           true_js * nW + true_is)
+        # A bit faster than ravel_multi_indexes with [1], [2], and [3]
+        raveled_idxs_b1 = raveled_idxs_b0 + nPixels
+        raveled_idxs_b2 = raveled_idxs_b0 + nPixels * 2
+        raveled_idxs_b3 = raveled_idxs_b0 + nPixels * 3
+
+        coord_mask = _masked_put(coord_mask, raveled_idxs, gt_coord_weights,
+                                 gt_used)
+        cls_mask = _masked_put(cls_mask, raveled_idxs, gt_cls_weights, gt_used)
+        conf_mask = _masked_put(conf_mask, raveled_idxs, gt_conf_weights,
+                                gt_used)
+        tcoord = _masked_put(
+            tcoord,
+            torch.stack([raveled_idxs_b0, raveled_idxs_b1,
+                         raveled_idxs_b2, raveled_idxs_b3]),
+            torch.stack([tcoord_x, tcoord_y, tcoord_w, tcoord_h]),
+            gt_used[None, :, :].expand(4, nB, nT_max))
+        tcls = _masked_put(tcls, raveled_idxs, target[..., 0], gt_used)
+        tconf = _masked_put(tconf, raveled_idxs, true_ious, gt_used)
 
         # because coord and conf masks are witin this MSE we need to sqrt them
         coord_mask = coord_mask.sqrt()
@@ -535,6 +517,45 @@ class RegionLoss(BaseLossWithCudaState):
         return coord_mask, conf_mask, cls_mask, tcoord, tconf, tcls
 
 
+def _masked_put(dst, idxs, values, mask):
+    """
+    Returns a copy of `dst` with `dst.view(-1)[idxs[mask]] = values[mask]`
+    without synchronizing with the device. Entries that are not in `mask`
+    are redirected to an extra element that is dropped.
+
+    When several entries have the same index the last one (in the order of
+    `idxs.view(-1)`) is written, like assigning them one at a time. A plain
+    indexed assignment does not define which duplicate wins.
+
+    Example:
+        >>> dst = torch.zeros(2, 3)
+        >>> idxs = torch.LongTensor([[1, 4], [4, 0]])
+        >>> values = torch.FloatTensor([[1, 2], [3, 4]])
+        >>> mask = torch.ByteTensor([[1, 0], [1, 1]]).bool()
+        >>> _masked_put(dst, idxs, values, mask).tolist()
+        [[4.0, 1.0, 0.0], [0.0, 3.0, 0.0]]
+        >>> # The last of the duplicate indices wins
+        >>> idxs = torch.LongTensor([[2, 5, 2], [5, 2, 0]])
+        >>> values = torch.FloatTensor([[1, 2, 3], [4, 5, 6]])
+        >>> mask = torch.ByteTensor([[1, 1, 1], [1, 0, 1]]).bool()
+        >>> _masked_put(dst, idxs, values, mask).tolist()
+        [[6.0, 0.0, 3.0], [0.0, 0.0, 4.0]]
+    """
+    if idxs.numel() == 0:
+        return dst.clone()
+    n = dst.numel()
+    discard = torch.full_like(idxs, n)
+    idxs = torch.where(mask, idxs, discard).view(-1)
+    # The position of the last entry written to each element (-1 if none)
+    order = torch.arange(len(idxs), device=idxs.device)
+    last = torch.full((n + 1,), -1, dtype=order.dtype, device=idxs.device)
+    last = last.scatter_reduce(0, idxs, order, reduce='amax')[:-1]
+    values = values.contiguous().view(-1).to(dst.dtype)
+    new = values[last.clamp(min=0)]
+    flat = torch.where(last >= 0, new, dst.reshape(-1))
+    return flat.view_as(dst)
+
+
 if __name__ == '__main__':
     """
     CommandLine:
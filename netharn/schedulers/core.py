@@ -177,6 +177,16 @@ class YOLOScheduler(NetharnScheduler):
         if optimizer:
             self._update_optimizer()
 
+    def state_dict(self):
+        state = super(YOLOScheduler, self).state_dict()
+        # A plain dict can be loaded from a snapshot with weights_only=True
+        state['epoch_to_n_items_seen'] = dict(self.epoch_to_n_items_seen)
+        return state
+
+    def load_state_dict(self, state_dict):
+        super(YOLOScheduler, self).load_state_dict(state_dict)
+        self.epoch_to_n_items_seen = defaultdict(int, self.epoch_to_n_items_seen)
+
     @property
     def n_batches_seen(self):
         return self.n_items_seen / self.batch_size
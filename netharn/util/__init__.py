@@ -37,11 +37,14 @@ else:
     from netharn.util import util_json
     from netharn.util import util_misc
     from netharn.util import util_numpy
+    from netharn.util import util_prefetch
     from netharn.util import util_random
     from netharn.util import util_resources
     from netharn.util import util_slider
+    from netharn.util import util_snapshot
     from netharn.util import util_subextreme
     from netharn.util import util_tensorboard
+    from netharn.util import util_timer
     from netharn.util import util_torch
     from netharn.util import util_zip
 
@@ -94,23 +97,36 @@ else:
                                           group_items,)
     from netharn.util.util_idstr import (compact_idstr, make_idstr,
                                          make_short_idstr,)
-    from netharn.util.util_io import (read_arr, read_h5arr, write_arr,
-                                      write_h5arr,)
+    from netharn.util.util_io import (atomic_save, link_or_copy, read_arr,
+                                      read_h5arr, write_arr, write_h5arr,)
     from netharn.util.util_iter import (roundrobin,)
     from netharn.util.util_json import (LossyJSONEncoder, NumpyEncoder, read_json,
                                         walk_json, write_json,)
     from netharn.util.util_misc import (SupressPrint,)
     from netharn.util.util_numpy import (atleast_nd, isect_flags,
                                          iter_reduce_ufunc,)
-    from netharn.util.util_random import (ensure_rng, random_combinations,
-                                          random_product, seed_global, shuffle,)
+    from netharn.util.util_prefetch import (PrefetchIterator,)
+    from netharn.util.util_random import (ensure_rng, get_global_rng_state,
+                                          random_combinations, random_product,
+                                          seed_global, set_global_rng_state,
+                                          shuffle,)
     from netharn.util.util_resources import (ensure_ulimit,)
-    from netharn.util.util_slider import (SlidingIndexDataset, SlidingSlices,
-                                          SlidingWindow, Stitcher,)
+    from netharn.util.util_slider import (SlidingIndexDataset,
+                                          SlidingPredictor, SlidingSlices,
+                                          SlidingWindow, Stitcher,
+                                          gaussian_patch_weights,)
+    from netharn.util.util_snapshot import (is_manifest, load_deduplicated,
+                                            manifest_hashes,
+                                            remove_unreferenced_tensors,
+                                            resolve_manifest,
+                                            save_deduplicated,)
     from netharn.util.util_subextreme import (argsubmax, argsubmaxima,)
     from netharn.util.util_tensorboard import (read_tensorboard_scalars,)
+    from netharn.util.util_timer import (PhaseTimer,)
     from netharn.util.util_torch import (DisableBatchNorm, ModuleMixin,
-                                         grad_context, number_of_parameters,
+                                         autocast_context, cpu_state_copy,
+                                         grad_context,
+                                         number_of_parameters,
                                          one_hot_embedding, one_hot_lookup,
                                          trainable_layers,)
     from netharn.util.util_zip import (split_archive, zopen,)
@@ -120,44 +136,53 @@ else:
                'DisableBatchNorm', 'ExpMovingAve', 'IS_PROFILING',
                'InternalRunningStats', 'KernprofParser', 'LocLight',
                'LossyJSONEncoder', 'ModuleMixin', 'MovingAve', 'NumpyEncoder',
-               'PlotNums', 'RunningStats', 'SlidingIndexDataset', 'SlidingSlices',
+               'PhaseTimer', 'PlotNums', 'PrefetchIterator', 'RunningStats',
+               'SlidingIndexDataset', 'SlidingPredictor', 'SlidingSlices',
                'SlidingWindow', 'Stitcher', 'SupressPrint', 'WindowedMovingAve',
                'absdev', 'adjust_gamma', 'adjust_subplots', 'aggensure',
                'align_paths', 'apply_grouping', 'argsubmax', 'argsubmaxima',
-               'atleast_3channels', 'atleast_nd', 'autompl', 'axes_extent',
-               'box_ious', 'check_aligned', 'colorbar', 'colorbar_image',
-               'compact_idstr', 'convert_colorspace', 'copy_figure_to_clipboard',
-               'dict_intersection', 'distinct_colors', 'distinct_markers',
-               'draw_border', 'draw_boxes', 'draw_boxes_on_image',
-               'draw_line_segments', 'draw_text_on_image',
-               'dump_global_profile_report', 'dumpsafe', 'dynamic_profile',
-               'ensure_alpha_channel', 'ensure_float01', 'ensure_fnum',
-               'ensure_grayscale', 'ensure_rng', 'ensure_ulimit',
+               'atleast_3channels', 'atleast_nd', 'atomic_save',
+               'autocast_context', 'autompl', 'axes_extent', 'box_ious',
+               'check_aligned', 'colorbar', 'colorbar_image', 'compact_idstr',
+               'convert_colorspace', 'copy_figure_to_clipboard',
+               'cpu_state_copy', 'dict_intersection', 'distinct_colors',
+               'distinct_markers', 'draw_border', 'draw_boxes',
+               'draw_boxes_on_image', 'draw_line_segments',
+               'draw_text_on_image', 'dump_global_profile_report', 'dumpsafe',
+               'dynamic_profile', 'ensure_alpha_channel', 'ensure_float01',
+               'ensure_fnum', 'ensure_grayscale', 'ensure_rng', 'ensure_ulimit',
                'extract_axes_extents', 'figure', 'find_parent_class',
                'find_pattern_above_row', 'find_pyclass_above_row',
+               'gaussian_patch_weights', 'get_global_rng_state',
                'get_num_channels', 'grab_test_image', 'grab_test_image_fpath',
                'grad_context', 'group_consecutive', 'group_consecutive_indices',
-               'group_indices', 'group_items', 'image_slices', 'imread', 'imscale',
-               'imshow', 'imutil', 'imwrite', 'interpolated_colormap',
-               'isect_flags', 'iter_reduce_ufunc', 'legend', 'load_image_paths',
+               'group_indices', 'group_items', 'image_slices', 'imread',
+               'imscale', 'imshow', 'imutil', 'imwrite',
+               'interpolated_colormap', 'is_manifest', 'isect_flags',
+               'iter_reduce_ufunc', 'legend', 'link_or_copy',
+               'load_deduplicated', 'load_image_paths',
                'make_channels_comparable', 'make_heatmask', 'make_idstr',
-               'make_legend_img', 'make_short_idstr', 'mplutil', 'multi_plot',
-               'next_fnum', 'nms', 'non_max_supression', 'number_of_parameters',
+               'make_legend_img', 'make_short_idstr', 'manifest_hashes',
+               'mplutil', 'multi_plot', 'next_fnum', 'nms',
+               'non_max_supression', 'number_of_parameters',
                'one_hot_embedding', 'one_hot_lookup', 'overlay_alpha_images',
                'overlay_colorized', 'pandas_plot_matrix', 'profile',
                'profile_onthefly', 'profiler', 'putMultiLineText', 'qtensure',
-               'random_combinations', 'random_product', 'read_arr', 'read_h5arr',
-               'read_json', 'read_tensorboard_scalars', 'render_figure_to_image',
-               'reverse_colormap', 'roundrobin', 'run_length_encoding',
-               'save_parts', 'savefig2', 'scores_to_cmap', 'scores_to_color',
-               'seed_global', 'set_figtitle', 'set_mpl_backend',
+               'random_combinations', 'random_product', 'read_arr',
+               'read_h5arr', 'read_json', 'read_tensorboard_scalars',
+               'remove_unreferenced_tensors', 'render_figure_to_image',
+               'resolve_manifest', 'reverse_colormap', 'roundrobin',
+               'run_length_encoding', 'save_deduplicated', 'save_parts',
+               'savefig2', 'scores_to_cmap', 'scores_to_color', 'seed_global',
+               'set_figtitle', 'set_global_rng_state', 'set_mpl_backend',
                'shortest_unique_prefixes', 'shortest_unique_suffixes',
                'show_if_requested', 'shuffle', 'split_archive', 'stack_images',
                'stats_dict', 'trainable_layers', 'util_averages', 'util_boxes',
                'util_cachestamp', 'util_cv2', 'util_dataframe', 'util_demodata',
-               'util_fname', 'util_groups', 'util_idstr', 'util_io', 'util_iter',
-               'util_json', 'util_misc', 'util_numpy', 'util_random',
-               'util_resources', 'util_slider', 'util_subextreme',
-               'util_tensorboard', 'util_torch', 'util_zip', 'walk_json',
+               'util_fname', 'util_groups', 'util_idstr', 'util_io',
+               'util_iter', 'util_json', 'util_misc', 'util_numpy',
+               'util_prefetch', 'util_random', 'util_resources', 'util_slider',
+               'util_snapshot', 'util_subextreme', 'util_tensorboard',
+               'util_timer', 'util_torch', 'util_zip', 'walk_json',
                'wide_strides_1d', 'write_arr', 'write_h5arr', 'write_json',
                'zopen']
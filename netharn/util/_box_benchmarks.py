@@ -209,3 +209,97 @@ def box_ious_py2(boxes1, boxes2, bias=1):
     ious = np.zeros((N, K), dtype=np.float32)
     ious[ns, ks] = expanded_ious
     return ious
+
+
+def benchmark_nms_impls(nums=[100, 1000, 5000, 20000], thresh=0.5,
+                        impls=None, layout='sparse', verbose=1):
+    """
+    Compares the speed of the NMS implementations as the number of boxes
+    grows and checks that the hard NMS implementations agree.
+
+    Args:
+        layout (str): either sparse, where small boxes are spread over an
+            image that grows with the number of boxes (so each box overlaps
+            a handful of others), or dense, where all boxes are jittered
+            around a few object locations (so most boxes overlap each other
+            and are suppressed).
+
+    Returns:
+        Dict[str, List[float]]: best time (in seconds) of each implementation
+            for each number of boxes
+
+    CommandLine:
+        python -m netharn.util._box_benchmarks benchmark_nms_impls
+
+    Example:
+        >>> ydata = benchmark_nms_impls(nums=[50], impls=['py', 'sweep', 'soft'], verbose=0)
+        >>> assert set(ydata) == {'py', 'sweep', 'soft'}
+        >>> ydata = benchmark_nms_impls(nums=[300], impls=['py', 'sweep', 'numpy'],
+        >>>                             layout='dense', verbose=0)
+
+    Benchmark:
+        >>> import netharn as nh
+        >>> nh.util.mplutil.qtensure()
+        >>> for fnum, layout in enumerate(['sparse', 'dense'], start=1):
+        >>>     ydata = benchmark_nms_impls(layout=layout)
+        >>>     nh.util.mplutil.multi_plot([100, 1000, 5000, 20000], ydata,
+        >>>                                xlabel='num boxes', ylabel='seconds',
+        >>>                                title=layout, fnum=fnum)
+    """
+    from netharn.util.nms import nms_core
+    from netharn import util
+    if impls is None:
+        impls = nms_core.available_nms_impls()
+
+    ydata = ub.ddict(list)
+    for num in nums:
+        rng = np.random.RandomState(0)
+        if layout == 'sparse':
+            # Small boxes spread over an image that grows with the number of
+            # boxes, so each box overlaps a handful of others.
+            scale = 20.0 * np.sqrt(num)
+            cxywh = np.hstack([rng.rand(num, 2) * scale,
+                               rng.uniform(10, 40, size=(num, 2))])
+        elif layout == 'dense':
+            # Many detections of a few objects, like the raw output of a
+            # detector with a low score threshold.
+            centers = rng.rand(5, 2) * 500
+            cxywh = np.hstack([
+                centers[rng.randint(0, len(centers), num)] +
+                rng.randn(num, 2) * 5,
+                rng.uniform(40, 60, size=(num, 2))])
+        else:
+            raise KeyError(layout)
+        tlbr = util.Boxes(cxywh, 'cxywh').to_tlbr().data.astype(np.float32)
+        scores = rng.rand(num).astype(np.float32)
+
+        solutions = {}
+        for impl in impls:
+            quadratic = impl == 'torch' or (impl == 'py' and
+                                            layout == 'sparse')
+            if quadratic and num > 5000:
+                # the quadratic versions are too slow (or use too much
+                # memory) to wait for
+                ydata[impl].append(np.nan)
+                continue
+            ti = ub.Timerit(3, bestof=1, label='{}-{}'.format(impl, num),
+                            verbose=verbose)
+            for timer in ti:
+                with timer:
+                    keep = nms_core.non_max_supression(
+                        tlbr, scores, thresh, bias=0, impl=impl)
+            ydata[impl].append(ti.min())
+            if impl != 'soft':
+                solutions[impl] = sorted(np.asarray(keep).tolist())
+        assert ub.allsame(solutions.values()), (
+            'hard NMS implementations disagree')
+    return ydata
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python -m netharn.util._box_benchmarks all
+    """
+    import xdoctest
+    xdoctest.doctest_module(__file__)
@@ -2,6 +2,8 @@ import torch
 import numpy as np
 import ubelt as ub
 from netharn.util.nms import py_nms
+from netharn.util.nms import sweep_nms
+from netharn.util.nms import numpy_nms
 from netharn.util import profiler
 from netharn.util.nms import torch_nms
 import warnings
@@ -9,7 +11,9 @@ import warnings
 _impls = {}
 _impls['py'] = py_nms.py_nms
 _impls['torch'] = torch_nms.torch_nms
-_automode = 'py'
+_impls['sweep'] = sweep_nms.sweep_nms
+_impls['numpy'] = numpy_nms.numpy_nms
+_automode = 'numpy'
 try:
     from netharn.util.nms import cpu_nms
     _impls['cpu'] = cpu_nms.cpu_nms
@@ -26,12 +30,17 @@ except Exception:
 
 
 def available_nms_impls():
+    """
+    The hard NMS implementations. Soft-NMS (`impl='soft'`) is always
+    available, but it is not listed because it keeps different boxes.
+    """
     return list(_impls.keys())
 
 
 @profiler.profile
 def non_max_supression(tlbr, scores, thresh, bias=0.0, classes=None,
-                       impl='auto'):
+                       impl='auto', soft_method='linear', sigma=0.5,
+                       min_score=1e-3, return_scores=False):
     """
     Non-Maximum Suppression
 
@@ -43,8 +52,25 @@ def non_max_supression(tlbr, scores, thresh, bias=0.0, classes=None,
            (hint: choosing 1 is wrong computer vision community)
         classes (ndarray or None): integer classes. If specified NMS is done
             on a perclass basis.
-        impl (str): implementation can be auto, python, cpu, or gpu
-
+        impl (str): implementation can be auto, py, numpy, torch, sweep,
+            soft, cpu, or gpu. The numpy implementation keeps the same boxes
+            as cpu and is used by auto when cpu is not compiled. The numpy
+            and sweep implementations only compare nearby boxes, which is
+            much faster for large numbers of boxes. The soft
+            implementation is soft-NMS (see `sweep_nms.soft_nms`), it
+            returns the boxes whose decayed score is at least `min_score` in
+            order of their decayed score (also when classes are given).
+        soft_method (str): decay used by soft-NMS, linear or gaussian
+        sigma (float): parameter of the gaussian soft-NMS decay
+        min_score (float): soft-NMS removes boxes whose score decays below
+            this
+        return_scores (bool): if True, also return the scores of the kept
+            boxes. For soft-NMS these are the decayed scores, which should
+            be used to rank the boxes.
+
+    Returns:
+        List[int] | Tuple[List[int], ndarray]: the indices of the kept boxes
+            (and their scores if `return_scores` is True)
 
     CommandLine:
         python ~/code/netharn/netharn/util/nms/nms_core.py nms
@@ -54,7 +80,7 @@ def non_max_supression(tlbr, scores, thresh, bias=0.0, classes=None,
     References:
         https://github.com/facebookresearch/Detectron/blob/master/detectron/utils/cython_nms.pyx
         https://www.pyimagesearch.com/2015/02/16/faster-non-maximum-suppression-python/
-        https://github.com/bharatsingh430/soft-nms/blob/master/lib/nms/cpu_nms.pyx <- TODO
+        https://github.com/bharatsingh430/soft-nms/blob/master/lib/nms/cpu_nms.pyx
 
     Example:
         >>> dets = np.array([
@@ -75,6 +101,8 @@ def non_max_supression(tlbr, scores, thresh, bias=0.0, classes=None,
         >>> if 'cpu' in available_nms_impls():
         >>>     keep = non_max_supression(dets, scores, thresh, impl='cpu')
         >>>     assert list(keep) == [2, 1]
+        >>> keep = non_max_supression(dets, scores, thresh, impl='numpy')
+        >>> assert list(keep) == [2, 1]
         >>> if 'gpu' in available_nms_impls():
         >>>     keep = non_max_supression(dets, scores, thresh, impl='gpu')
         >>>     assert list(keep) == [2, 1]
@@ -100,27 +128,86 @@ def non_max_supression(tlbr, scores, thresh, bias=0.0, classes=None,
         >>>     solutions[impl] = sorted(non_max_supression(dets, scores, thresh, impl=impl))
         >>> print('solutions = {}'.format(ub.repr2(solutions, nl=1)))
         >>> assert ub.allsame(solutions.values())
+
+    Example:
+        >>> # Soft-NMS decays the score of the overlapping box instead of
+        >>> # removing it
+        >>> dets = np.array([[0, 0, 10, 10], [1, 0, 11, 10],
+        >>>                  [50, 50, 60, 60]], dtype=np.float32)
+        >>> scores = np.array([.9, .8, .7])
+        >>> non_max_supression(dets, scores, .3, impl='sweep')
+        [0, 2]
+        >>> non_max_supression(dets, scores, .3, impl='soft')
+        [0, 2, 1]
+        >>> non_max_supression(dets, scores, .3, impl='soft', min_score=.5)
+        [0, 2]
+        >>> keep, new_scores = non_max_supression(dets, scores, .3,
+        >>>                                       impl='soft',
+        >>>                                       return_scores=True)
+        >>> print(keep, new_scores.round(3).tolist())
+        [0, 2, 1] [0.9, 0.7, 0.145]
+        >>> # The results of all classes are ranked by their decayed scores
+        >>> classes = np.array([0, 0, 1])
+        >>> keep, new_scores = non_max_supression(dets, scores, .3,
+        >>>                                       classes=classes, impl='soft',
+        >>>                                       return_scores=True)
+        >>> print(keep, new_scores.round(3).tolist())
+        [0, 2, 1] [0.9, 0.7, 0.145]
     """
     if tlbr.shape[0] == 0:
+        if return_scores:
+            return [], np.empty(0)
         return []
 
     if impl == 'auto':
         impl = _automode
 
-    if classes is not None:
+    input_scores = scores
+    # The decayed scores of the kept boxes
+    soft_scores = None
+
+    if impl == 'numpy':
+        # The numpy implementation handles classes without a python loop
+        if classes is not None:
+            classes = np.asarray(classes)
+        # The scores are only used to order the boxes, so they are not cast
+        # (casting could create ties)
+        keep = numpy_nms.numpy_nms(np.asarray(tlbr, dtype=np.float32),
+                                   np.asarray(scores),
+                                   float(thresh), bias=float(bias),
+                                   classes=classes)
+    elif classes is not None:
         keep = []
+        soft_scores = [] if impl == 'soft' else None
         for idxs in ub.group_items(range(len(classes)), classes).values():
             # cls_tlbr = tlbr.take(idxs, axis=0)
             # cls_scores = scores.take(idxs, axis=0)
             cls_tlbr = tlbr[idxs]
             cls_scores = scores[idxs]
             cls_keep = non_max_supression(cls_tlbr, cls_scores, thresh=thresh,
-                                          bias=bias, impl=impl)
+                                          bias=bias, impl=impl,
+                                          soft_method=soft_method,
+                                          sigma=sigma, min_score=min_score,
+                                          return_scores=impl == 'soft')
+            if impl == 'soft':
+                cls_keep, cls_soft_scores = cls_keep
+                soft_scores.extend(cls_soft_scores.tolist())
             keep.extend(list(ub.take(idxs, cls_keep)))
-        return keep
+        if impl == 'soft':
+            # Merge the classes in order of their decayed scores
+            order = np.argsort(-np.asarray(soft_scores), kind='mergesort')
+            keep = [keep[x] for x in order]
+            soft_scores = np.asarray(soft_scores)[order]
     else:
         if impl == 'py':
             keep = py_nms.py_nms(tlbr, scores, thresh, bias=float(bias))
+        elif impl == 'sweep':
+            keep = sweep_nms.sweep_nms(tlbr, scores, thresh, bias=float(bias))
+        elif impl == 'soft':
+            keep, new_scores = sweep_nms.soft_nms(
+                tlbr, scores, thresh, bias=float(bias), method=soft_method,
+                sigma=sigma, min_score=min_score)
+            soft_scores = new_scores[keep]
         elif impl == 'torch':
             was_tensor = torch.is_tensor(tlbr)
             if not was_tensor:
@@ -141,10 +228,15 @@ def non_max_supression(tlbr, scores, thresh, bias=0.0, classes=None,
                 keep = nms(tlbr, scores, float(thresh), bias=float(bias), device_id=device)
             else:
                 keep = nms(tlbr, scores, float(thresh), bias=float(bias))
-        return keep
 
+    if return_scores:
+        if soft_scores is None:
+            kept_scores = input_scores[np.asarray(keep, dtype=np.int64)]
+        else:
+            kept_scores = np.asarray(soft_scores)
+        return keep, kept_scores
+    return keep
 
-# TODO: soft nms
 
 
 if __name__ == '__main__':
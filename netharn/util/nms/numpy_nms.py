@@ -0,0 +1,176 @@
+"""
+Vectorized NumPy NMS that reproduces `cpu_nms` when the Cython extension
+is not available.
+"""
+import numpy as np
+from netharn.util.nms.sweep_nms import _BoxGrid
+
+
+def _block_ious(tlbr1, area1, tlbr2, area2, bias):
+    """
+    IoU between two sets of float32 boxes with the same arithmetic (float32
+    operations in the same order) as `cpu_nms`.
+    """
+    xx1 = np.maximum(tlbr1[:, 0:1], tlbr2[:, 0])
+    yy1 = np.maximum(tlbr1[:, 1:2], tlbr2[:, 1])
+    xx2 = np.minimum(tlbr1[:, 2:3], tlbr2[:, 2])
+    yy2 = np.minimum(tlbr1[:, 3:4], tlbr2[:, 3])
+    w = np.maximum(np.float32(0), xx2 - xx1 + bias)
+    h = np.maximum(np.float32(0), yy2 - yy1 + bias)
+    inter = w * h
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ovr = inter / (area1[:, None] + area2 - inter)
+    return ovr
+
+
+def numpy_nms(np_tlbr, np_scores, thresh, bias=0.0, classes=None,
+              blocksize=256):
+    """
+    Greedy NMS with blocked IoU matrices.
+
+    Boxes are visited in blocks of `blocksize` in order of descending score.
+    The conflicts inside a block are resolved on the block's IoU matrix, and
+    the boxes kept in the block then suppress the later boxes that share a
+    grid cell with them (see `sweep_nms._BoxGrid`) at once, so suppressed
+    boxes are never compared again and boxes that are far apart are never
+    compared at all.
+
+    The boxes kept are the same as `cpu_nms` (the overlaps are computed with
+    float32 arithmetic in the same order and compared in double precision).
+
+    Args:
+        np_tlbr (ndarray): Nx4 boxes in tlbr format
+        np_scores (ndarray): score for each box
+        thresh (float): iou threshold
+        bias (float): bias for iou computation either 0 or 1
+        classes (ndarray or None): if specified, boxes only suppress boxes
+            of the same class. The kept indices are returned grouped by class
+            (in order of first appearance) and each class visits its boxes in
+            the order of `scores[idxs].argsort()[::-1]` like the per class
+            loop in `non_max_supression`, so tied scores are broken the same
+            way.
+        blocksize (int): number of boxes resolved at once
+
+    Returns:
+        List[int]: indices of the kept boxes in descending score order
+
+    Example:
+        >>> from netharn.util.nms.py_nms import py_nms
+        >>> from netharn import util
+        >>> rng = np.random.RandomState(0)
+        >>> np_tlbr = util.Boxes.random(1000, scale=100., rng=rng,
+        >>>                             format='tlbr').data.astype(np.float32)
+        >>> np_scores = rng.rand(len(np_tlbr)).astype(np.float32)
+        >>> keep = numpy_nms(np_tlbr, np_scores, thresh=.3, blocksize=64)
+        >>> assert keep == py_nms(np_tlbr, np_scores, thresh=.3, bias=0)
+
+    Example:
+        >>> np_tlbr = np.array([[0, 0, 10, 10], [1, 0, 11, 10],
+        >>>                     [0, 0, 10, 10]], dtype=np.float32)
+        >>> np_scores = np.array([.9, .8, .7], dtype=np.float32)
+        >>> numpy_nms(np_tlbr, np_scores, .5)
+        [0]
+        >>> numpy_nms(np_tlbr, np_scores, .5, classes=np.array([1, 1, 0]))
+        [0, 2]
+        >>> numpy_nms(np_tlbr, np_scores, .5, classes=np.array([0, 1, 0]))
+        [0, 1]
+
+    Example:
+        >>> # Tied scores are broken like the per class loop
+        >>> from netharn.util.nms.py_nms import py_nms
+        >>> import ubelt as ub
+        >>> rng = np.random.RandomState(0)
+        >>> for _ in range(20):
+        >>>     np_tlbr = rng.randint(0, 20, (60, 2)).astype(np.float32)
+        >>>     np_tlbr = np.hstack([np_tlbr, np_tlbr + 10])
+        >>>     np_scores = rng.randint(0, 3, 60).astype(np.float32)
+        >>>     classes = rng.randint(0, 3, 60)
+        >>>     expected = []
+        >>>     for idxs in ub.group_items(range(60), classes).values():
+        >>>         cls_keep = py_nms(np_tlbr[idxs], np_scores[idxs], .3, bias=0)
+        >>>         expected.extend(ub.take(idxs, cls_keep))
+        >>>     keep = numpy_nms(np_tlbr, np_scores, .3, classes=classes)
+        >>>     assert keep == expected
+    """
+    n_boxes = len(np_tlbr)
+    if n_boxes == 0:
+        return []
+    x1 = np_tlbr[:, 0]
+    y1 = np_tlbr[:, 1]
+    x2 = np_tlbr[:, 2]
+    y2 = np_tlbr[:, 3]
+    areas = (x2 - x1 + bias) * (y2 - y1 + bias)
+    if classes is None:
+        order = np_scores.argsort()[::-1]
+    else:
+        classes = np.asarray(classes)
+        _, class_codes = np.unique(classes, return_inverse=True)
+        # The rank of each box in the order its class is visited by the per
+        # class loop, which is used to break ties in the global order
+        class_rank = np.empty(n_boxes, dtype=np.int64)
+        by_class = np.argsort(class_codes, kind='mergesort')
+        bounds = np.cumsum(np.bincount(class_codes))[:-1]
+        for idxs in np.split(by_class, bounds):
+            cls_order = np_scores[idxs].argsort()[::-1]
+            class_rank[idxs[cls_order]] = np.arange(len(idxs))
+        order = np.lexsort((class_rank, -np_scores))
+        sorted_codes = class_codes[order]
+
+    sorted_tlbr = np_tlbr[order]
+    sorted_areas = areas[order]
+
+    if thresh >= 0:
+        # Boxes that do not intersect can only conflict if thresh < 0
+        grid = _BoxGrid(sorted_tlbr, bias=bias)
+    else:
+        grid = None
+
+    suppressed = np.zeros(n_boxes, dtype=bool)
+    for start in range(0, n_boxes, blocksize):
+        stop = min(start + blocksize, n_boxes)
+        # The block boxes that earlier blocks did not suppress
+        block = start + np.where(~suppressed[start:stop])[0]
+        if len(block) == 0:
+            continue
+
+        ovr = _block_ious(sorted_tlbr[block], sorted_areas[block],
+                          sorted_tlbr[block], sorted_areas[block], bias)
+        # suppress if overlap > thresh (compared in double like cpu_nms)
+        conflict = np.triu(ovr.astype(np.float64) > thresh, k=1)
+        if classes is not None:
+            codes = sorted_codes[block]
+            conflict &= codes[:, None] == codes[None, :]
+
+        # A box is kept if no kept box before it conflicts with it. Applying
+        # this to the whole block converges to the greedy solution.
+        block_keep = np.ones(len(block), dtype=bool)
+        for _ in range(len(block)):
+            new_keep = ~(conflict & block_keep[:, None]).any(axis=0)
+            if np.array_equal(new_keep, block_keep):
+                break
+            block_keep = new_keep
+        suppressed[block[~block_keep]] = True
+
+        # Suppress the later boxes that conflict with a kept box
+        kept = block[block_keep]
+        candidates = ~suppressed[stop:]
+        if grid is not None:
+            candidates &= grid.near(kept)[stop:]
+        rest = stop + np.where(candidates)[0]
+        if len(rest) == 0:
+            continue
+        ovr = _block_ious(sorted_tlbr[kept], sorted_areas[kept],
+                          sorted_tlbr[rest], sorted_areas[rest], bias)
+        conflict = ovr.astype(np.float64) > thresh
+        if classes is not None:
+            conflict &= sorted_codes[kept][:, None] == sorted_codes[rest]
+        suppressed[rest[conflict.any(axis=0)]] = True
+
+    keep = order[~suppressed]
+    if classes is not None:
+        # Group the results by class in order of first appearance
+        first_idxs = np.full(class_codes.max() + 1, n_boxes)
+        np.minimum.at(first_idxs, class_codes, np.arange(n_boxes))
+        keep = keep[np.argsort(first_idxs[class_codes[keep]],
+                               kind='mergesort')]
+    return keep.tolist()
@@ -0,0 +1,322 @@
+"""
+NMS variants that only compare boxes that are near each other.
+
+The boxes are bucketed into a uniform 2-D grid (see `_BoxGrid`), so a box is
+only compared to the boxes that share a grid cell with it. Boxes are resolved
+in order of descending score and a box that was suppressed (or removed) is
+never compared again, so the memory is linear in the number of boxes and the
+time is proportional to the number of kept boxes times the number of nearby
+boxes that remain.
+"""
+import heapq
+import numpy as np
+
+
+class _BoxGrid(object):
+    """
+    Buckets boxes into the cells of a uniform 2-D grid.
+
+    Each box is registered in every cell that its extent touches, so two
+    boxes whose intersection has a positive area share at least one cell. The
+    cells are about the size of the median box (but there are at most about
+    4 cells per box), so a typical box touches a few cells. Boxes that would
+    touch more than `max_span` cells are not registered, instead they are a
+    candidate of every box.
+
+    Args:
+        np_tlbr (ndarray): Nx4 boxes in tlbr format
+        bias (float): bias of the box extent (either 0 or 1)
+        max_span (int): maximum number of cells a box is registered in
+
+    Example:
+        >>> np_tlbr = np.array([[0, 0, 10, 10], [5, 0, 15, 10],
+        >>>                     [30, 0, 40, 10], [12, 20, 16, 30],
+        >>>                     [0, 0, 40, 30]])
+        >>> grid = _BoxGrid(np_tlbr, bias=0, max_span=4)
+        >>> sorted(set(grid.candidates(0).tolist()))
+        [0, 1, 4]
+        >>> sorted(set(grid.candidates(2).tolist()))
+        [2, 4]
+        >>> # The large box is compared to every box
+        >>> sorted(set(grid.candidates(4).tolist()))
+        [0, 1, 2, 3, 4]
+        >>> np.where(grid.near([1, 2]))[0].tolist()
+        [0, 1, 2, 4]
+    """
+    def __init__(self, np_tlbr, bias=1, max_span=64):
+        n = len(np_tlbr)
+        x1 = np_tlbr[:, 0].astype(np.float64)
+        y1 = np_tlbr[:, 1].astype(np.float64)
+        x2 = np_tlbr[:, 2].astype(np.float64) + bias
+        y2 = np_tlbr[:, 3].astype(np.float64) + bias
+        # Boxes without a positive area do not intersect any box
+        with np.errstate(invalid='ignore'):
+            valid = (x2 > x1) & (y2 > y1)
+        valid &= np.isfinite(np_tlbr).all(axis=1)
+        self.n = n
+        self.valid = valid
+
+        if not np.any(valid):
+            self.ncols = self.nrows = 1
+            self.cell_bounds = np.zeros((n, 4), dtype=np.int64)
+            self.is_large = np.zeros(n, dtype=bool)
+            self.large = np.empty(0, dtype=np.int64)
+            self.members = np.empty(0, dtype=np.int64)
+            self.member_cells = np.empty(0, dtype=np.int64)
+            self.offsets = np.zeros(2, dtype=np.int64)
+            return
+
+        ox = x1[valid].min()
+        oy = y1[valid].min()
+        extent_w = x2[valid].max() - ox
+        extent_h = y2[valid].max() - oy
+        max_cells = 2 * np.sqrt(valid.sum())
+        cell_w = max(np.median((x2 - x1)[valid]), extent_w / max_cells)
+        cell_h = max(np.median((y2 - y1)[valid]), extent_h / max_cells)
+        ncols = int(extent_w // cell_w) + 1
+        nrows = int(extent_h // cell_h) + 1
+
+        with np.errstate(invalid='ignore'):
+            cx0 = np.floor((x1 - ox) / cell_w)
+            cx1 = np.floor((x2 - ox) / cell_w)
+            cy0 = np.floor((y1 - oy) / cell_h)
+            cy1 = np.floor((y2 - oy) / cell_h)
+        cell_bounds = np.stack([cx0, cy0, cx1, cy1], axis=1)
+        cell_bounds[~valid] = 0
+        cell_bounds = cell_bounds.astype(np.int64)
+        cell_bounds[:, 0::2] = cell_bounds[:, 0::2].clip(0, ncols - 1)
+        cell_bounds[:, 1::2] = cell_bounds[:, 1::2].clip(0, nrows - 1)
+        cx0, cy0, cx1, cy1 = cell_bounds.T
+
+        span_w = cx1 - cx0 + 1
+        spans = span_w * (cy1 - cy0 + 1)
+        is_large = valid & (spans > max_span)
+        small = np.where(valid & ~is_large)[0]
+
+        # Register each small box in all of its cells
+        counts = spans[small]
+        box_idxs = np.repeat(small, counts)
+        local = np.arange(len(box_idxs)) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        span_w = span_w[box_idxs]
+        cells = ((cy0[box_idxs] + local // span_w) * ncols +
+                 cx0[box_idxs] + local % span_w)
+        sortx = np.argsort(cells, kind='mergesort')
+        offsets = np.zeros(ncols * nrows + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(cells, minlength=ncols * nrows))
+
+        self.ncols = ncols
+        self.nrows = nrows
+        self.cell_bounds = cell_bounds
+        self.is_large = is_large
+        self.large = np.where(is_large)[0]
+        self.members = box_idxs[sortx]
+        self.member_cells = cells[sortx]
+        self.offsets = offsets
+
+    def candidates(self, i):
+        """
+        Returns the boxes that share a cell with box `i` (this includes `i`
+        and may contain duplicates).
+        """
+        if self.is_large[i]:
+            return np.arange(self.n)
+        if not self.valid[i]:
+            return np.empty(0, dtype=np.int64)
+        cx0, cy0, cx1, cy1 = self.cell_bounds[i].tolist()
+        members = self.members
+        offsets = self.offsets
+        # The cells of each row of the box are contiguous
+        parts = [members[offsets[row + cx0]:offsets[row + cx1 + 1]]
+                 for row in range(cy0 * self.ncols, (cy1 + 1) * self.ncols,
+                                  self.ncols)]
+        parts.append(self.large)
+        return np.concatenate(parts)
+
+    def near(self, idxs):
+        """
+        Returns a boolean mask of the boxes that share a cell with any of the
+        boxes `idxs`.
+        """
+        flags = np.zeros(self.n, dtype=bool)
+        idxs = np.asarray(idxs, dtype=np.int64)
+        if np.any(self.is_large[idxs]):
+            flags[:] = True
+            return flags
+        idxs = idxs[self.valid[idxs]]
+        if len(idxs) == 0:
+            return flags
+        cell_mask = np.zeros((self.nrows, self.ncols), dtype=bool)
+        for cx0, cy0, cx1, cy1 in self.cell_bounds[idxs].tolist():
+            cell_mask[cy0:cy1 + 1, cx0:cx1 + 1] = True
+        flags[self.members[cell_mask.ravel()[self.member_cells]]] = True
+        flags[self.large] = True
+        return flags
+
+
+def sweep_nms(np_tlbr, np_scores, thresh, bias=1):
+    """
+    Greedy NMS that only computes the overlaps of nearby boxes.
+
+    This returns the same boxes (in the same order) as `py_nms` for
+    non-negative thresholds (when the boxes have a positive area).
+
+    Each kept box is only compared to the unsuppressed lower scoring boxes
+    that share a grid cell with it (see `_BoxGrid`), so the boxes that are
+    suppressed are never used to find overlaps.
+
+    Example:
+        >>> from netharn.util.nms.py_nms import py_nms
+        >>> from netharn import util
+        >>> rng = np.random.RandomState(0)
+        >>> np_tlbr = util.Boxes.random(500, scale=1000., rng=rng,
+        >>>                             format='tlbr').data
+        >>> np_scores = rng.rand(len(np_tlbr))
+        >>> keep = sweep_nms(np_tlbr, np_scores, thresh=.3, bias=0)
+        >>> assert keep == py_nms(np_tlbr, np_scores, thresh=.3, bias=0)
+
+    Example:
+        >>> # A dense cluster of boxes
+        >>> from netharn.util.nms.py_nms import py_nms
+        >>> rng = np.random.RandomState(0)
+        >>> xy = rng.rand(1000, 2) * 10
+        >>> np_tlbr = np.hstack([xy, xy + rng.uniform(20, 30, (1000, 2))])
+        >>> np_scores = rng.rand(len(np_tlbr))
+        >>> keep = sweep_nms(np_tlbr, np_scores, thresh=.5, bias=1)
+        >>> assert keep == py_nms(np_tlbr, np_scores, thresh=.5, bias=1)
+    """
+    n = len(np_tlbr)
+    if n == 0:
+        return []
+    if thresh < 0:
+        # Every pair conflicts, only the top scoring box remains
+        return [np_scores.argsort()[::-1][0]]
+
+    # Use the same order (including ties) and arithmetic as py_nms
+    order = np_scores.argsort()[::-1]
+    x1 = np_tlbr[:, 0]
+    y1 = np_tlbr[:, 1]
+    x2 = np_tlbr[:, 2]
+    y2 = np_tlbr[:, 3]
+    areas = (x2 - x1 + bias) * (y2 - y1 + bias)
+
+    grid = _BoxGrid(np_tlbr, bias=bias)
+    # Boxes that were not yet kept or suppressed
+    remain = np.ones(n, dtype=bool)
+    keep = []
+    for i in order.tolist():
+        if not remain[i]:
+            continue
+        remain[i] = False
+        keep.append(i)
+
+        js = grid.candidates(i)
+        js = js[remain[js]]
+        if len(js) == 0:
+            continue
+        xx1 = np.maximum(x1[i], x1[js])
+        yy1 = np.maximum(y1[i], y1[js])
+        xx2 = np.minimum(x2[i], x2[js])
+        yy2 = np.minimum(y2[i], y2[js])
+        w = np.maximum(0.0, xx2 - xx1 + bias)
+        h = np.maximum(0.0, yy2 - yy1 + bias)
+        inter = w * h
+        ovr = inter / (areas[i] + areas[js] - inter)
+        # NOTE: like py_nms, suppress if overlap > thresh (or is nan)
+        remain[js[~(ovr <= thresh)]] = False
+    return keep
+
+
+def soft_nms(np_tlbr, np_scores, thresh=.3, bias=1, method='linear',
+             sigma=0.5, min_score=1e-3):
+    """
+    Soft non-maximum suppression [1]_.
+
+    Instead of removing the boxes that overlap a selected box, their scores
+    are decayed. A selected box is only compared to the remaining boxes that
+    share a grid cell with it (see `_BoxGrid`).
+
+    Args:
+        np_tlbr (ndarray): Nx4 boxes in tlbr format
+        np_scores (ndarray): score for each box
+        thresh (float): for the linear method, boxes that overlap a selected
+            box by more than this are decayed by `1 - iou`.
+        bias (float): bias for iou computation either 0 or 1
+        method (str): linear or gaussian. The gaussian method decays every
+            overlapping box by `exp(-iou ** 2 / sigma)`.
+        sigma (float): gaussian decay parameter
+        min_score (float): boxes whose decayed score falls below this are
+            removed
+
+    Returns:
+        Tuple[List[int], ndarray]: keep - the indices of the remaining
+            boxes in the order they were selected, and the decayed score of
+            every input box.
+
+    References:
+        .. [1] Bodla et al. "Soft-NMS -- Improving Object Detection With One
+           Line of Code" ICCV 2017.
+
+    Example:
+        >>> np_tlbr = np.array([[0, 0, 10, 10], [1, 0, 11, 10],
+        >>>                     [50, 50, 60, 60]], dtype=np.float32)
+        >>> np_scores = np.array([.9, .8, .7])
+        >>> keep, new_scores = soft_nms(np_tlbr, np_scores, thresh=.3, bias=0)
+        >>> print(keep, new_scores.round(3).tolist())
+        [0, 2, 1] [0.9, 0.145, 0.7]
+        >>> keep, new_scores = soft_nms(np_tlbr, np_scores, bias=0,
+        >>>                             method='gaussian')
+        >>> print(keep, new_scores.round(3).tolist())
+        [0, 2, 1] [0.9, 0.21, 0.7]
+    """
+    if method not in {'linear', 'gaussian'}:
+        raise KeyError(method)
+    n = len(np_tlbr)
+    new_scores = np.array(np_scores, dtype=np.float64)
+    if n == 0:
+        return [], new_scores
+
+    x1 = np_tlbr[:, 0]
+    y1 = np_tlbr[:, 1]
+    x2 = np_tlbr[:, 2]
+    y2 = np_tlbr[:, 3]
+    areas = (x2 - x1 + bias) * (y2 - y1 + bias)
+    grid = _BoxGrid(np_tlbr, bias=bias)
+
+    alive = new_scores >= min_score
+    heap = [(-score, idx) for idx, score in enumerate(new_scores.tolist())
+            if alive[idx]]
+    heapq.heapify(heap)
+    keep = []
+    while heap:
+        neg_score, i = heapq.heappop(heap)
+        if not alive[i] or -neg_score != new_scores[i]:
+            # Removed, or an outdated entry of a decayed box
+            continue
+        alive[i] = False
+        keep.append(i)
+
+        nbrs = grid.candidates(i)
+        # Each neighbor must only be decayed once
+        nbrs = np.unique(nbrs[alive[nbrs]])
+        if len(nbrs) == 0:
+            continue
+        iws = np.minimum(x2[i], x2[nbrs]) - np.maximum(x1[i], x1[nbrs]) + bias
+        ihs = np.minimum(y2[i], y2[nbrs]) - np.maximum(y1[i], y1[nbrs]) + bias
+        flags = (iws > 0) & (ihs > 0)
+        nbrs = nbrs[flags]
+        inter = iws[flags] * ihs[flags]
+        ious = inter / (areas[i] + areas[nbrs] - inter)
+        if method == 'linear':
+            nbr_decays = np.where(ious > thresh, 1 - ious, 1.0)
+        else:
+            nbr_decays = np.exp(-(ious ** 2) / sigma)
+        changed = nbr_decays != 1
+        nbrs = nbrs[changed]
+        new_scores[nbrs] *= nbr_decays[changed]
+        for j, score in zip(nbrs.tolist(), new_scores[nbrs].tolist()):
+            if score < min_score:
+                alive[j] = False
+            else:
+                heapq.heappush(heap, (-score, j))
+    return keep, new_scores
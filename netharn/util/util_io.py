@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import shutil
+import uuid
 import numpy as np
+from os.path import basename, dirname, join
 
 
 def read_h5arr(fpath):
@@ -47,3 +51,88 @@ def write_arr(fpath, arr):
         return write_h5arr(fpath, arr)
     else:
         raise KeyError(fpath)
+
+
+def _temp_sibling(fpath):
+    """ A hidden temporary path in the same directory (and filesystem) """
+    return join(dirname(fpath), '.{}.{}.tmp'.format(basename(fpath),
+                                                    uuid.uuid4().hex[0:8]))
+
+
+def atomic_save(obj, fpath, save=None):
+    """
+    Serializes `obj` to a temporary file and then renames it to `fpath`, so
+    readers never see a partially written file.
+
+    Args:
+        obj (object): data to save
+        fpath (str): destination path
+        save (callable): function with signature `save(obj, file)`.
+            Defaults to `torch.save`.
+
+    Example:
+        >>> import ubelt as ub
+        >>> import torch
+        >>> from os.path import join
+        >>> dpath = ub.ensure_app_cache_dir('netharn', 'tests')
+        >>> fpath = join(dpath, 'atomic.pt')
+        >>> atomic_save({'a': torch.arange(3)}, fpath)
+        >>> assert torch.load(fpath)['a'].tolist() == [0, 1, 2]
+    """
+    if save is None:
+        import torch
+        save = torch.save
+    tmp_fpath = _temp_sibling(fpath)
+    try:
+        with open(tmp_fpath, 'wb') as file:
+            save(obj, file)
+            file.flush()
+            os.fsync(file.fileno())
+        _replace(tmp_fpath, fpath)
+    except Exception:
+        if os.path.exists(tmp_fpath):
+            os.remove(tmp_fpath)
+        raise
+    return fpath
+
+
+def link_or_copy(src, dst):
+    """
+    Atomically points `dst` at the contents of `src` using a hardlink, which
+    avoids copying the data. Falls back to a copy if the filesystem does not
+    support hardlinks.
+
+    Note:
+        A hardlink (unlike a symlink) remains valid if `src` is deleted.
+
+    Example:
+        >>> import ubelt as ub
+        >>> from os.path import join, exists
+        >>> dpath = ub.ensure_app_cache_dir('netharn', 'tests')
+        >>> src = join(dpath, 'link_src.txt')
+        >>> dst = join(dpath, 'link_dst.txt')
+        >>> ub.writeto(src, 'data1')
+        >>> link_or_copy(src, dst)
+        >>> ub.delete(src)
+        >>> assert ub.readfrom(dst) == 'data1'
+        >>> ub.writeto(src, 'data2')
+        >>> link_or_copy(src, dst)
+        >>> assert ub.readfrom(dst) == 'data2'
+    """
+    tmp_fpath = _temp_sibling(dst)
+    try:
+        os.link(src, tmp_fpath)
+    except (OSError, AttributeError, NotImplementedError):
+        shutil.copy2(src, tmp_fpath)
+    _replace(tmp_fpath, dst)
+    return dst
+
+
+def _replace(src, dst):
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:  # nocover
+        # python2: rename is atomic on posix, but cannot overwrite on windows
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
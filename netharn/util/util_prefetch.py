@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Background batch preparation that overlaps host-to-device transfer of the next
+batch with computation on the current one.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import copy
+import threading
+import sys
+import six
+import torch
+from six.moves import queue
+
+__all__ = ['PrefetchIterator']
+
+
+def _tree_map(func, item):
+    """
+    Applies `func` to every tensor in a nested list / tuple / dict structure.
+
+    Example:
+        >>> item = {'a': [torch.zeros(1), (torch.ones(1), 3)]}
+        >>> out = _tree_map(lambda t: t + 1, item)
+        >>> assert out['a'][0].item() == 1 and out['a'][1][0].item() == 2
+        >>> assert out['a'][1][1] == 3
+
+    Example:
+        >>> # namedtuples and dict subclasses keep their type
+        >>> import collections
+        >>> Batch = collections.namedtuple('Batch', ['inputs', 'labels'])
+        >>> labels = collections.defaultdict(list, {'cls': torch.zeros(2)})
+        >>> out = _tree_map(lambda t: t + 1, Batch(torch.zeros(1), labels))
+        >>> assert isinstance(out, Batch) and out.inputs.item() == 1
+        >>> assert isinstance(out.labels, collections.defaultdict)
+        >>> assert out.labels['cls'].tolist() == [1, 1]
+        >>> assert out.labels['missing'] == [] and labels['cls'].sum() == 0
+    """
+    if torch.is_tensor(item):
+        return func(item)
+    elif isinstance(item, tuple):
+        mapped = [_tree_map(func, v) for v in item]
+        if hasattr(item, '_fields'):
+            # namedtuples take their fields as positional arguments
+            return type(item)(*mapped)
+        return type(item)(mapped)
+    elif isinstance(item, list):
+        return [_tree_map(func, v) for v in item]
+    elif isinstance(item, dict):
+        # copy instead of calling the constructor, which may need other
+        # arguments (e.g. the default_factory of a defaultdict)
+        new = copy.copy(item)
+        for k, v in item.items():
+            new[k] = _tree_map(func, v)
+        return new
+    else:
+        return item
+
+
+_END = object()
+
+
+class PrefetchIterator(object):
+    """
+    Pulls items from an iterator and passes them through a `prepare` function
+    in a background thread, keeping up to `size` prepared items in a bounded
+    queue.
+
+    This is used by `FitHarn._run_epoch` (when `harn.config['prefetch']` is
+    non-zero) to overlap `prepare_batch` for batch N + 1 with the forward /
+    backward pass of batch N.
+
+    Args:
+        iterable (Iterable): source of raw items (e.g. a DataLoader iterator)
+        prepare (callable): function applied to each raw item. Defaults to the
+            identity.
+        size (int): maximum number of prepared items waiting in the queue.
+        device (torch.device): the device `prepare` moves data to. When this
+            is a cuda device, raw tensors are pinned and `prepare` is run on a
+            side stream so the transfer does not block the main stream.
+        pin_memory (bool): pin cpu tensors before calling `prepare`.
+            Defaults to True when `device` is a cuda device.
+
+    Notes:
+        The `prepare` function is run in a different thread. Under the
+        default `FitHarn.prepare_batch` contract (which only moves data onto
+        the xpu) this is safe.
+
+    Example:
+        >>> import torch
+        >>> items = [torch.full((2,), i) for i in range(5)]
+        >>> prefetch = PrefetchIterator(iter(items), prepare=lambda x: x * 2,
+        >>>                             size=2)
+        >>> result = [t.tolist() for t in prefetch]
+        >>> assert result == [[0, 0], [2, 2], [4, 4], [6, 6], [8, 8]]
+
+    Example:
+        >>> # Errors in the background thread are raised in the main thread
+        >>> import pytest
+        >>> def prepare(x):
+        >>>     if x == 2:
+        >>>         raise ValueError('bad item')
+        >>>     return x
+        >>> prefetch = PrefetchIterator(iter(range(4)), prepare=prepare)
+        >>> assert next(prefetch) == 0
+        >>> assert next(prefetch) == 1
+        >>> with pytest.raises(ValueError):
+        >>>     next(prefetch)
+        >>> prefetch.close()
+    """
+    def __init__(self, iterable, prepare=None, size=2, device=None,
+                 pin_memory=None):
+        if size < 1:
+            raise ValueError('prefetch size must be positive')
+        if device is not None:
+            device = torch.device(device)
+        is_cuda = device is not None and device.type == 'cuda'
+        if pin_memory is None:
+            pin_memory = is_cuda
+
+        self.iterable = iterable
+        self.prepare = prepare
+        self.device = device
+        self.pin_memory = pin_memory
+        self._stream = torch.cuda.Stream(device) if is_cuda else None
+
+        self._queue = queue.Queue(maxsize=size)
+        self._stop = threading.Event()
+        self._done = False
+        self._thread = threading.Thread(target=self._worker)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _prepare(self, raw):
+        if self.pin_memory:
+            raw = _tree_map(
+                lambda t: t.pin_memory() if not t.is_cuda else t, raw)
+        if self._stream is None:
+            return raw if self.prepare is None else self.prepare(raw)
+        with torch.cuda.stream(self._stream):
+            item = raw if self.prepare is None else self.prepare(raw)
+        # Only block this thread until the copies land, not the main stream
+        self._stream.synchronize()
+        return item
+
+    def _put(self, msg):
+        # Periodically wake up so a closed iterator does not hang the worker
+        while not self._stop.is_set():
+            try:
+                self._queue.put(msg, timeout=0.1)
+            except queue.Full:
+                continue
+            else:
+                return True
+        return False
+
+    def _worker(self):
+        try:
+            for raw in self.iterable:
+                if self._stop.is_set():
+                    return
+                if not self._put((True, self._prepare(raw))):
+                    return
+        except Exception:
+            self._put((False, sys.exc_info()))
+            return
+        self._put((True, _END))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        ok, item = self._queue.get()
+        if not ok:
+            self.close()
+            six.reraise(*item)
+        if item is _END:
+            self.close()
+            raise StopIteration
+        if self._stream is not None:
+            # Tell the caching allocator these tensors are used on the main
+            # stream so their memory is not reused by the side stream early.
+            current = torch.cuda.current_stream(self.device)
+
+            def _record(t):
+                if t.is_cuda:
+                    t.record_stream(current)
+                return t
+            _tree_map(_record, item)
+        return item
+
+    next = __next__  # python2
+
+    def close(self):
+        """
+        Stops the background thread and discards any queued items.
+        """
+        self._done = True
+        self._stop.set()
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._thread.join()
+
+    def __del__(self):
+        if not getattr(self, '_done', True):
+            self.close()
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python -m netharn.util.util_prefetch all
+    """
+    import xdoctest
+    xdoctest.doctest_module(__file__)
@@ -193,6 +193,60 @@ def _pystate_to_npstate(pystate):
     return npstate
 
 
+def _npstate_to_builtin(npstate):
+    """
+    Converts a NumPy RandomState state to builtin python types, so it can be
+    saved (e.g. in a torch snapshot) without pickling numpy objects.
+    """
+    version, keys, pos, has_gauss, cached_gaussian = npstate
+    return (str(version), [int(k) for k in keys], int(pos), int(has_gauss),
+            float(cached_gaussian))
+
+
+def get_global_rng_state():
+    """
+    Returns the states of the python, numpy, and torch global random number
+    generators (the ones seeded by `seed_global`).
+
+    The python and numpy Mersenne Twister states are both stored in the numpy
+    format using builtin types, so the result can be saved in a snapshot.
+
+    Returns:
+        dict: state to pass to `set_global_rng_state`
+
+    Example:
+        >>> state = get_global_rng_state()
+        >>> nums1 = (random.random(), np.random.rand(), torch.rand(1).item())
+        >>> set_global_rng_state(state)
+        >>> nums2 = (random.random(), np.random.rand(), torch.rand(1).item())
+        >>> assert nums1 == nums2
+    """
+    state = {
+        'python': _npstate_to_builtin(_pystate_to_npstate(random.getstate())),
+        'numpy': _npstate_to_builtin(np.random.get_state()),
+        'torch': torch.random.get_rng_state(),
+    }
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_global_rng_state(state):
+    """
+    Restores the global random states returned by `get_global_rng_state`
+
+    Args:
+        state (dict): the saved states
+    """
+    version, keys, pos, has_gauss, cached_gaussian = state['numpy']
+    np.random.set_state((version, np.array(keys, dtype=np.uint32), pos,
+                         has_gauss, cached_gaussian))
+    random.setstate(_npstate_to_pystate(state['python']))
+    torch.random.set_rng_state(state['torch'].cpu())
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
 def ensure_rng(rng, api='numpy'):
     """
     Returns a random number generator
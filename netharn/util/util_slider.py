@@ -2,11 +2,13 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 import ubelt as ub  # NOQA
 import cv2
+import six
 import numpy as np
 import netharn as nh
 import torch
 import torch.utils.data as torch_data
 import itertools as it
+from os.path import join
 
 
 class SlidingWindow(ub.NiceRepr):
@@ -581,6 +583,13 @@ class Stitcher(ub.NiceRepr):
     Args:
         shape (tuple): dimensions of the large image that will be created from
             the smaller pixels or patches.
+        xpu (str or XPU): 'numpy' to stitch on the cpu, or an XPU to stitch
+            with torch tensors on that device.
+        dpath (str or None): if specified, the sums and weights are
+            memory-mapped files (`sums.npy` and `weights.npy`) in this
+            directory instead of arrays in RAM. Only the parts of the output
+            that are being added to need to be resident, so this can stitch
+            outputs that do not fit in memory. Requires xpu='numpy'.
 
     Example:
         >>> import sys
@@ -595,11 +604,39 @@ class Stitcher(ub.NiceRepr):
         >>> assert stitcher.weights.max() == 4, 'some parts should be processed 4 times'
         >>> recon = stitcher.finalize()
 
+    Example:
+        >>> # Stitch into memory-mapped files and stream the result to disk
+        >>> from os.path import join
+        >>> dpath = ub.ensure_app_cache_dir('netharn', 'tests', 'stitcher')
+        >>> highres = np.random.rand(5, 200, 200).astype(np.float32)
+        >>> slider = SlidingSlices(highres, (1, 50, 50), overlap=(0, .5, .5))
+        >>> stitcher = Stitcher(highres.shape, dpath=dpath)
+        >>> for sl, chip in list(slider):
+        ...     stitcher.add(sl, chip)
+        >>> fpath = join(dpath, 'recon.npy')
+        >>> recon = stitcher.finalize(fpath=fpath, chunksize=5000)
+        >>> assert isinstance(recon, np.memmap)
+        >>> assert np.allclose(np.load(fpath), highres)
     """
-    def __init__(stitcher, shape, xpu='numpy'):
+    def __init__(stitcher, shape, xpu='numpy', dpath=None):
         stitcher.shape = shape
         stitcher.xpu = xpu
-        if xpu == 'numpy':
+        stitcher.dpath = dpath
+        if dpath is not None:
+            if xpu != 'numpy':
+                raise ValueError('disk backed stitching requires xpu=numpy')
+            ub.ensuredir(dpath)
+            # Files are created sparse and zero filled
+            stitcher.sums = np.lib.format.open_memmap(
+                join(dpath, 'sums.npy'), mode='w+', dtype=np.float32,
+                shape=tuple(shape))
+            stitcher.weights = np.lib.format.open_memmap(
+                join(dpath, 'weights.npy'), mode='w+', dtype=np.float32,
+                shape=tuple(shape))
+
+            stitcher.sumview = stitcher.sums.reshape(-1)
+            stitcher.weightview = stitcher.weights.reshape(-1)
+        elif xpu == 'numpy':
             stitcher.sums = np.zeros(shape, dtype=np.float32)
             stitcher.weights = np.zeros(shape, dtype=np.float32)
 
@@ -787,7 +824,7 @@ class Stitcher(ub.NiceRepr):
                 last = batch_idxs.shape[0] - 1
                 base_multi_idxs = tuple(batch_idxs[[0, last]].T)
                 # Add extra dimension for output classes
-                extra_multi_idxs = np.zeros(2, dtype=np.int)
+                extra_multi_idxs = np.zeros(2, dtype=np.int64)
                 multi_idxs_range = base_multi_idxs + (extra_multi_idxs,)
                 ravel_idxs_range = np.ravel_multi_index(multi_idxs_range, dims=shape)
                 first = ravel_idxs_range[0]
@@ -796,7 +833,7 @@ class Stitcher(ub.NiceRepr):
                 ravel_index = ravel_sl
             else:
                 base_multi_idxs = tuple(batch_idxs.T)
-                extra_multi_idxs = np.zeros(len(batch_idxs), dtype=np.int)
+                extra_multi_idxs = np.zeros(len(batch_idxs), dtype=np.int64)
                 # The indices for the 0-th class (which should be the last dimension)
                 multi_idxs_first = base_multi_idxs + (extra_multi_idxs,)
                 ravel_idxs_first = np.ravel_multi_index(multi_idxs_first, dims=shape)
@@ -827,7 +864,15 @@ class Stitcher(ub.NiceRepr):
         out = stitcher.sums / stitcher.weights
         return out
 
-    def finalize(stitcher, frame_ids=None):
+    def flush(stitcher):
+        """
+        Writes the memory-mapped sums and weights to disk
+        """
+        if stitcher.dpath is not None:
+            stitcher.sums.flush()
+            stitcher.weights.flush()
+
+    def finalize(stitcher, frame_ids=None, fpath=None, chunksize=2 ** 24):
         """
         Averages out contributions from overlapping adds
 
@@ -836,10 +881,32 @@ class Stitcher(ub.NiceRepr):
                 done for only a region of the larger tensor, otherwise it is
                 done for the entire tensor.
                 TODO: rename frame_ids subset
+            fpath (str or None): if specified, the result is written to this
+                `.npy` file one block at a time and returned as a memmap, so
+                the full result is never in memory.
+            chunksize (int): maximum number of elements in each block written
+                to `fpath`.
 
         Returns:
             final: ndarray: the stitched image
         """
+        if fpath is not None:
+            if stitcher.xpu != 'numpy':
+                raise ValueError('streaming the result requires xpu=numpy')
+            stitcher.flush()
+            sums = stitcher.sums
+            weights = stitcher.weights
+            if frame_ids is not None:
+                sums = sums[frame_ids]
+                weights = weights[frame_ids]
+            final = np.lib.format.open_memmap(fpath, mode='w+',
+                                              dtype=np.float32,
+                                              shape=sums.shape)
+            for index in _iter_blocks(sums.shape, chunksize):
+                final[index] = np.nan_to_num(sums[index] / weights[index])
+            final.flush()
+            return final
+
         if frame_ids is None:
             final = stitcher.sums / stitcher.weights
         else:
@@ -852,6 +919,266 @@ class Stitcher(ub.NiceRepr):
         return final
 
 
+def _iter_blocks(shape, chunksize):
+    """
+    Yields indices that cover an array in C-order blocks of at most
+    `chunksize` elements.
+
+    Example:
+        >>> blocks = list(_iter_blocks((2, 3, 4), chunksize=8))
+        >>> print(blocks[0:3])
+        [(0, slice(0, 2, None)), (0, slice(2, 3, None)), (1, slice(0, 2, None))]
+        >>> len(list(_iter_blocks((2, 3, 4), chunksize=100)))
+        1
+    """
+    shape = tuple(shape)
+    if len(shape) == 0:
+        yield ()
+        return
+    # Find the outermost axis whose inner blocks fit in a chunk
+    for axis in range(len(shape)):
+        inner = int(np.prod(shape[axis + 1:]))
+        if inner <= chunksize:
+            break
+    step = max(1, chunksize // inner)
+    for outer in it.product(*map(range, shape[:axis])):
+        for start in range(0, shape[axis], step):
+            stop = min(start + step, shape[axis])
+            yield outer + (slice(start, stop),)
+
+
+def gaussian_patch_weights(window, sigma=0.125, min_weight=1e-3):
+    """
+    Weights that favor the center of a window. Used to blend overlapping
+    predictions so the pixels near the border of a chip (which have less
+    context) contribute less.
+
+    Args:
+        window (tuple): shape of the window
+        sigma (float): standard deviation as a fraction of the window size
+        min_weight (float): the border weights are clipped to this so every
+            pixel has a positive weight
+
+    Returns:
+        ndarray: float32 weights with a maximum of 1
+
+    Example:
+        >>> weights = gaussian_patch_weights((5, 4))
+        >>> assert weights.shape == (5, 4)
+        >>> assert weights[2].max() == weights.max() == 1
+        >>> assert weights.min() > 0
+    """
+    weights = np.ones(window, dtype=np.float64)
+    for dim, d in enumerate(window):
+        coords = np.arange(d) - (d - 1) / 2
+        kernel = np.exp(-0.5 * (coords / (sigma * d)) ** 2)
+        shape = [1] * len(window)
+        shape[dim] = d
+        weights = weights * kernel.reshape(shape)
+    weights /= weights.max()
+    weights = np.maximum(weights, min_weight)
+    return weights.astype(np.float32)
+
+
+class SlidingPredictor(ub.NiceRepr):
+    """
+    Runs a model over a large image in overlapping windows and stitches the
+    outputs back together.
+
+    The chips are read by a DataLoader (so they can be prepared by background
+    workers) and batched through the model. Only one batch of chips is in
+    memory at a time. If the source is a memmap, only the chips are read from
+    disk.
+
+    The model may return either:
+
+        * dense outputs with the same spatial shape as the chip, `[B, K, h, w]`.
+          Overlapping outputs are averaged (optionally weighted with `blend`)
+          and the result has shape `[K, H, W]`.
+
+        * one vector per window, `[B, K]`. These are stitched with
+          `Stitcher.add_fast` and the result has the shape of the window grid
+          with the classes last, `[gh, gw, K]`.
+
+    Images that are smaller than the window are zero padded (at the end of
+    each spatial dimension) so the model always sees chips with the window
+    shape. Dense outputs are cropped back to the image shape.
+
+    Args:
+        model (torch.nn.Module): the network. It is mounted on `xpu`.
+        window (tuple): spatial (height, width) shape of each chip
+        overlap (float or tuple): fraction of overlap between chips
+        step (int or tuple): step between chips (mutually exclusive with
+            overlap)
+        batch_size (int): number of chips passed to the model at once
+        workers (int): number of DataLoader workers reading chips
+        xpu (XPU): device to run the model on (defaults to the cpu)
+        blend (None, str, or ndarray): weight of each pixel in a chip when
+            averaging dense outputs. Can be 'gaussian' (see
+            `gaussian_patch_weights`), an array with the window shape, or None
+            for a uniform average.
+        sigma (float): standard deviation of the gaussian blend as a fraction
+            of the window size
+        dpath (str or None): if specified, outputs are stitched into
+            memory-mapped files in this directory (see `Stitcher`) and the
+            result is streamed to `stitched.npy` and returned as a memmap.
+
+    Example:
+        >>> # A pointwise model gives the same result as the full image
+        >>> rng = np.random.RandomState(0)
+        >>> image = rng.rand(3, 67, 45).astype(np.float32)
+        >>> model = torch.nn.Conv2d(3, 2, kernel_size=1)
+        >>> predictor = SlidingPredictor(model, window=(16, 16), overlap=.25,
+        >>>                              batch_size=7, blend='gaussian')
+        >>> probs = predictor.predict(image)
+        >>> with torch.no_grad():
+        >>>     full = model(torch.from_numpy(image)[None])[0].numpy()
+        >>> assert probs.shape == (2, 67, 45)
+        >>> assert np.allclose(probs, full, atol=1e-5)
+
+    Example:
+        >>> # A model that makes one prediction per window
+        >>> rng = np.random.RandomState(0)
+        >>> image = rng.rand(1, 32, 32).astype(np.float32)
+        >>> conv = torch.nn.Conv2d(1, 4, kernel_size=8)
+        >>> model = torch.nn.Sequential(conv, torch.nn.Flatten())
+        >>> predictor = SlidingPredictor(model, window=(8, 8), step=4)
+        >>> grid = predictor.predict(image)
+        >>> with torch.no_grad():
+        >>>     full = conv(torch.from_numpy(image)[None])[0].numpy()
+        >>> assert grid.shape == (7, 7, 4)
+        >>> assert np.allclose(grid, full[:, ::4, ::4].transpose(1, 2, 0),
+        >>>                    atol=1e-5)
+
+    Example:
+        >>> # Images smaller than the window are padded
+        >>> model = torch.nn.Conv2d(3, 2, kernel_size=1)
+        >>> predictor = SlidingPredictor(model, window=(16, 16))
+        >>> for shape in [(3, 10, 10), (3, 100, 7)]:
+        >>>     image = np.random.rand(*shape).astype(np.float32)
+        >>>     probs = predictor.predict(image)
+        >>>     with torch.no_grad():
+        >>>         full = model(torch.from_numpy(image)[None])[0].numpy()
+        >>>     assert probs.shape == (2,) + shape[1:]
+        >>>     assert np.allclose(probs, full, atol=1e-5)
+    """
+    def __init__(predictor, model, window, overlap=None, step=None,
+                 batch_size=16, workers=0, xpu=None, blend=None, sigma=0.125,
+                 dpath=None):
+        if overlap is None and step is None:
+            overlap = 0.25
+        if not (overlap is None) ^ (step is None):
+            raise ValueError('specify overlap({}) XOR step ({})'.format(
+                overlap, step))
+        window = tuple(window)
+        if isinstance(blend, six.string_types):
+            if blend != 'gaussian':
+                raise KeyError(blend)
+            blend = gaussian_patch_weights(window, sigma=sigma)
+        elif blend is not None:
+            blend = np.asarray(blend, dtype=np.float32)
+            if blend.shape != window:
+                raise ValueError('blend weights must have the window shape')
+
+        predictor.xpu = nh.XPU.cast(xpu)
+        predictor.model = predictor.xpu.mount(model)
+        predictor.window = window
+        predictor.overlap = overlap
+        predictor.step = step
+        predictor.batch_size = batch_size
+        predictor.workers = workers
+        predictor.blend = blend
+        predictor.dpath = dpath
+
+    def __nice__(predictor):
+        return 'window={}, xpu={}'.format(predictor.window, predictor.xpu)
+
+    def _make_slider(predictor, source):
+        # The window always spans all channels
+        if predictor.step is None:
+            overlap = predictor.overlap
+            if not isinstance(overlap, (list, tuple)):
+                overlap = [overlap] * len(predictor.window)
+            kw = dict(overlap=[0] + list(overlap))
+        else:
+            step = predictor.step
+            if not isinstance(step, (list, tuple)):
+                step = [step] * len(predictor.window)
+            kw = dict(step=[source.shape[0]] + list(step))
+        target_shape = (source.shape[0],) + predictor.window
+        slider = SlidingSlices(source, target_shape, keepbound=True,
+                               allow_overshoot=True, **kw)
+        return slider
+
+    def predict(predictor, source):
+        """
+        Args:
+            source (ndarray): the image in CHW (or HW) format
+
+        Returns:
+            ndarray: the stitched outputs
+        """
+        if source.ndim == len(predictor.window):
+            source = source[None]
+        spatial_shape = source.shape[1:]
+        pad = [max(w - d, 0) for w, d in zip(predictor.window, spatial_shape)]
+        if any(pad):
+            source = np.pad(source, [(0, 0)] + [(0, p) for p in pad],
+                            mode='constant')
+        slider = predictor._make_slider(source)
+        loader = torch_data.DataLoader(
+            slider.to_dataset(), batch_size=predictor.batch_size,
+            shuffle=False, num_workers=predictor.workers,
+            pin_memory=predictor.xpu.is_gpu())
+
+        model = predictor.model
+        model.train(False)
+        stitcher = None
+        with torch.no_grad():
+            for basis_idxs, chips in loader:
+                outputs = model(predictor.xpu.move(chips))
+                outputs = outputs.data.cpu().numpy()
+                basis_idxs = basis_idxs.numpy()
+                if stitcher is None:
+                    stitcher = predictor._make_stitcher(slider, outputs)
+
+                if outputs.ndim == 2:
+                    # One output per window, stitched into the window grid
+                    stitcher.add_fast(basis_idxs[:, 1:], outputs,
+                                      assume_order=True)
+                else:
+                    for basis_idx, output in zip(basis_idxs, outputs):
+                        slices = tuple(bdim[i] for bdim, i in
+                                       zip(slider.basis_slices, basis_idx))
+                        indices = (slice(None),) + slices[1:]
+                        stitcher.add(indices, output, weight=predictor.blend)
+        if stitcher is None:
+            raise ValueError('The source with shape {} has no chips'.format(
+                source.shape))
+        if predictor.dpath is not None:
+            result = stitcher.finalize(fpath=join(predictor.dpath,
+                                                  'stitched.npy'))
+        else:
+            result = stitcher.finalize()
+        if any(pad) and outputs.ndim != 2:
+            # Remove the padding from dense outputs
+            result = result[(slice(None),) +
+                            tuple(slice(0, d) for d in spatial_shape)]
+        return result
+
+    def _make_stitcher(predictor, slider, outputs):
+        n_classes = outputs.shape[1]
+        if outputs.ndim == 2:
+            shape = list(slider.basis_shape[1:]) + [n_classes]
+        elif tuple(outputs.shape[2:]) == predictor.window:
+            shape = [n_classes] + list(slider.source.shape[1:])
+        else:
+            raise ValueError(
+                'model outputs must be [B, K] or have the spatial shape of '
+                'the window. Got {}'.format(outputs.shape))
+        return Stitcher(shape, dpath=predictor.dpath)
+
+
 if __name__ == '__main__':
     """
     CommandLine:
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+A content-addressed store for snapshot tensors.
+
+`save_deduplicated` writes each tensor of a snapshot to
+`<store_dpath>/<hash[0:2]>/<hash>.pt` (only if a tensor with the same
+content was not stored before) and then writes a small manifest, which is the
+snapshot with every tensor replaced by a reference to its hash. Tensors that
+do not change between snapshots (e.g. frozen layers and constant buffers) are
+therefore only written once.
+
+`load_deduplicated` (and `XPU.load`) read manifests and regular snapshots
+alike.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import glob
+import hashlib
+import os
+from os.path import dirname, exists, join
+import torch
+from netharn.util.util_io import atomic_save
+
+__all__ = ['save_deduplicated', 'load_deduplicated', 'is_manifest',
+           'resolve_manifest', 'manifest_hashes',
+           'remove_unreferenced_tensors']
+
+MANIFEST_KEY = '__manifest__'
+TENSOR_KEY = '__tensor__'
+
+# The name of the store directory (relative to the manifest)
+DEFAULT_STORE = 'tensors'
+
+
+def _tensor_hash(tensor):
+    """
+    Hashes the dtype, shape and data of a contiguous cpu tensor
+    """
+    hasher = hashlib.sha1()
+    hasher.update(str(tensor.dtype).encode('utf8'))
+    hasher.update(str(tuple(tensor.shape)).encode('utf8'))
+    data = tensor.reshape(-1).view(torch.uint8).numpy()
+    hasher.update(memoryview(data))
+    return hasher.hexdigest()
+
+
+def _blob_fpath(store_dpath, hashid):
+    return join(store_dpath, hashid[0:2], hashid + '.pt')
+
+
+def _walk_replace(state, func):
+    """
+    Rebuilds a (possibly nested) state, replacing leaves with `func(leaf)`
+    """
+    if isinstance(state, dict):
+        if TENSOR_KEY in state:
+            return func(state)
+        # preserves OrderedDict and the _metadata attribute of state dicts
+        new = state.__class__()
+        for key, value in state.items():
+            new[key] = _walk_replace(value, func)
+        if hasattr(state, '_metadata'):
+            new._metadata = state._metadata
+        return new
+    elif isinstance(state, list):
+        return [_walk_replace(v, func) for v in state]
+    elif isinstance(state, tuple):
+        return tuple(_walk_replace(v, func) for v in state)
+    else:
+        return func(state)
+
+
+def save_deduplicated(state, fpath, store_dpath=None, min_bytes=256):
+    """
+    Saves a snapshot as a manifest that references the tensors in a content
+    addressed store.
+
+    Args:
+        state (dict): the snapshot (may contain nested tensors)
+        fpath (str): path to the manifest
+        store_dpath (str): where tensors are stored. Defaults to a `tensors`
+            directory next to the manifest. Use the same directory for all
+            snapshots that should share tensors.
+        min_bytes (int): tensors smaller than this are kept in the manifest
+
+    Returns:
+        str: fpath
+
+    Example:
+        >>> import ubelt as ub
+        >>> dpath = ub.ensure_app_cache_dir('netharn', 'tests', 'snapstore')
+        >>> ub.delete(dpath)
+        >>> ub.ensuredir(dpath)
+        >>> frozen = torch.rand(32, 32)
+        >>> state1 = {'epoch': 1, 'w': {'frozen': frozen, 'b': torch.rand(32, 32)},
+        >>>           'small': torch.zeros(2)}
+        >>> state2 = {'epoch': 2, 'w': {'frozen': frozen, 'b': torch.rand(32, 32)},
+        >>>           'small': torch.ones(2)}
+        >>> fpath1 = save_deduplicated(state1, join(dpath, 'snap1.pt'))
+        >>> fpath2 = save_deduplicated(state2, join(dpath, 'snap2.pt'))
+        >>> # The frozen tensor is only stored once
+        >>> assert len(glob.glob(join(dpath, 'tensors', '*', '*.pt'))) == 3
+        >>> assert is_manifest(torch.load(fpath1))
+        >>> loaded = load_deduplicated(fpath2)
+        >>> assert torch.all(loaded['w']['b'] == state2['w']['b'])
+        >>> assert torch.all(loaded['small'] == 1) and loaded['epoch'] == 2
+        >>> # Removing the first manifest frees its unique tensor
+        >>> ub.delete(fpath1)
+        >>> remove_unreferenced_tensors(join(dpath, 'tensors'), [fpath2])
+        1
+    """
+    if store_dpath is None:
+        store_dpath = join(dirname(fpath), DEFAULT_STORE)
+    store_rel = os.path.relpath(store_dpath, dirname(fpath))
+
+    def _ref(value):
+        if not torch.is_tensor(value) or value.layout != torch.strided:
+            return value
+        if value.numel() * value.element_size() < min_bytes:
+            return value
+        tensor = value.detach().cpu().contiguous()
+        hashid = _tensor_hash(tensor)
+        blob_fpath = _blob_fpath(store_dpath, hashid)
+        if not exists(blob_fpath):
+            if not os.path.isdir(dirname(blob_fpath)):
+                os.makedirs(dirname(blob_fpath), exist_ok=True)
+            # clone views, so torch.save does not write the whole storage
+            nbytes = tensor.numel() * tensor.element_size()
+            if tensor.untyped_storage().nbytes() != nbytes:
+                tensor = tensor.clone()
+            atomic_save(tensor, blob_fpath)
+        return {TENSOR_KEY: hashid}
+
+    manifest = _walk_replace(state, _ref)
+    if not isinstance(manifest, dict):
+        raise TypeError('a snapshot must be a dict')
+    manifest[MANIFEST_KEY] = {'version': 1, 'store': store_rel}
+    atomic_save(manifest, fpath)
+    return fpath
+
+
+def is_manifest(state):
+    """ True if `state` was loaded from a manifest """
+    return isinstance(state, dict) and MANIFEST_KEY in state
+
+
+def _find_store(manifest, fpath):
+    """
+    The store is found relative to the manifest. A manifest that was linked
+    into the train directory (e.g. `best_snapshot.pt`) finds it in the
+    `torch_snapshots` subdirectory.
+    """
+    store_rel = manifest[MANIFEST_KEY]['store']
+    if fpath is None:
+        fpath = ''
+    candidates = [
+        join(dirname(fpath), store_rel),
+        join(dirname(fpath), 'torch_snapshots', store_rel),
+    ]
+    for store_dpath in candidates:
+        if os.path.isdir(store_dpath):
+            return store_dpath
+    raise IOError('Cannot find the tensor store of {}'.format(fpath))
+
+
+def resolve_manifest(manifest, fpath, map_location=None):
+    """
+    Replaces the tensor references of a manifest with the stored tensors
+
+    Args:
+        manifest (dict): a loaded manifest
+        fpath (str): the path the manifest was loaded from
+        map_location: passed to `torch.load`
+
+    Returns:
+        dict: the snapshot
+    """
+    store_dpath = _find_store(manifest, fpath)
+    cache = {}
+
+    def _load(value):
+        if isinstance(value, dict):
+            hashid = value[TENSOR_KEY]
+            if hashid not in cache:
+                blob_fpath = _blob_fpath(store_dpath, hashid)
+                cache[hashid] = torch.load(blob_fpath,
+                                           map_location=map_location)
+            return cache[hashid]
+        return value
+
+    state = _walk_replace(manifest, _load)
+    state.pop(MANIFEST_KEY)
+    return state
+
+
+def load_deduplicated(fpath, map_location=None):
+    """
+    Loads a snapshot that may be a manifest written by `save_deduplicated`
+    """
+    state = torch.load(fpath, map_location=map_location)
+    if is_manifest(state):
+        state = resolve_manifest(state, fpath, map_location=map_location)
+    return state
+
+
+def manifest_hashes(manifest):
+    """
+    Returns:
+        Set[str]: the hashes of the tensors referenced by a manifest
+    """
+    hashes = set()
+
+    def _collect(value):
+        if isinstance(value, dict):
+            hashes.add(value[TENSOR_KEY])
+        return value
+
+    _walk_replace(manifest, _collect)
+    return hashes
+
+
+def remove_unreferenced_tensors(store_dpath, manifest_fpaths):
+    """
+    Removes the stored tensors that no manifest references.
+
+    Args:
+        store_dpath (str): the tensor store
+        manifest_fpaths (List[str]): every snapshot that uses the store
+            (regular snapshots are skipped)
+
+    Returns:
+        int: number of removed tensors
+    """
+    keep = set()
+    for fpath in manifest_fpaths:
+        state = torch.load(fpath)
+        if is_manifest(state):
+            keep.update(manifest_hashes(state))
+    n_removed = 0
+    for blob_fpath in glob.glob(join(store_dpath, '*', '*.pt')):
+        hashid = os.path.basename(blob_fpath)[:-3]
+        if hashid not in keep:
+            os.remove(blob_fpath)
+            n_removed += 1
+    return n_removed
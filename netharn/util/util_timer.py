@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Low overhead timers for the phases of a training loop.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import time
+from collections import OrderedDict
+import torch
+
+__all__ = ['PhaseTimer']
+
+
+class _Phase(object):
+    """ Reusable context manager that adds elapsed time to one phase """
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        timer = self.timer
+        if timer.enabled:
+            if timer.sync:
+                torch.cuda.synchronize()
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, ex_type, ex_value, tb):
+        timer = self.timer
+        if timer.enabled:
+            if timer.sync:
+                torch.cuda.synchronize()
+            timer.totals[self.name] += time.perf_counter() - self.start
+            timer.counts[self.name] += 1
+
+
+class PhaseTimer(object):
+    """
+    Accumulates the wall time spent in named phases (e.g. waiting for data,
+    the forward pass, the backward pass).
+
+    `FitHarn` uses one of these to measure where the time of each epoch goes
+    (see `harn.config['timing']`).
+
+    Args:
+        enabled (bool): if False, entering a phase does nothing
+        sync (bool): if True, call `torch.cuda.synchronize` when entering and
+            leaving a phase. CUDA kernels run asynchronously, so without this
+            the time of a phase is the time the host spent in it, and device
+            time shows up in the phase that waits on the result (e.g. when
+            the loss is copied to the host).
+
+    Example:
+        >>> timer = PhaseTimer()
+        >>> for _ in range(3):
+        >>>     with timer('data'):
+        >>>         time.sleep(0.001)
+        >>>     with timer('forward'):
+        >>>         pass
+        >>> summary = timer.summary(total=1.0)
+        >>> assert list(summary) == ['data', 'forward', 'other']
+        >>> assert summary['data']['count'] == 3
+        >>> assert summary['data']['total'] >= 0.003
+        >>> assert summary['other']['total'] == 1.0 - timer.elapsed()
+        >>> timer.reset()
+        >>> assert timer.elapsed() == 0
+    """
+
+    def __init__(self, enabled=True, sync=False):
+        self.enabled = enabled
+        self.sync = sync and torch.cuda.is_available()
+        self.totals = None
+        self.counts = None
+        self._phases = {}
+        self.reset()
+
+    def reset(self):
+        self.totals = OrderedDict()
+        self.counts = OrderedDict()
+
+    def __call__(self, name):
+        phase = self._phases.get(name, None)
+        if phase is None:
+            phase = self._phases[name] = _Phase(self, name)
+        if name not in self.totals:
+            self.totals[name] = 0.0
+            self.counts[name] = 0
+        return phase
+
+    def elapsed(self):
+        """ The total time in all phases """
+        return sum(self.totals.values())
+
+    def summary(self, total=None):
+        """
+        Args:
+            total (float): if specified, the time not spent in any phase is
+                reported as `other`
+
+        Returns:
+            Dict[str, Dict[str, float]]: the total time, the number of times
+                the phase was entered, and the mean time of each phase
+        """
+        summary = OrderedDict()
+        for name, phase_total in self.totals.items():
+            count = self.counts[name]
+            summary[name] = OrderedDict([
+                ('total', phase_total),
+                ('count', count),
+                ('mean', phase_total / count if count else 0.0),
+            ])
+        if total is not None:
+            summary['other'] = OrderedDict([
+                ('total', total - self.elapsed()),
+                ('count', 1),
+                ('mean', total - self.elapsed()),
+            ])
+        return summary
@@ -52,6 +52,36 @@ class grad_context(object):
             return False
 
 
+class autocast_context(object):
+    """
+    Context manager that runs eligible ops in a reduced precision `dtype` via
+    `torch.autocast`. Does nothing if `dtype` is None.
+
+    Example:
+        >>> lin = torch.nn.Linear(3, 2)
+        >>> with autocast_context('cpu', torch.bfloat16):
+        >>>     out = lin(torch.rand(4, 3))
+        >>> assert out.dtype == torch.bfloat16
+        >>> with autocast_context('cpu', None):
+        >>>     out = lin(torch.rand(4, 3))
+        >>> assert out.dtype == torch.float32
+    """
+    def __init__(self, device_type, dtype=None):
+        self.context = None
+        if dtype is not None:
+            self.context = torch.autocast(device_type=device_type, dtype=dtype)
+
+    def __enter__(self):
+        if self.context is not None:
+            self.context.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        if self.context is not None:
+            return self.context.__exit__(*args)
+        return False
+
+
 class DisableBatchNorm(object):
     def __init__(self, model, enabled=True):
         self.model = model
@@ -120,6 +150,51 @@ def trainable_layers(model, names=False):
                 queue.append(child)
 
 
+def cpu_state_copy(state):
+    """
+    Makes a copy of a (possibly nested) state dictionary where every tensor is
+    detached, moved to the CPU, and does not share memory with the original.
+
+    This is useful for capturing a consistent snapshot of model / optimizer
+    state that can be serialized while training continues to modify the
+    original tensors inplace.
+
+    Args:
+        state (dict | list | tuple | Tensor): nested state
+
+    Returns:
+        the same structure with copied tensors
+
+    Example:
+        >>> model = torch.nn.Linear(2, 1)
+        >>> state = {'model': model.state_dict(), 'epoch': 3}
+        >>> copied = cpu_state_copy(state)
+        >>> with torch.no_grad():
+        >>>     model.weight.fill_(0)
+        >>> assert copied['epoch'] == 3
+        >>> assert not torch.all(copied['model']['weight'] == 0)
+    """
+    if torch.is_tensor(state):
+        if state.is_cuda:
+            return state.detach().cpu()
+        else:
+            return state.detach().clone()
+    elif isinstance(state, dict):
+        # preserves OrderedDict and the _metadata attribute of state dicts
+        copied = state.__class__()
+        for key, value in state.items():
+            copied[key] = cpu_state_copy(value)
+        if hasattr(state, '_metadata'):
+            copied._metadata = state._metadata
+        return copied
+    elif isinstance(state, list):
+        return [cpu_state_copy(v) for v in state]
+    elif isinstance(state, tuple):
+        return tuple(cpu_state_copy(v) for v in state)
+    else:
+        return state
+
+
 def one_hot_embedding(labels, num_classes, dtype=None):
     """
     Embedding labels to one-hot form.
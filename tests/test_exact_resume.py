@@ -0,0 +1,88 @@
+import ubelt as ub
+import netharn as nh
+import torch
+
+
+class Failpoint(Exception):
+    pass
+
+
+class MyHarn(nh.FitHarn):
+    def on_batch(harn, batch, outputs, loss):
+        if (harn.epoch, harn.bxs['train']) == harn.failpoint:
+            raise Failpoint
+
+
+def _make_hyper(workdir):
+    datasets = {
+        'train': nh.data.ToyData2d(size=3, border=1, n=64, rng=0),
+        'vali': nh.data.ToyData2d(size=3, border=1, n=32, rng=1),
+    }
+    hyper = {
+        'datasets'    : datasets,
+        'nice'        : 'exact_resume',
+        'workdir'     : workdir,
+        'loaders'     : {'batch_size': 16, 'shuffle': True},
+        'xpu'         : nh.XPU.cast('cpu'),
+        'model'       : (nh.models.ToyNet2d, {}),
+        'optimizer'   : (nh.optimizers.SGD, {'lr': 0.01, 'momentum': 0.9}),
+        'criterion'   : (nh.criterions.CrossEntropyLoss, {}),
+        'initializer' : (nh.initializers.KaimingNormal, {}),
+        'scheduler'   : (nh.schedulers.Exponential, {'gamma': 0.5}),
+        'monitor'     : (nh.Monitor, {'max_epoch': 3}),
+    }
+    return hyper
+
+
+def _make_harn(hyper, failpoint=None):
+    harn = MyHarn(hyper=hyper)
+    harn.failpoint = failpoint
+    harn.config['show_prog'] = False
+    harn.intervals['checkpoint'] = 2
+    return harn
+
+
+def _final_params(harn):
+    return {k: v.detach().clone() for k, v in harn.model.named_parameters()}
+
+
+def test_exact_resume():
+    # Train without interruption
+    nh.util.seed_global(0)
+    hyper = _make_hyper(ub.ensure_app_cache_dir('netharn/test/exact_resume1'))
+    harn = _make_harn(hyper)
+    harn.initialize(reset='delete')
+    harn.run()
+    expected = _final_params(harn)
+
+    # Fail in the middle of the second epoch (after a checkpoint at batch 2)
+    nh.util.seed_global(0)
+    hyper = _make_hyper(ub.ensure_app_cache_dir('netharn/test/exact_resume2'))
+    harn = _make_harn(hyper, failpoint=(1, 2))
+    harn.initialize(reset='delete')
+    try:
+        harn.run()
+    except Failpoint:
+        pass
+    assert len(harn.prev_checkpoints()) == 1
+
+    # Use a different random state to make sure it is restored
+    nh.util.seed_global(1)
+    harn = _make_harn(hyper)
+    harn.initialize()
+    assert harn.epoch == 1
+    assert harn._resume_state['bx'] == 2
+    harn.run()
+    assert harn.prev_checkpoints() == []
+
+    got = _final_params(harn)
+    for key in expected:
+        assert torch.all(expected[key] == got[key]), key
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python ~/code/netharn/tests/test_exact_resume.py
+    """
+    test_exact_resume()
@@ -109,6 +109,41 @@ def demodata_targets(input_size):
 #     assert np.all(np.isclose(loss_brambox, loss_tensor))
 
 
+def test_build_targets_shared_cell():
+    """
+    When two true boxes are assigned to the same anchor of the same grid cell
+    the last one determines the targets (like assigning them in a loop).
+    """
+    import numpy as np
+    from netharn.models.yolo2.light_region_loss import RegionLoss
+    anchors = np.array([[.75, .75], [1.0, .3], [.3, 1.0]])
+    self = RegionLoss(num_classes=2, anchors=anchors)
+    nW, nH = 2, 2
+    target = torch.FloatTensor([
+        # Both boxes are in cell (0, 0) and have the same anchor
+        [[0, 0.30, 0.30, 0.40, 0.40],
+         [1, 0.35, 0.20, 0.40, 0.40]],
+    ])
+    gt_weights = torch.FloatTensor([[1, .75]])
+    pred_cxywh = torch.rand(1, len(anchors), nH, nW, 4).view(-1, 4)
+    coord_mask, conf_mask, cls_mask, tcoord, tconf, tcls = self.build_targets(
+        pred_cxywh, target, nH, nW, gt_weights=gt_weights)
+
+    # Only one cell has a target
+    used = np.argwhere(cls_mask.view(len(anchors), nH, nW).numpy() > 0)
+    assert used.shape == (1, 3)
+    ax, j, i = used[0]
+    assert (j, i) == (0, 0)
+    assert tcls.view(len(anchors), nH, nW)[ax, j, i] == 1
+    tcoord = tcoord.view(len(anchors), 4, nH, nW)[ax, :, j, i]
+    assert np.allclose(tcoord[0:2].numpy(), [0.35 * nW, 0.20 * nH])
+    assert np.allclose(tcoord[2:4].exp().numpy() * anchors[ax],
+                       [0.40 * nW, 0.40 * nH])
+    coord_mask = coord_mask.view(len(anchors), 4, nH, nW)[ax, 0, j, i]
+    expected_weight = .75 * (2 - .4 * .4) if self.small_boxes else .75
+    assert np.isclose(coord_mask ** 2, expected_weight)
+
+
 if __name__ == '__main__':
     """
     CommandLine:
@@ -0,0 +1,62 @@
+import ubelt as ub
+import netharn as nh
+
+
+class Failpoint(Exception):
+    pass
+
+
+class MyHarn(nh.FitHarn):
+    def on_batch(harn, batch, outputs, loss):
+        if harn.bxs['train'] == 1:
+            raise Failpoint
+
+
+def test_prefetch_thread_stops_on_error():
+    # Record the prefetch iterators the harness makes
+    instances = []
+
+    class RecordingPrefetch(nh.util.PrefetchIterator):
+        def __init__(self, *args, **kw):
+            super(RecordingPrefetch, self).__init__(*args, **kw)
+            instances.append(self)
+
+    datasets = {
+        'train': nh.data.ToyData2d(size=3, border=1, n=32, rng=0),
+    }
+    hyper = {
+        'datasets'    : datasets,
+        'nice'        : 'prefetch_error',
+        'workdir'     : ub.ensure_app_cache_dir('netharn/test/prefetch'),
+        'loaders'     : {'batch_size': 4},
+        'xpu'         : nh.XPU.cast('cpu'),
+        'model'       : (nh.models.ToyNet2d, {}),
+        'optimizer'   : (nh.optimizers.SGD, {'lr': 0.01}),
+        'criterion'   : (nh.criterions.CrossEntropyLoss, {}),
+        'monitor'     : (nh.Monitor, {'max_epoch': 1}),
+    }
+    harn = MyHarn(hyper=hyper)
+    harn.config['show_prog'] = False
+    harn.config['prefetch'] = 2
+    harn.initialize(reset='delete')
+    orig = nh.util.PrefetchIterator
+    nh.util.PrefetchIterator = RecordingPrefetch
+    try:
+        harn.run()
+    except Failpoint:
+        pass
+    else:
+        raise AssertionError('the failpoint was not reached')
+    finally:
+        nh.util.PrefetchIterator = orig
+    assert len(instances) == 1
+    instances[0]._thread.join(timeout=5)
+    assert not instances[0]._thread.is_alive()
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python ~/code/netharn/tests/test_prefetch.py
+    """
+    test_prefetch_thread_stops_on_error()
@@ -0,0 +1,213 @@
+"""
+Tests the VOC datasets on a tiny synthetic devkit, so they run without the
+real VOC data (which the doctests require via --voc).
+"""
+from os.path import dirname, join, exists
+import pickle
+import sys
+import cv2
+import numpy as np
+import torch
+import ubelt as ub
+import netharn as nh
+
+sys.path.append(join(dirname(dirname(__file__)), 'examples'))
+
+# (size as (h, w), [(name, x1, y1, x2, y2, difficult)]) in VOC 1-based coords
+IMAGES = {
+    '000001': ((40, 60), [('dog', 5, 6, 30, 25, 0),
+                          ('person', 20, 10, 50, 35, 1)]),
+    '000002': ((50, 30), [('cat', 3, 4, 25, 40, 0)]),
+    '000003': ((32, 32), [('dog', 1, 1, 32, 32, 0)]),
+}
+
+
+def _make_devkit(dpath):
+    """
+    Writes a VOC2007 devkit with the images in IMAGES, which are all in the
+    train split.
+    """
+    devkit_dpath = join(dpath, 'VOCdevkit')
+    data_dpath = join(devkit_dpath, 'VOC2007')
+    image_dpath = ub.ensuredir((data_dpath, 'JPEGImages'))
+    annot_dpath = ub.ensuredir((data_dpath, 'Annotations'))
+    split_dpath = ub.ensuredir((data_dpath, 'ImageSets', 'Main'))
+    rng = np.random.RandomState(0)
+    codes = ub.ddict(dict)
+    for idstr, (shape, objs) in IMAGES.items():
+        image = (rng.rand(*shape, 3) * 255).astype(np.uint8)
+        cv2.imwrite(join(image_dpath, idstr + '.jpg'), image)
+        parts = ['<annotation>']
+        for name, x1, y1, x2, y2, difficult in objs:
+            parts.append(
+                '<object><name>{}</name><difficult>{}</difficult>'
+                '<bndbox><xmin>{}</xmin><ymin>{}</ymin><xmax>{}</xmax>'
+                '<ymax>{}</ymax></bndbox></object>'.format(
+                    name, difficult, x1, y1, x2, y2))
+            codes[name][idstr] = 0 if difficult else 1
+        parts.append('</annotation>')
+        with open(join(annot_dpath, idstr + '.xml'), 'w') as file:
+            file.write('\n'.join(parts))
+    for name, flags in codes.items():
+        lines = ['{} {}'.format(idstr, flags.get(idstr, -1))
+                 for idstr in sorted(IMAGES)]
+        with open(join(split_dpath, name + '_train.txt'), 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+    return devkit_dpath
+
+
+def _setup(name):
+    dpath = ub.ensure_app_cache_dir('netharn/test', name)
+    ub.delete(dpath)
+    ub.ensuredir(dpath)
+    devkit_dpath = _make_devkit(dpath)
+    workdir = ub.ensuredir((dpath, 'work'))
+    return devkit_dpath, workdir
+
+
+def _yolo_dataset(devkit_dpath, workdir):
+    from yolo_voc import YoloVOCDataset
+    dset = YoloVOCDataset(devkit_dpath, split='train', years=[2007],
+                          base_wh=[64, 64], scales=[-1, 1], workdir=workdir)
+    # Dont augment, so items can be compared
+    dset.augmenter = None
+    return dset
+
+
+def _assert_items_equal(item1, item2):
+    inputs1, labels1 = item1
+    inputs2, labels2 = item2
+    assert torch.all(inputs1 == inputs2)
+    for key in labels1:
+        assert torch.all(labels1[key] == labels2[key]), key
+
+
+def test_yolo_voc_annot_cache():
+    devkit_dpath, workdir = _setup('yolo_voc_annots')
+    dset = _yolo_dataset(devkit_dpath, workdir)
+    assert len(dset) == 3
+
+    # The parsed annotations are cached in the workdir
+    annot = dset._load_annotation(0)
+    assert exists(join(workdir, '_cache'))
+    cls_idx = dset._class_to_ind
+    assert annot['boxes'].tolist() == [[4, 5, 29, 24], [19, 9, 49, 34]]
+    assert annot['gt_classes'].tolist() == [cls_idx['dog'], cls_idx['person']]
+    assert annot['gt_ishard'].tolist() == [0, 1]
+    tlbr, gt_classes, gt_weights = dset._load_labels(0)
+    assert gt_weights.tolist() == [1, 0]
+
+    # A new dataset with the same workdir reads the cache instead of parsing
+    dset2 = _yolo_dataset(devkit_dpath, workdir)
+
+    def _fail(fpath):
+        raise AssertionError('the annotations should be cached')
+    dset2._parse_annotation = _fail
+    for index in range(len(dset)):
+        annot2 = dset2._load_annotation(index)
+        assert np.all(annot2['boxes'] == dset._load_annotation(index)['boxes'])
+
+
+def test_yolo_voc_pickle_and_workers():
+    devkit_dpath, workdir = _setup('yolo_voc_workers')
+    dset = _yolo_dataset(devkit_dpath, workdir)
+    expected = [dset[index] for index in range(len(dset))]
+    assert dset._annot_cache is not None
+
+    # The memmaps are not pickled, the copy reopens them
+    dset2 = pickle.loads(pickle.dumps(dset))
+    assert dset2._annot_cache is None
+    for index in range(len(dset)):
+        _assert_items_equal(dset2[index], expected[index])
+    assert dset2._annot_cache is not None
+
+    # Workers reopen the caches. Items are not collated, so this only tests
+    # the dataset.
+    loader = torch.utils.data.DataLoader(dset2, batch_size=None,
+                                         num_workers=2)
+    items = list(loader)
+    assert len(items) == len(expected)
+    for item, expect in zip(items, expected):
+        _assert_items_equal(item, expect)
+
+
+def test_voc_to_coco():
+    devkit_dpath, workdir = _setup('voc_to_coco')
+    dset = nh.data.voc.VOCDataset(devkit_dpath, split='train', years=[2007],
+                                  workdir=workdir)
+    coco_dset = dset.to_coco()
+    assert len(coco_dset.imgs) == 3
+    assert len(coco_dset.anns) == 4
+    assert len(coco_dset.cats) == dset.num_classes
+
+    gid_to_name = {gid: img['file_name'] for gid, img in coco_dset.imgs.items()}
+    for gid, aids in coco_dset.gid_to_aids.items():
+        idstr = gid_to_name[gid].split('/')[-1].split('.')[0]
+        objs = IMAGES[idstr][1]
+        anns = sorted([coco_dset.anns[aid] for aid in aids],
+                      key=lambda ann: ann['id'])
+        assert len(anns) == len(objs)
+        for ann, (name, x1, y1, x2, y2, difficult) in zip(anns, objs):
+            cat = coco_dset.cats[ann['category_id']]
+            assert cat['name'] == name
+            tlbr = nh.util.Boxes([x1 - 1, y1 - 1, x2 - 1, y2 - 1], 'tlbr')
+            assert np.allclose(ann['bbox'], tlbr.to_xywh().data)
+            assert ann['weight'] == 1 - difficult
+
+
+def test_voc_image_cache():
+    devkit_dpath, workdir = _setup('voc_image_cache')
+    dset = nh.data.voc.VOCDataset(devkit_dpath, split='train', years=[2007],
+                                  workdir=workdir)
+    size = (48, 32)
+    dset.ensure_image_cache(sizes=[size])
+    assert dset.image_cache_sizes == [size]
+    for index in range(len(dset)):
+        image = dset._read_image(index)
+        assert np.all(dset._load_image(index) == image)
+        resized = dset._load_cached_resize(index, size)
+        assert resized.shape == (32, 48, 3)
+        assert np.all(resized == dset._resize_image(image, size))
+    # Sizes that are not cached are resized on the fly
+    assert dset._load_cached_resize(0, (64, 64)) is None
+    chw, (boxes, class_idxs) = dset[(0, size)]
+    assert chw.shape == (3, 32, 48)
+
+    # The copy reopens the shards instead of decoding the images again
+    dset2 = pickle.loads(pickle.dumps(dset))
+    assert dset2._image_cache is None
+    assert dset2.image_cache_sizes == [size]
+
+    def _fail(index):
+        raise AssertionError('the images should be cached')
+    dset2._read_image = _fail
+    for index in range(len(dset)):
+        assert np.all(dset2._load_image(index) == dset._load_image(index))
+        assert np.all(dset2._load_cached_resize(index, size) ==
+                      dset._load_cached_resize(index, size))
+    assert isinstance(dset2._image_cache['native'], np.memmap)
+
+
+def test_yolo_voc_image_cache():
+    # The letterboxed images of the subclass are cached
+    devkit_dpath, workdir = _setup('yolo_voc_image_cache')
+    dset = _yolo_dataset(devkit_dpath, workdir)
+    expected = [dset[index] for index in range(len(dset))]
+    dset.ensure_image_cache(sizes=[dset.base_wh])
+    for index in range(len(dset)):
+        image = dset._read_image(index)
+        resized = dset._load_cached_resize(index, dset.base_wh)
+        assert np.all(resized == dset._resize_image(image, dset.base_wh))
+        _assert_items_equal(dset[index], expected[index])
+
+
+if __name__ == '__main__':
+    """
+    CommandLine:
+        python ~/code/netharn/tests/test_voc.py
+    """
+    test_yolo_voc_annot_cache()
+    test_yolo_voc_pickle_and_workers()
+    test_voc_to_coco()
+    test_voc_image_cache()
+    test_yolo_voc_image_cache()